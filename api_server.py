@@ -0,0 +1,550 @@
+"""
+Little Nona - Headless JSON API
+Story generation, evaluation and revision over plain HTTP/JSON
+
+For the mobile app and batch jobs, which don't need the Gradio UI.
+The server is a small asyncio HTTP/1.1 server: connections are kept
+alive between requests, and model work runs on a fixed worker pool so
+a slow story never blocks other connections.
+
+Endpoints:
+    GET  /health
+    POST /v1/stories                  {child_name, age, category, story_details?,
+                                       length?, latency_budget?, auto_revise?, profile_id?}
+    GET  /v1/stories/{id}
+    POST /v1/stories/{id}/evaluate    {latency_budget?, detailed?}
+    POST /v1/stories/{id}/revise      {feedback, latency_budget?}
+    POST /v1/stories/{id}/sequel      {latency_budget?}  (the next night's story, as a new story)
+    POST /v1/subscriptions            {child_name, age, categories, lengths?, story_details?, timezone?}
+    GET  /v1/subscriptions/{id}
+    DELETE /v1/subscriptions/{id}
+    POST /v1/subscriptions/{id}/tonight  {latency_budget?}
+
+Subscribed children's stories are written off-peak in their own timezone
+when the server runs with --nightly (see backend/nightly_service.py);
+"tonight" serves the prepared story as a new story session, or writes
+one live if none is ready.
+
+A story that repeats one the same child heard recently is written again.
+The child is known by the subscription, or by the profile_id a caller
+sends with a new story (its own id for that child, unique within the
+tenant); stories without either aren't checked for repeats.
+
+Sessions are journaled (backend/utils/session_journal.py), so stories in
+progress survive a restart, and any server sharing the journal file can
+continue a session another one started or changed (a server's in-memory
+copy is reloaded when the journal has a newer version). Changes to one
+session arriving at two servers at the same moment still race, so keep
+each session's requests on one server at a time.
+
+Every response carries an X-Request-Id (the client's, or a new one).
+X-Tenant-Id names the caller for fair sharing of model capacity, and
+batch jobs should send "X-Priority: background" so they never hold up
+interactive requests (see utils/scheduler.py). When the server is too
+busy it answers 503 with Retry-After straight away.
+POSTs may send an Idempotency-Key header: a retry with the same key gets
+the first call's response instead of generating (and paying for) a
+second story, even while the first one is still running.
+
+Example:
+    python api_server.py --port 8080 --workers 8 --nightly
+    curl -X POST localhost:8080/v1/stories -H "Idempotency-Key: abc" \\
+         -d '{"child_name": "Emma", "age": 6, "category": "animals"}'
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from story_service import StorySession
+from nightly_service import choices_for, get_nightly_stories, local_now
+from config.settings import (
+    API_SERVER, AGE_RANGE, STORY_CATEGORIES, STORY_LENGTHS, MAX_REVISION_ATTEMPTS, VERSION
+)
+from utils.api_client import get_client
+from utils.cancellation import GenerationCancelled
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.helpers import count_words, validate_name
+from utils.scheduler import SchedulerBusy
+from utils.session_journal import get_session_journal
+
+SESSION_PATH = re.compile(r"^/v1/stories/([0-9a-f]{32})(?:/(evaluate|revise|sequel))?$")
+SUBSCRIPTION_PATH = re.compile(r"^/v1/subscriptions/([0-9a-f]{32})(?:/(tonight))?$")
+PROFILE_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class HTTPError(Exception):
+    """An error answered to the client with this status and message."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Request:
+    """One parsed HTTP request."""
+
+    def __init__(self, method: str, path: str, version: str, headers: Dict[str, str], body: bytes):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    def json(self) -> Dict:
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except (ValueError, UnicodeDecodeError):
+            raise HTTPError(400, "Body must be valid JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Body must be a JSON object")
+        return data
+
+
+class StoryAPI:
+    """
+    Routes requests to StorySession on a worker pool.
+
+    Recently used sessions are kept in memory (least recently used
+    dropped first); every session is also in the journal, where it's
+    found again after a restart, after being dropped, or when another
+    server created or changed it.
+    Revisions of the same story that overlap are queued and merged by
+    the session itself (see StorySession.revise_from_user_feedback).
+    """
+
+    def __init__(self, workers: int = API_SERVER["workers"]):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="story-api")
+        self.journal = get_session_journal()
+        self.sessions: "OrderedDict[str, StorySession]" = OrderedDict()
+        # Idempotency-Key -> (body hash, future of the response)
+        self.idempotent: "OrderedDict[Tuple, Tuple[str, asyncio.Future]]" = OrderedDict()
+
+    # ---- Connections ----
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve requests on one connection until the client is done with it."""
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(
+                        self.read_request(reader), API_SERVER["keep_alive_seconds"]
+                    )
+                except HTTPError as e:
+                    # The stream is in an unknown state after a bad request
+                    self.write_response(writer, e.status, {"error": e.message}, "-", keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+
+                request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+                start = time.monotonic()
+                status, payload = await self.respond(request, request_id)
+                self.write_response(writer, status, payload, request_id, request.keep_alive)
+                await writer.drain()
+                print(f"🌐 {request_id[:12]} {request.method} {request.path} → {status} "
+                      f"({time.monotonic() - start:.2f}s)")
+
+                if not request.keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass  # Idle keep-alive connection timed out, or the client went away
+        finally:
+            writer.close()
+
+    async def read_request(self, reader: asyncio.StreamReader) -> Optional[Request]:
+        """Read one request; None if the client closed the connection."""
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, path, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HTTPError(411, "Send a Content-Length instead of a chunked body")
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length > API_SERVER["max_body_bytes"]:
+            raise HTTPError(413, "Request body too large")
+
+        body = await reader.readexactly(length) if length else b""
+        return Request(method.upper(), path.split("?", 1)[0], version, headers, body)
+
+    def write_response(self, writer: asyncio.StreamWriter, status: int, payload: Dict,
+                       request_id: str, keep_alive: bool):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"X-Request-Id: {request_id}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        )
+        if "retry_after" in payload:
+            head += f"Retry-After: {payload['retry_after']}\r\n"
+        head += "\r\n"
+        writer.write(head.encode("latin-1") + body)
+
+    # ---- Requests ----
+
+    async def respond(self, request: Request, request_id: str) -> Tuple[int, Dict]:
+        """Status and JSON payload for a request, replaying idempotent retries."""
+        key = request.headers.get("idempotency-key")
+        if request.method != "POST" or not key:
+            return await self.dispatch(request, request_id)
+
+        cache_key = (key, request.path)
+        body_hash = hashlib.sha256(request.body).hexdigest()
+        if cache_key in self.idempotent:
+            first_hash, future = self.idempotent[cache_key]
+            if first_hash != body_hash:
+                return 422, {"error": "Idempotency-Key was already used with a different body",
+                             "request_id": request_id}
+            # Same call again (possibly still running): share its response
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self.idempotent[cache_key] = (body_hash, future)
+        while len(self.idempotent) > API_SERVER["idempotency_cache_size"]:
+            self.idempotent.popitem(last=False)
+
+        try:
+            response = await self.dispatch(request, request_id)
+        except BaseException:
+            # Only task cancellation (shutdown) gets here; dispatch handles the rest
+            self.idempotent.pop(cache_key, None)
+            future.cancel()
+            raise
+        future.set_result(response)
+        if response[0] >= 500:
+            # Server-side failures aren't remembered, so a retry can succeed
+            self.idempotent.pop(cache_key, None)
+        return response
+
+    async def dispatch(self, request: Request, request_id: str) -> Tuple[int, Dict]:
+        """Route a request and turn errors into JSON error responses."""
+        try:
+            status, payload = await self.route(request)
+        except HTTPError as e:
+            status, payload = e.status, {"error": e.message}
+        except ValueError as e:
+            status, payload = 400, {"error": str(e)}
+        except DeadlineExceeded as e:
+            status, payload = 504, {"error": str(e)}
+        except SchedulerBusy as e:
+            status, payload = 503, {"error": str(e), "retry_after": API_SERVER["busy_retry_after"]}
+        except GenerationCancelled as e:
+            status, payload = 503, {"error": str(e)}
+        except Exception as e:
+            print(f"❌ {request_id[:12]} {request.method} {request.path} failed: {e}")
+            status, payload = 502, {"error": "The story model could not be reached, please retry"}
+        payload["request_id"] = request_id
+        return status, payload
+
+    async def route(self, request: Request) -> Tuple[int, Dict]:
+        if request.path == "/health":
+            self.require_method(request, "GET")
+            return 200, {"status": "ok", "version": VERSION, "sessions": len(self.sessions)}
+
+        if request.path == "/v1/stories":
+            self.require_method(request, "POST")
+            return await self.create_story(request.json(), request.headers)
+
+        if request.path == "/v1/subscriptions":
+            self.require_method(request, "POST")
+            return self.subscribe(request.json(), request.headers)
+
+        match = SUBSCRIPTION_PATH.match(request.path)
+        if match:
+            return await self.subscription(request, *match.groups())
+
+        match = SESSION_PATH.match(request.path)
+        if not match:
+            raise HTTPError(404, f"No such endpoint: {request.path}")
+
+        session_id, action = match.groups()
+        session = self.sessions.get(session_id)
+        if session is not None:
+            # Behind is fine (a change here is still being journaled); ahead means
+            # another server has changed it since
+            version = await self.run(self.journal.latest_version, session_id)
+            if version is not None and version > session.version:
+                session = None
+        if session is None:
+            session = await self.restore(session_id)
+        if session is None:
+            raise HTTPError(404, "Story not found (it may have expired)")
+        self.sessions.move_to_end(session_id)
+
+        if action is None:
+            self.require_method(request, "GET")
+            return 200, self.story_payload(session_id, session)
+
+        self.require_method(request, "POST")
+        if action == "evaluate":
+            return await self.evaluate(session_id, session, request.json())
+        if action == "sequel":
+            return await self.sequel(session, request.json())
+        return await self.revise(session_id, session, request.json())
+
+    def require_method(self, request: Request, method: str):
+        if request.method != method:
+            raise HTTPError(405, f"Use {method} for {request.path}")
+
+    async def run(self, fn, *args):
+        """Run blocking story work on the worker pool."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    # ---- Endpoints ----
+
+    async def create_story(self, data: Dict, headers: Dict[str, str]) -> Tuple[int, Dict]:
+        """Same flow as create_story_simple, keeping the session for later calls."""
+        child_name, age = self.child(data)
+
+        category = data.get("category")
+        if category not in STORY_CATEGORIES:
+            raise HTTPError(400, f"category must be one of: {', '.join(STORY_CATEGORIES)}")
+
+        length = data.get("length", "medium")
+        if length not in STORY_LENGTHS:
+            raise HTTPError(400, f"length must be one of: {', '.join(STORY_LENGTHS)}")
+
+        story_details = data.get("story_details") or {}
+        if not isinstance(story_details, dict):
+            raise HTTPError(400, "story_details must be an object")
+
+        profile_id = data.get("profile_id")
+        if profile_id is not None and not (isinstance(profile_id, str) and PROFILE_ID.match(profile_id)):
+            raise HTTPError(400, "profile_id must be 1-64 letters, digits, '-' or '_'")
+
+        deadline = self.deadline(data)
+        priority = "background" if headers.get("x-priority", "").lower() == "background" else "interactive"
+        session = StorySession(child_name, age, category, story_details, length,
+                               tenant=headers.get("x-tenant-id") or "api", priority=priority,
+                               profile_id=profile_id)
+        await self.run(session.generate_initial_story, None, deadline)
+
+        evaluation = None
+        if data.get("auto_revise"):
+            evaluation = await self.run(session.auto_revise_if_needed, None, deadline)
+
+        session_id = self.add_session(session)
+        payload = self.story_payload(session_id, session)
+        payload["evaluation"] = evaluation
+        return 201, payload
+
+    def subscribe(self, data: Dict, headers: Dict[str, str]) -> Tuple[int, Dict]:
+        child_name, age = self.child(data)
+        categories, lengths = data.get("categories"), data.get("lengths")
+        if not isinstance(categories, list) or (lengths is not None and not isinstance(lengths, list)):
+            raise HTTPError(400, "categories (and lengths, if given) must be lists")
+        story_details = data.get("story_details") or {}
+        if not isinstance(story_details, dict):
+            raise HTTPError(400, "story_details must be an object")
+        timezone_name = data.get("timezone")
+        if timezone_name is not None and not isinstance(timezone_name, str):
+            raise HTTPError(400, "timezone must be an IANA timezone name, like \"Europe/Rome\"")
+
+        subscription = get_nightly_stories().store.subscribe(
+            child_name, age, categories, lengths, story_details,
+            tenant=headers.get("x-tenant-id") or "api", timezone_name=timezone_name
+        )
+        return 201, subscription
+
+    async def subscription(self, request: Request, subscription_id: str,
+                           action: Optional[str]) -> Tuple[int, Dict]:
+        nightly = get_nightly_stories()
+        subscription = nightly.store.get(subscription_id)
+        if subscription is None:
+            raise HTTPError(404, "Subscription not found")
+
+        if action is None:
+            if request.method == "DELETE":
+                nightly.store.unsubscribe(subscription_id)
+                return 200, {"id": subscription_id, "unsubscribed": True}
+            self.require_method(request, "GET")
+            return 200, subscription
+
+        self.require_method(request, "POST")
+        return await self.tonight(subscription, request.json())
+
+    async def tonight(self, subscription: Dict, data: Dict) -> Tuple[int, Dict]:
+        """Tonight's prepared story as a new session (written live if none is ready)."""
+        deadline = self.deadline(data)
+        record = await self.run(get_nightly_stories().bedtime_story, subscription["id"])
+        if record:
+            session = StorySession(record["child_name"], record["age"], record["category"],
+                                   dict(subscription["story_details"]), record["length"],
+                                   tenant=subscription["tenant"], profile_id=subscription["id"])
+            session.character_name = record["character_name"]
+            session.use_story(record["story"])
+        else:
+            category, length = choices_for(subscription, local_now(subscription).date())
+            session = StorySession(subscription["child_name"], subscription["age"], category,
+                                   dict(subscription["story_details"]), length,
+                                   tenant=subscription["tenant"], profile_id=subscription["id"])
+            await self.run(session.generate_initial_story, None, deadline)
+
+        session_id = self.add_session(session)
+        payload = self.story_payload(session_id, session)
+        payload["prepared"] = record is not None
+        payload["evaluation"] = record["evaluation"] if record else None
+        return 200, payload
+
+    async def evaluate(self, session_id: str, session: StorySession, data: Dict) -> Tuple[int, Dict]:
+        # {"detailed": false} runs only the quick safety gate
+        detailed = data.get("detailed", True) is not False
+        evaluation = await self.run(session.evaluate_current_story, None, self.deadline(data), detailed)
+        if not evaluation:
+            raise HTTPError(502, "Evaluation failed, please retry")
+        return 200, {"session_id": session_id, "evaluation": evaluation}
+
+    async def revise(self, session_id: str, session: StorySession, data: Dict) -> Tuple[int, Dict]:
+        feedback = str(data.get("feedback", "")).strip()
+        if not feedback:
+            raise HTTPError(400, "feedback is required")
+        if session.revision_count >= MAX_REVISION_ATTEMPTS:
+            raise HTTPError(409, f"This story has used all {MAX_REVISION_ATTEMPTS} revisions")
+
+        await self.run(session.revise_from_user_feedback, feedback, None, self.deadline(data))
+        return 200, self.story_payload(session_id, session)
+
+    async def sequel(self, session: StorySession, data: Dict) -> Tuple[int, Dict]:
+        """The next story in the series, from a short summary of this one."""
+        deadline = self.deadline(data)
+        sequel = await self.run(session.start_sequel, None, deadline)
+        await self.run(sequel.generate_initial_story, None, deadline)
+
+        session_id = self.add_session(sequel)
+        payload = self.story_payload(session_id, sequel)
+        payload["previously"] = sequel.story_details["previously"]
+        return 201, payload
+
+    def child(self, data: Dict) -> Tuple[str, int]:
+        """Validated child_name and age from a request body."""
+        child_name = str(data.get("child_name", "")).strip()
+        if not validate_name(child_name):
+            raise HTTPError(400, "child_name must be letters only")
+
+        age = data.get("age")
+        if not isinstance(age, int) or not AGE_RANGE["min"] <= age <= AGE_RANGE["max"]:
+            raise HTTPError(400, f"age must be a whole number from {AGE_RANGE['min']} to {AGE_RANGE['max']}")
+        return child_name, age
+
+    def add_session(self, session: StorySession, session_id: Optional[str] = None) -> str:
+        if session_id is None:
+            session_id = uuid.uuid4().hex
+            session.persist(self.journal, session_id)
+        self.sessions[session_id] = session
+        while len(self.sessions) > API_SERVER["max_sessions"]:
+            self.sessions.popitem(last=False)
+        return session_id
+
+    async def restore(self, session_id: str) -> Optional[StorySession]:
+        """Pick a session up from the journal (no model call), or None if it isn't there."""
+        state = await self.run(self.journal.get, session_id)
+        if state is None:
+            return None
+        session = StorySession.from_dict(state, self.journal, session_id)
+        self.add_session(session, session_id)
+        return session
+
+    def restore_all(self):
+        """Reload the most recent sessions after a restart."""
+        self.journal.compact()
+        states = self.journal.load()
+        for session_id in list(states)[-API_SERVER["max_sessions"]:]:
+            self.add_session(StorySession.from_dict(states[session_id], self.journal, session_id), session_id)
+        if states:
+            print(f"📖 Restored {len(self.sessions)} story sessions from the journal")
+
+    def deadline(self, data: Dict) -> Optional[Deadline]:
+        budget = data.get("latency_budget")
+        if budget is not None and (not isinstance(budget, (int, float)) or budget <= 0):
+            raise HTTPError(400, "latency_budget must be a positive number of seconds")
+        return Deadline.from_budget(budget)
+
+    def story_payload(self, session_id: str, session: StorySession) -> Dict:
+        return {
+            "session_id": session_id,
+            "story": session.current_story,
+            "character_name": session.character_name,
+            "word_count": count_words(session.current_story),
+            "child_name": session.child_name,
+            "age": session.age,
+            "category": session.category,
+            "length": session.length,
+            "revision_count": session.revision_count,
+            "revisions_left": MAX_REVISION_ATTEMPTS - session.revision_count
+        }
+
+
+async def serve(host: str, port: int, workers: int, nightly: bool = False):
+    api = StoryAPI(workers)
+    api.restore_all()
+    if nightly:
+        get_nightly_stories().start()
+        print("🌙 Preparing subscribed children's stories during off-peak hours")
+    server = await asyncio.start_server(api.handle_connection, host, port)
+    print(f"🚀 Little Nona API listening on http://{host}:{port} ({workers} workers)")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Little Nona headless JSON API")
+    parser.add_argument("--host", default=API_SERVER["host"])
+    parser.add_argument("--port", type=int, default=API_SERVER["port"])
+    parser.add_argument("--workers", type=int, default=API_SERVER["workers"],
+                        help="Requests running model calls at once")
+    parser.add_argument("--nightly", action="store_true",
+                        help="Prepare subscribed children's stories off-peak in this process")
+    args = parser.parse_args()
+
+    # Fail fast on a missing API key rather than on the first request
+    get_client()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.nightly))
+    except KeyboardInterrupt:
+        print("\n👋 Goodbye!")
+
+
+if __name__ == "__main__":
+    main()
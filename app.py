@@ -14,13 +14,27 @@ import gradio as gr
 from story_service import StorySession
 from agents.judge import format_evaluation_report
 from utils.helpers import validate_age, validate_name
-from config.settings import STORY_CATEGORIES, STORY_LENGTHS
+from config.settings import STORY_CATEGORIES, STORY_LENGTHS, SESSION_JOURNAL
 from utils.api_client import get_client
+from utils.cancellation import CancellationToken, GenerationCancelled
+from utils.input_filter import get_input_filter, InputRejected
+from utils.scheduler import SchedulerBusy
+from utils.session_journal import get_session_journal
 
 # Global session and API key
 current_session = None
 current_api_key = None
 
+# With LITTLE_NONA_KEEP_STORIES=1 the app's one session is journaled under
+# this id, so a restart keeps the story; otherwise nothing is written to disk
+APP_SESSION_ID = "app"
+
+# Each visitor's in-flight generation/revision token lives in their own
+# gr.State dict ({"token": CancellationToken}), so one visitor's Stop or
+# closed tab never cancels another's story. Those dicts are also kept by
+# Gradio session here, for the tab-close (unload) event, which gets no state.
+visitor_requests = {}
+
 
 def set_api_key(api_key):
     """Set the OpenAI API key."""
@@ -47,7 +61,49 @@ def set_api_key(api_key):
         return f"❌ Error: {str(e)}"
 
 
-def generate_story_handler(child_name, age_input, category, custom_story, character_type, goal, length):
+def cancel_generation(requests):
+    """Stop this visitor's in-flight generation or revision, if any."""
+    token = requests.pop("token", None)
+    if token:
+        token.cancel()
+
+
+def close_session(request: gr.Request):
+    """The visitor closed or reloaded the tab: stop their in-flight request."""
+    requests = visitor_requests.pop(request.session_hash, None)
+    if requests:
+        cancel_generation(requests)
+
+
+def _start_request(requests, request):
+    """Cancel whatever this visitor still has running and return a token for a new request."""
+    cancel_generation(requests)
+    requests["token"] = CancellationToken()
+    _track(requests, request)
+    return requests["token"]
+
+
+def _join_request(requests, request):
+    """
+    Token for a revision: shared with a revision that's already running
+    (its feedback gets merged in, see revise_from_user_feedback) instead
+    of cancelling it, so Stop still stops both.
+    """
+    token = requests.get("token")
+    if token is None or token.cancelled:
+        token = requests["token"] = CancellationToken()
+    _track(requests, request)
+    return token
+
+
+def _track(requests, request):
+    """Remember the visitor's requests for close_session (only where it runs to forget them again)."""
+    if request is not None and hasattr(gr.Blocks, "unload"):
+        visitor_requests[request.session_hash] = requests
+
+
+def generate_story_handler(child_name, age_input, category, custom_story, character_type, goal, length,
+                           requests, request: gr.Request):
     """Generate initial story."""
     global current_session, current_api_key
     
@@ -75,8 +131,13 @@ def generate_story_handler(child_name, age_input, category, custom_story, charac
             if goal:
                 story_details["goal"] = goal
         
+        # Checked locally, before anything is sent to the model
+        story_details = get_input_filter().clean_story_details(story_details)
+        
+        cancel_token = _start_request(requests, request)
         current_session = StorySession(child_name, age, category, story_details, length)
-        story = current_session.generate_initial_story()
+        story = current_session.generate_initial_story(cancel_token)
+        _keep_session()
         character_name = current_session.character_name
         word_count = len(story.split())
         
@@ -91,10 +152,47 @@ Sweet dreams, little one! 🌙💖"""
         
         return story, character_name, status
     
+    except InputRejected as e:
+        return "", "", f"❌ {e}"
+    except (GenerationCancelled, SchedulerBusy) as e:
+        return "", "", str(e)
     except Exception as e:
         return "", "", f"❌ Error: {str(e)}\n\nPlease check your API key is valid."
 
 
+def continue_story_handler(requests, request: gr.Request):
+    """Write the next night's story in the series (from a short summary of this one)."""
+    global current_session, current_api_key
+    
+    if not current_api_key:
+        return "", "", "❌ Please enter your OpenAI API key in the Setup tab first!"
+    
+    if not current_session or not current_session.current_story:
+        return "", "", "❌ Please generate a story first!"
+    
+    try:
+        cancel_token = _start_request(requests, request)
+        sequel = current_session.start_sequel(cancel_token)
+        story = sequel.generate_initial_story(cancel_token)
+        current_session = sequel
+        _keep_session()
+        previously = sequel.story_details["previously"]
+        
+        status = f"""🌙 Night {previously['night'] + 1} of {sequel.character_name}'s story!
+
+📖 Last time: {previously['recap']}
+📏 Length: {len(story.split())} words
+
+Sweet dreams, little one! 🌙💖"""
+        
+        return story, sequel.character_name, status
+    
+    except (GenerationCancelled, SchedulerBusy) as e:
+        return current_session.current_story, current_session.character_name, str(e)
+    except Exception as e:
+        return current_session.current_story, current_session.character_name, f"❌ Error: {str(e)}"
+
+
 def evaluate_story_handler():
     """Evaluate current story."""
     global current_session, current_api_key
@@ -111,11 +209,13 @@ def evaluate_story_handler():
             return format_evaluation_report(evaluation)
         else:
             return "❌ Evaluation failed."
+    except SchedulerBusy as e:
+        return str(e)
     except Exception as e:
         return f"❌ Error: {str(e)}"
 
 
-def revise_story_handler(feedback):
+def revise_story_handler(feedback, requests, request: gr.Request):
     """Revise story based on feedback."""
     global current_session, current_api_key
     
@@ -129,23 +229,117 @@ def revise_story_handler(feedback):
         return current_session.current_story, "❌ Please tell me what to change!"
     
     try:
-        revised_story = current_session.revise_from_user_feedback(feedback)
+        feedback = get_input_filter().clean(feedback, "feedback")
+    except InputRejected as e:
+        return current_session.current_story, f"❌ {e}"
+    
+    try:
+        cancel_token = _join_request(requests, request)
+        revised_story = current_session.revise_from_user_feedback(feedback, cancel_token)
         word_count = len(revised_story.split())
         
+        notes = len(current_session.last_revision_notes)
+        changes = f"{notes} change requests combined into one revision" if notes > 1 else "Changes made"
+        
         status = f"""✨ Story revised!
 
-📝 Changes made
+📝 {changes}
 📏 Length: {word_count} words
 🔄 Revision #{current_session.revision_count}
 
 Sweet dreams! 🌙💖"""
         
         return revised_story, status
+    except (GenerationCancelled, SchedulerBusy) as e:
+        return current_session.current_story, str(e)
     except Exception as e:
         return current_session.current_story, f"❌ Error: {str(e)}"
 
 
+def _version_label(version):
+    """Dropdown label for a history version, e.g. 'v2 · add a dragon (from v1)'."""
+    label = f"v{version['id']} · {version['label']}"
+    if version["parent"] is not None and version["parent"] != version["id"] - 1:
+        label += f" (from v{version['parent']})"
+    return label
+
+
+def version_choices():
+    """Refresh the version picker from the current session's history."""
+    if not current_session or not current_session.history:
+        return gr.update(choices=[], value=None)
+    
+    versions = current_session.history.versions()
+    current = next(v for v in versions if v["current"])
+    return gr.update(
+        choices=[_version_label(v) for v in versions],
+        value=_version_label(current)
+    )
+
+
+def _history_status(message):
+    history = current_session.history
+    return f"""{message}
+
+📚 Version v{history.current} of {len(history)}
+🔄 Revisions used: {current_session.revision_count}"""
+
+
+def undo_handler():
+    """Go back one version (no API call)."""
+    if not current_session or not current_session.history:
+        return "", "❌ Please generate a story first!", version_choices()
+    
+    story = current_session.undo_revision()
+    if story is None:
+        return current_session.current_story, "↩️ Nothing to undo - this is the original story.", version_choices()
+    return story, _history_status("↩️ Undone!"), version_choices()
+
+
+def redo_handler():
+    """Re-apply an undone revision (no API call)."""
+    if not current_session or not current_session.history:
+        return "", "❌ Please generate a story first!", version_choices()
+    
+    story = current_session.redo_revision()
+    if story is None:
+        return current_session.current_story, "↪️ Nothing to redo.", version_choices()
+    return story, _history_status("↪️ Redone!"), version_choices()
+
+
+def select_version_handler(choice):
+    """Switch to a version picked from the dropdown (no API call)."""
+    if not current_session or not current_session.history or not choice:
+        return gr.update(), gr.update()
+    
+    version = int(choice.split(" ", 1)[0][1:])
+    if version == current_session.history.current:
+        return gr.update(), gr.update()
+    
+    story = current_session.select_version(version)
+    return story, _history_status(f"📚 Switched to v{version}")
+
+
 # Build interface
+def _keep_session():
+    """Journal the current session, if the app was started with LITTLE_NONA_KEEP_STORIES=1."""
+    if SESSION_JOURNAL["app_enabled"]:
+        current_session.persist(get_session_journal(), APP_SESSION_ID)
+
+
+def _restore_session():
+    """Pick up the story from before a restart, if there was one (no model call)."""
+    global current_session
+    if not SESSION_JOURNAL["app_enabled"]:
+        return
+    state = get_session_journal().get(APP_SESSION_ID)
+    if state:
+        current_session = StorySession.from_dict(state, get_session_journal(), APP_SESSION_ID)
+        print(f"📖 Restored {current_session.character_name}'s story from before the restart")
+
+
+_restore_session()
+
 with gr.Blocks(title="Little Nona") as app:
     
     gr.HTML("""
@@ -197,7 +391,9 @@ with gr.Blocks(title="Little Nona") as app:
             - 🔒 Your API key is **never stored** on disk
             - 🔒 Used only for the **current session**
             - 🔒 When you close the browser, it's **gone**
-            - 🔒 Stories are **not saved** anywhere
+            - 🔒 Stories are **not saved** anywhere, unless the app was started with
+              `LITTLE_NONA_KEEP_STORIES=1` (then the current story, with the child's name and
+              any quality report, is kept in `backend/data/sessions.journal` to survive a restart)
             
             ### Need an API Key?
             
@@ -246,13 +442,18 @@ with gr.Blocks(title="Little Nona") as app:
                 label="Story Length"
             )
             
-            generate_btn = gr.Button("✨ Create My Bedtime Story", variant="primary", size="lg")
+            with gr.Row():
+                generate_btn = gr.Button("✨ Create My Bedtime Story", variant="primary", size="lg", scale=3)
+                continue_btn = gr.Button("🌙 Continue the Story Tomorrow", size="lg", scale=2)
+                stop_btn = gr.Button("🛑 Stop", variant="stop", size="lg", scale=1)
             
             with gr.Row():
                 with gr.Column(scale=3):
-                    story_output = gr.Textbox(label="Your Story", lines=20, interactive=False)
+                    story_output = gr.Textbox(label="Your Story", lines=20, interactive=False,
+                                              value=current_session.current_story if current_session else "")
                 with gr.Column(scale=1):
-                    character_name_output = gr.Textbox(label="Character Name", interactive=False)
+                    character_name_output = gr.Textbox(label="Character Name", interactive=False,
+                                                       value=current_session.character_name if current_session else "")
                     status_output = gr.Textbox(label="Status", lines=8, interactive=False)
         
         # Tab 2: Improve Story
@@ -265,7 +466,14 @@ with gr.Blocks(title="Little Nona") as app:
                 lines=3
             )
             
-            revise_btn = gr.Button("🔄 Revise Story", variant="primary")
+            with gr.Row():
+                revise_btn = gr.Button("🔄 Revise Story", variant="primary", scale=3)
+                stop_revise_btn = gr.Button("🛑 Stop", variant="stop", scale=1)
+            
+            with gr.Row():
+                undo_btn = gr.Button("↩️ Undo")
+                redo_btn = gr.Button("↪️ Redo")
+                version_dropdown = gr.Dropdown(choices=[], label="Version", interactive=True, scale=2)
             
             revised_story_output = gr.Textbox(label="Revised Story", lines=20, interactive=False)
             revision_status_output = gr.Textbox(label="Status", lines=5, interactive=False)
@@ -301,14 +509,18 @@ with gr.Blocks(title="Little Nona") as app:
             
             ### Privacy:
             - Your API key is used only during this session
-            - No data is stored anywhere
-            - Stories are generated fresh each time
+            - No data is stored anywhere, unless the app was started with
+              `LITTLE_NONA_KEEP_STORIES=1`: then the current story (with the child's name and
+              any quality report) is kept in `backend/data/sessions.journal` so it survives a restart
             
             *Sweet dreams, little one! 🌙💖*
             
             **Version 1.0** • Made with 💖 for bedtime
             """)
     
+    # This visitor's in-flight request token
+    requests_state = gr.State({})
+    
     # Wire up handlers
     save_key_btn.click(
         fn=set_api_key,
@@ -316,18 +528,76 @@ with gr.Blocks(title="Little Nona") as app:
         outputs=[api_key_status]
     )
     
-    generate_btn.click(
+    # Re-submitting first cancels the previous call (unqueued, so it runs
+    # right away), then queues the new one
+    generate_event = generate_btn.click(
+        fn=cancel_generation,
+        inputs=[requests_state],
+        queue=False
+    ).then(
         fn=generate_story_handler,
-        inputs=[child_name_input, age_input, category_input, custom_story_input, character_type_input, goal_input, length_input],
+        inputs=[child_name_input, age_input, category_input, custom_story_input, character_type_input, goal_input, length_input, requests_state],
+        outputs=[story_output, character_name_output, status_output]
+    )
+    
+    # The next night's story is a new story too, so it replaces the current one
+    continue_event = continue_btn.click(
+        fn=cancel_generation,
+        inputs=[requests_state],
+        queue=False
+    ).then(
+        fn=continue_story_handler,
+        inputs=[requests_state],
         outputs=[story_output, character_name_output, status_output]
     )
     
-    revise_btn.click(
+    # Revising doesn't cancel a running revision: notes sent meanwhile are
+    # merged into the next one, so clicks must be able to run side by side
+    # (Gradio 4 otherwise runs one click at a time per event)
+    revise_event = revise_btn.click(
         fn=revise_story_handler,
-        inputs=[feedback_input],
-        outputs=[revised_story_output, revision_status_output]
+        inputs=[feedback_input, requests_state],
+        outputs=[revised_story_output, revision_status_output],
+        **({"concurrency_limit": None} if int(gr.__version__.split(".")[0]) >= 4 else {})
     )
     
+    # Keep the version picker in sync after generating or revising
+    generate_event.then(fn=version_choices, outputs=[version_dropdown], queue=False)
+    continue_event.then(fn=version_choices, outputs=[version_dropdown], queue=False)
+    revise_event.then(fn=version_choices, outputs=[version_dropdown], queue=False)
+    
+    # History navigation is local, so it skips the queue
+    undo_btn.click(
+        fn=undo_handler,
+        outputs=[revised_story_output, revision_status_output, version_dropdown],
+        queue=False
+    )
+    
+    redo_btn.click(
+        fn=redo_handler,
+        outputs=[revised_story_output, revision_status_output, version_dropdown],
+        queue=False
+    )
+    
+    version_dropdown.input(
+        fn=select_version_handler,
+        inputs=[version_dropdown],
+        outputs=[revised_story_output, revision_status_output],
+        queue=False
+    )
+    
+    for btn in [stop_btn, stop_revise_btn]:
+        btn.click(
+            fn=cancel_generation,
+            inputs=[requests_state],
+            cancels=[generate_event, continue_event, revise_event],
+            queue=False
+        )
+    
+    # Closing the tab stops this visitor's in-flight generation (Gradio 4+)
+    if hasattr(app, "unload"):
+        app.unload(close_session)
+    
     evaluate_btn.click(
         fn=evaluate_story_handler,
         outputs=[evaluation_output]
@@ -4,17 +4,168 @@ Evaluates story quality with child safety as priority
 """
 
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from utils.api_client import call_model
+from utils.cancellation import CancellationToken, GenerationCancelled
+from utils.deadline import Deadline
+from utils.scheduler import SchedulerBusy
 from utils.helpers import extract_json_from_response
-from config.settings import AGENT_CONFIG
+from config.settings import AGENT_CONFIG, SAFETY_GATE, JUDGE_FAN_OUT, QUALITY_THRESHOLDS
 
+# What each dimension means, for the fan-out prompts
+DIMENSION_HINTS = {
+    "safety": "no violence, injury, death, scary or inappropriate content",
+    "age_appropriateness": "words, ideas and length right for the age",
+    "bedtime_suitability": "gentle tone, calm and peaceful ending",
+    "concrete_descriptions": "specific colors, sounds, textures instead of vague words",
+    "show_dont_tell": "feelings shown through actions and details",
+    "story_flow": "clear beginning, middle and end that follow on naturally",
+    "character_development": "the main character wants, tries and grows",
+    "engagement": "a child would want to hear what happens next",
+    "warmth": "cozy, loving, reassuring feeling"
+}
 
-def evaluate_story(story: str, age: int, category: str, character_name: str) -> Optional[Dict]:
-    """Evaluate story quality using judge agent."""
+
+def evaluate_story(story: str, age: int, category: str, character_name: str,
+                   cancel_token: Optional[CancellationToken] = None,
+                   deadline: Optional[Deadline] = None, priority: str = "interactive",
+                   tenant: Optional[str] = None, detailed: bool = True,
+                   fan_out: Optional[bool] = None) -> Optional[Dict]:
+    """
+    Evaluate story quality using judge agent.
+    
+    With detailed=False only the short safety gate (check_story_safety)
+    runs, for callers that just need to know the story is safe.
+    
+    fan_out scores the dimension groups in concurrent short calls instead
+    of one long one (see _fan_out_evaluation); by default it's used for
+    the priorities in JUDGE_FAN_OUT["use_for"]. The gate runs first
+    there: its scores are reused, and a story that fails it gets no
+    further calls. The single-call judge scores safety itself, so it
+    runs without the gate, and the gate's verdict is read from its
+    scores instead.
+    
+    Every result has "safety_gate" when the safety scores were usable.
+    A failed gate is marked needs_revision. Gate-only results have the
+    usual keys (overall_score is the lower of the two gate scores) but
+    no strengths.
+    """
+    if fan_out is None:
+        fan_out = priority in JUDGE_FAN_OUT["use_for"]
+    
+    if detailed and not fan_out:
+        evaluation = _full_evaluation(story, age, category, character_name,
+                                      cancel_token, deadline, priority, tenant)
+        return _with_gate(evaluation, _gate_from_scores(evaluation))
+    
+    gate = check_story_safety(story, age, cancel_token, deadline, priority, tenant)
+    if gate and not gate["passed"]:
+        print(f"🚫 Story failed the safety check ({gate['concern'] or 'low scores'}), skipping the full evaluation.")
+        return _gate_evaluation(gate)
+    if not detailed:
+        return _gate_evaluation(gate) if gate else None
+    
+    evaluation = _fan_out_evaluation(story, age, category, character_name,
+                                     cancel_token, deadline, priority, tenant, gate)
+    return _with_gate(evaluation, gate or _gate_from_scores(evaluation))
+
+
+def check_story_safety(story: str, age: int,
+                       cancel_token: Optional[CancellationToken] = None,
+                       deadline: Optional[Deadline] = None, priority: str = "interactive",
+                       tenant: Optional[str] = None) -> Optional[Dict]:
+    """
+    Cheap safety gate: scores only safety and bedtime_suitability, with a
+    tiny output budget. Returns {"scores", "passed", "concern"}, or None
+    if the check failed or couldn't be parsed.
+    """
+    dimensions = list(SAFETY_GATE["min_scores"])
+    prompt = f"""Safety check for a bedtime story for a {age}-year-old. Score 0-10:
+- safety (no violence, injury, death, scary or inappropriate content)
+- bedtime_suitability (gentle tone, calm and peaceful ending)
+
+STORY:
+{story}
+
+Return ONLY this JSON, no explanations:
+{{"safety": 10, "bedtime_suitability": 9, "concern": ""}}
+(concern: a few words on the main problem if a score is below 8, else "")"""
+    
+    try:
+        response = call_model(
+            prompt,
+            max_tokens=SAFETY_GATE["max_tokens"],
+            temperature=AGENT_CONFIG["judge"]["temperature"],
+            agent="judge",
+            cancel_token=cancel_token,
+            deadline=deadline,
+            priority=priority,
+            tenant=tenant,
+            template="judge.safety_gate"
+        )
+    except (GenerationCancelled, SchedulerBusy):
+        raise
+    except Exception as e:
+        print(f"Judge safety check failed: {e}")
+        return None
+    
+    result = extract_json_from_response(response) or {}
+    if not all(isinstance(result.get(d), (int, float)) for d in dimensions):
+        print("Judge safety check returned no usable scores.")
+        return None
+    
+    scores = {d: float(result[d]) for d in dimensions}
+    return {
+        "scores": scores,
+        "passed": all(scores[d] >= minimum for d, minimum in SAFETY_GATE["min_scores"].items()),
+        "concern": str(result.get("concern") or "").strip()
+    }
+
+
+def _gate_from_scores(evaluation: Optional[Dict]) -> Optional[Dict]:
+    """The safety gate's verdict, read from a full evaluation's scores (None if they're missing)."""
+    scores = (evaluation or {}).get("dimension_scores") or {}
+    if not all(isinstance(scores.get(d), (int, float)) for d in SAFETY_GATE["min_scores"]):
+        return None
+    passed = all(scores[d] >= minimum for d, minimum in SAFETY_GATE["min_scores"].items())
+    return {
+        "scores": {d: float(scores[d]) for d in SAFETY_GATE["min_scores"]},
+        "passed": passed,
+        "concern": ""
+    }
+
+
+def _with_gate(evaluation: Optional[Dict], gate: Optional[Dict]) -> Optional[Dict]:
+    """A full evaluation with the safety gate's verdict attached (a failed gate means needs_revision)."""
+    if evaluation and gate:
+        evaluation["safety_gate"] = gate
+        evaluation["needs_revision"] = bool(evaluation.get("needs_revision")) or not gate["passed"]
+    return evaluation
+
+
+def _gate_evaluation(gate: Dict) -> Dict:
+    """A safety-gate verdict in the shape of a full evaluation."""
+    improvements = []
+    if not gate["passed"]:
+        improvements.append(gate["concern"] or "Make it gentler, safer and calmer for bedtime")
+    return {
+        "overall_score": min(gate["scores"].values()),
+        "needs_revision": not gate["passed"],
+        "dimension_scores": dict(gate["scores"]),
+        "strengths": [],
+        "improvements": improvements,
+        "safety_gate": gate
+    }
+
+
+def _full_evaluation(story: str, age: int, category: str, character_name: str,
+                     cancel_token: Optional[CancellationToken], deadline: Optional[Deadline],
+                     priority: str, tenant: Optional[str]) -> Optional[Dict]:
+    """The full nine-dimension evaluation with strengths and improvements."""
     
     prompt = f"""Evaluate this bedtime story and return ONLY valid JSON:
 
@@ -46,14 +197,114 @@ Return JSON:
     config = AGENT_CONFIG["judge"]
     
     try:
-        response = call_model(prompt, max_tokens=config["max_tokens"], temperature=config["temperature"])
+        response = call_model(
+            prompt,
+            max_tokens=config["max_tokens"],
+            temperature=config["temperature"],
+            agent="judge",
+            cancel_token=cancel_token,
+            deadline=deadline,
+            priority=priority,
+            tenant=tenant,
+            template="judge.full"
+        )
         evaluation = extract_json_from_response(response)
         return evaluation
+    except (GenerationCancelled, SchedulerBusy):
+        raise
     except Exception as e:
         print(f"Judge evaluation failed: {e}")
         return None
 
 
+def _fan_out_evaluation(story: str, age: int, category: str, character_name: str,
+                        cancel_token: Optional[CancellationToken], deadline: Optional[Deadline],
+                        priority: str, tenant: Optional[str],
+                        gate: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    The full evaluation as concurrent per-group calls, merged into the
+    usual result shape. The safety gate's scores are reused rather than
+    asked for again; only without a gate are its dimensions scored as a
+    group of their own. overall_score is the mean of the nine scores;
+    improvements come from the weakest groups first. Returns None if any
+    group fails, like a failed single-call evaluation.
+    """
+    groups = dict(JUDGE_FAN_OUT["groups"])
+    if gate is None:
+        groups["safety and suitability"] = list(SAFETY_GATE["min_scores"])
+    
+    def score(group: str) -> Optional[Dict]:
+        return _evaluate_group(story, age, category, character_name, group, groups[group],
+                               cancel_token, deadline, priority, tenant)
+    
+    with ThreadPoolExecutor(max_workers=len(groups)) as pool:
+        results = list(pool.map(score, groups))
+    if not all(results):
+        return None
+    
+    dimension_scores = dict(gate["scores"]) if gate else {}
+    for result in results:
+        dimension_scores.update(result["scores"])
+    overall = round(sum(dimension_scores.values()) / len(dimension_scores), 1)
+    
+    weakest_first = sorted(results, key=lambda result: min(result["scores"].values()))
+    return {
+        "overall_score": overall,
+        "needs_revision": overall < QUALITY_THRESHOLDS["very_good"],
+        "dimension_scores": dimension_scores,
+        "strengths": list(dict.fromkeys(s for result in results for s in result["strengths"]))[:3],
+        "improvements": list(dict.fromkeys(i for result in weakest_first for i in result["improvements"]))[:3]
+    }
+
+
+def _evaluate_group(story: str, age: int, category: str, character_name: str,
+                    group: str, dimensions: List[str],
+                    cancel_token: Optional[CancellationToken], deadline: Optional[Deadline],
+                    priority: str, tenant: Optional[str]) -> Optional[Dict]:
+    """One group's {"scores", "strengths", "improvements"}, or None if the call failed."""
+    lines = "\n".join(f"- {d}: {DIMENSION_HINTS.get(d, d.replace('_', ' '))}" for d in dimensions)
+    example = ", ".join(f'"{d}": 8.5' for d in dimensions)
+    prompt = f"""Score this bedtime story on {group} only, 0-10 each:
+{lines}
+
+STORY:
+{story}
+
+CONTEXT: Age {age}, Category {category}, Character {character_name}
+
+Return ONLY this JSON (at most 2 strengths and 2 improvements, about these dimensions only):
+{{"scores": {{{example}}}, "strengths": ["..."], "improvements": ["..."]}}"""
+    
+    try:
+        response = call_model(
+            prompt,
+            max_tokens=JUDGE_FAN_OUT["max_tokens"],
+            temperature=AGENT_CONFIG["judge"]["temperature"],
+            agent="judge",
+            cancel_token=cancel_token,
+            deadline=deadline,
+            priority=priority,
+            tenant=tenant,
+            template="judge.group"
+        )
+    except (GenerationCancelled, SchedulerBusy):
+        raise
+    except Exception as e:
+        print(f"Judge evaluation ({group}) failed: {e}")
+        return None
+    
+    result = extract_json_from_response(response) or {}
+    scores = result.get("scores") or {}
+    if not all(isinstance(scores.get(d), (int, float)) for d in dimensions):
+        print(f"Judge evaluation ({group}) returned no usable scores.")
+        return None
+    return {
+        "scores": {d: float(scores[d]) for d in dimensions},
+        "strengths": [str(s) for s in result.get("strengths") or []][:2],
+        "improvements": [str(i) for i in result.get("improvements") or []][:2]
+    }
+
+
 def format_evaluation_report(evaluation: Dict) -> str:
     """Format evaluation results into human-readable report."""
     if not evaluation:
@@ -73,6 +324,13 @@ def format_evaluation_report(evaluation: Dict) -> str:
     
     report = f"\n📊 Story Quality Score: {emoji} {score:.1f}/10 - {rating}\n\n"
     
+    gate = evaluation.get("safety_gate")
+    if gate and not gate["passed"]:
+        if (evaluation.get("dimension_scores") or {}).keys() == gate["scores"].keys():
+            report = "\n🚫 This story didn't pass the bedtime safety check, so it wasn't scored in full.\n\n"
+        else:
+            report = "\n🚫 This story didn't pass the bedtime safety check." + report
+    
     if evaluation.get("strengths"):
         report += "🌟 Strengths:\n"
         for strength in evaluation["strengths"]:
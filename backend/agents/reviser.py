@@ -7,13 +7,26 @@ import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from utils.api_client import call_model
-from config.settings import AGENT_CONFIG
+from typing import Optional
+from utils.api_client import call_model_detailed
+from utils.cancellation import CancellationToken
+from utils.deadline import Deadline
+from utils.helpers import count_words
+from utils.length_control import (
+    get_tracker, token_budget, strip_end_marker, finish_truncated_story
+)
+from utils.story_repair import repair_story
+from config.settings import AGENT_CONFIG, LENGTH_CONTROL
 
 
-def revise_story(original_story: str, feedback: str, age: int, character_name: str) -> str:
+def revise_story(original_story: str, feedback: str, age: int, character_name: str,
+                 length: str = "medium", cancel_token: Optional[CancellationToken] = None,
+                 deadline: Optional[Deadline] = None, child_name: Optional[str] = None,
+                 priority: str = "interactive", tenant: Optional[str] = None) -> str:
     """Revise story based on user feedback."""
     
+    end_marker = LENGTH_CONTROL["end_marker"]
+    
     prompt = f"""A child or parent has requested changes to this bedtime story.
 
 ORIGINAL STORY:
@@ -31,14 +44,32 @@ REQUIREMENTS:
 - Ensure safe and age-appropriate
 - DO NOT include "Grandma Nona" as a character or narrator in the story
 
+When the story is finished, write {end_marker} on its own line.
+
 Return the complete REVISED story (no notes, just the story):"""
     
     config = AGENT_CONFIG["reviser"]
     
-    revised_story = call_model(
+    # Feedback like "make it longer" may grow the story, so allow some room
+    target_words = int(count_words(original_story) * LENGTH_CONTROL["revision_growth"])
+    
+    response = call_model_detailed(
         prompt,
-        max_tokens=config["max_tokens"],
-        temperature=config["temperature"]
+        max_tokens=token_budget("reviser", age, length, target_words),
+        temperature=config["temperature"],
+        stop=[end_marker],
+        agent="reviser",
+        cancel_token=cancel_token,
+        deadline=deadline,
+        priority=priority,
+        tenant=tenant,
+        template="reviser.revision"
     )
     
-    return revised_story.strip()
+    revised_story = strip_end_marker(response["text"])
+    get_tracker().record(age, length, response["completion_tokens"], count_words(revised_story))
+    
+    if response["finish_reason"] == "length":
+        revised_story = finish_truncated_story(revised_story, character_name)
+    
+    return repair_story(revised_story, character_name, child_name)
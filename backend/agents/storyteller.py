@@ -7,10 +7,19 @@ import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from typing import Dict
-from utils.api_client import call_model
-from utils.helpers import get_age_vocabulary
-from config.settings import AGENT_CONFIG, STORY_LENGTHS
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from utils.api_client import call_model_detailed
+from utils.cancellation import CancellationToken, GenerationCancelled
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.scheduler import SchedulerBusy
+from utils.helpers import get_age_vocabulary, count_words, extract_json_from_response
+from utils.length_control import (
+    get_tracker, token_budget, token_budget_for_words, get_word_range,
+    strip_end_marker, finish_truncated_story, trim_to_last_sentence
+)
+from utils.story_repair import repair_story
+from config.settings import AGENT_CONFIG, STORY_LENGTHS, LENGTH_CONTROL, CHAPTER_CONFIG
 
 
 STORYTELLER_SYSTEM_PROMPT = """You are a warm, loving storyteller creating bedtime stories for children.
@@ -41,12 +50,26 @@ def generate_story(
     character_name: str,
     child_name: str,
     story_details: Dict,
-    length: str = "medium"
+    length: str = "medium",
+    cancel_token: Optional[CancellationToken] = None,
+    deadline: Optional[Deadline] = None,
+    priority: str = "interactive",
+    tenant: Optional[str] = None
 ) -> str:
     """Generate a bedtime story using Grandma Nona's voice."""
     
+    if length in CHAPTER_CONFIG["lengths"]:
+        story = generate_chaptered_story(
+            age, category, character_name, child_name, story_details, length,
+            cancel_token, deadline, priority, tenant
+        )
+        if story:
+            return repair_story(story, character_name, child_name)
+        # No usable outline; fall back to writing it in one go
+    
     vocab = get_age_vocabulary(age)
     word_target = STORY_LENGTHS[length]["words"]
+    end_marker = LENGTH_CONTROL["end_marker"]
     
     prompt = f"""Create a bedtime story for {child_name}, who is {age} years old.
 
@@ -56,7 +79,7 @@ STORY DETAILS:
 - Length: {word_target} words
 - Character Type: {story_details.get('character_type', '')}
 - Goal/Plot: {story_details.get('goal', '')}
-
+{_sequel_lines(story_details)}{_avoid_line(story_details)}
 AGE {age} REQUIREMENTS:
 - Vocabulary: {vocab['vocab']}
 - Sentences: {vocab['sentences']}
@@ -66,15 +89,312 @@ AGE {age} REQUIREMENTS:
 
 IMPORTANT: Write the story directly. DO NOT include "Grandma Nona" as a character or narrator in the story itself.
 
+When the story is finished, write {end_marker} on its own line.
+
 Tell this bedtime story now:"""
     
     config = AGENT_CONFIG["storyteller"]
     full_prompt = f"{STORYTELLER_SYSTEM_PROMPT}\n\n{prompt}"
     
-    story = call_model(
+    response = call_model_detailed(
         full_prompt,
-        max_tokens=config["max_tokens"],
-        temperature=config["temperature"]
+        max_tokens=token_budget("storyteller", age, length),
+        temperature=config["temperature"],
+        stop=[end_marker],
+        agent="storyteller",
+        cancel_token=cancel_token,
+        deadline=deadline,
+        priority=priority,
+        tenant=tenant,
+        template="storyteller.story"
+    )
+    
+    story = strip_end_marker(response["text"])
+    get_tracker().record(age, length, response["completion_tokens"], count_words(story))
+    
+    if response["finish_reason"] == "length":
+        story = finish_truncated_story(story, character_name)
+    
+    return repair_story(story, character_name, child_name)
+
+
+def _sequel_lines(story_details: Dict) -> str:
+    """Prompt lines continuing an earlier story from its summary (may be empty)."""
+    previously = story_details.get("previously")
+    if not previously:
+        return ""
+    lines = [f"- This is night {previously['night'] + 1} of a series. Keep the same characters and details."]
+    if previously.get("characters"):
+        lines.append(f"- Characters so far: {'; '.join(previously['characters'])}")
+    if previously.get("setting"):
+        lines.append(f"- Setting so far: {previously['setting']}")
+    lines.append(f"- Story so far: {previously['recap']}")
+    if previously.get("open_threads"):
+        lines.append(f"- Tonight, gently pick up one of: {'; '.join(previously['open_threads'])}")
+    lines.append("- It must still make sense on its own, with a calm ending")
+    return "\n".join(lines) + "\n"
+
+
+def _avoid_line(story_details: Dict) -> str:
+    """Prompt line steering away from a recent story this child already heard (may be empty)."""
+    if not story_details.get("avoid"):
+        return ""
+    if story_details.get("previously"):
+        # A sequel keeps its setting; only the events must be new
+        return (f"- Must feel NEW: a recent story began \"{story_details['avoid']}\" - "
+                f"don't retell it, give tonight a different problem and ending\n")
+    return (f"- Must feel NEW: a recent story began \"{story_details['avoid']}\" - "
+            f"use a different setting, problem and ending\n")
+
+
+def generate_chaptered_story(
+    age: int,
+    category: str,
+    character_name: str,
+    child_name: str,
+    story_details: Dict,
+    length: str = "long",
+    cancel_token: Optional[CancellationToken] = None,
+    deadline: Optional[Deadline] = None,
+    priority: str = "interactive",
+    tenant: Optional[str] = None
+) -> Optional[str]:
+    """
+    Generate a longer story as an outline plus chapters written in parallel.
+    
+    1. A short outline call fixes the setting, style and what happens in
+       each chapter (and how each one ends, so the next can pick up there).
+    2. All chapters are written at the same time from that outline.
+    3. A short smoothing call writes a bridge sentence between chapters.
+    
+    Wall-clock time is roughly outline + slowest chapter + bridges instead
+    of one long completion. Returns None if there's no usable outline.
+    """
+    chapters = CHAPTER_CONFIG["chapters"]
+    outline = _generate_outline(age, category, character_name, story_details, length, chapters,
+                                cancel_token, deadline, priority, tenant)
+    if not outline:
+        return None
+    
+    # Any failed chapter cancels its siblings, as does cancelling the request
+    fan_out_token = CancellationToken()
+    stop_forwarding = cancel_token.on_cancel(fan_out_token.cancel) if cancel_token else (lambda: None)
+    
+    def write(index: int) -> str:
+        try:
+            return _generate_chapter(age, character_name, child_name, outline, index, length,
+                                     fan_out_token, deadline, priority, tenant)
+        except Exception:
+            fan_out_token.cancel()
+            raise
+    
+    try:
+        with ThreadPoolExecutor(max_workers=chapters) as pool:
+            futures = [pool.submit(write, i) for i in range(chapters)]
+            try:
+                texts = [future.result() for future in futures]
+            except GenerationCancelled:
+                if cancel_token:
+                    cancel_token.raise_if_cancelled()
+                # A sibling failed first and cancelled the rest; surface its error
+                for future in futures:
+                    error = future.exception()
+                    if error and not isinstance(error, GenerationCancelled):
+                        raise error
+                raise
+    finally:
+        stop_forwarding()  # The request's token outlives this story (revisions reuse it)
+    
+    bridges = _generate_bridges(texts, age, cancel_token, deadline, priority, tenant)
+    
+    parts = [texts[0]]
+    for bridge, text in zip(bridges, texts[1:]):
+        parts.append(f"{bridge} {text}" if bridge else text)
+    return "\n\n".join(parts)
+
+
+def _generate_outline(
+    age: int,
+    category: str,
+    character_name: str,
+    story_details: Dict,
+    length: str,
+    chapters: int,
+    cancel_token: Optional[CancellationToken],
+    deadline: Optional[Deadline],
+    priority: str,
+    tenant: Optional[str]
+) -> Optional[Dict]:
+    """
+    Plan the story: setting, style and one short beat per chapter.
+    Returns None (so the story is written in one go) if the outline call
+    fails or its answer is unusable; cancellation and a busy or expired
+    request still propagate.
+    """
+    prompt = f"""Plan a {category} bedtime story for a {age}-year-old in {chapters} chapters.
+
+- Main Character: {character_name}
+- Character Type: {story_details.get('character_type', '')}
+- Goal/Plot: {story_details.get('goal', '')}
+{_sequel_lines(story_details)}{_avoid_line(story_details)}
+The story must be gentle and safe, and the last chapter must end calmly, ready for sleep.
+
+Return ONLY valid JSON:
+{{
+  "setting": "where the story happens, with colors and sounds",
+  "style": "tone and any repeated phrase",
+  "characters": ["{character_name} - short description", "..."],
+  "chapters": [
+    {{"summary": "what happens", "ends_with": "the moment this chapter ends on"}}
+  ]
+}}"""
+    
+    config = AGENT_CONFIG["storyteller"]
+    try:
+        response = call_model_detailed(
+            prompt,
+            max_tokens=CHAPTER_CONFIG["outline_max_tokens"],
+            temperature=config["temperature"],
+            agent="storyteller",
+            cancel_token=cancel_token,
+            deadline=deadline,
+            priority=priority,
+            tenant=tenant,
+            template="storyteller.outline"
+        )
+    except (GenerationCancelled, SchedulerBusy, DeadlineExceeded):
+        raise
+    except Exception as e:
+        print(f"⚠️  Story outline failed ({e}), writing the story in one go.")
+        return None
+    
+    outline = extract_json_from_response(response["text"])
+    if not outline or len(outline.get("chapters") or []) != chapters:
+        print("⚠️  Story outline was unusable, writing the story in one go.")
+        return None
+    return outline
+
+
+def _generate_chapter(
+    age: int,
+    character_name: str,
+    child_name: str,
+    outline: Dict,
+    index: int,
+    length: str,
+    cancel_token: Optional[CancellationToken],
+    deadline: Optional[Deadline],
+    priority: str,
+    tenant: Optional[str]
+) -> str:
+    """Write one chapter from the shared outline."""
+    vocab = get_age_vocabulary(age)
+    chapters = outline["chapters"]
+    low, high = get_word_range(length)
+    words_low, words_high = low // len(chapters), high // len(chapters)
+    end_marker = LENGTH_CONTROL["end_marker"]
+    is_last = index == len(chapters) - 1
+    
+    plan = "\n".join(f"{i + 1}. {c.get('summary', '')}" for i, c in enumerate(chapters))
+    if index == 0:
+        start = "Begin the story."
+    else:
+        start = f"Pick up right where the previous chapter ended: {chapters[index - 1].get('ends_with', '')}"
+    if is_last:
+        finish = "End with a CALM, peaceful paragraph for bedtime."
+    else:
+        finish = f"Stop at this moment (no ending yet): {chapters[index].get('ends_with', '')}"
+    
+    prompt = f"""You are writing part of a bedtime story for {child_name}, who is {age} years old.
+
+SHARED STORY PLAN:
+- Main Character: {character_name} (use this name throughout)
+- Characters: {", ".join(outline.get("characters") or [character_name])}
+- Setting: {outline.get("setting", "")}
+- Style: {outline.get("style", "")}
+- Chapters:
+{plan}
+
+WRITE ONLY CHAPTER {index + 1} of {len(chapters)}: {chapters[index].get('summary', '')}
+- {start}
+- {finish}
+- Length: {words_low}-{words_high} words
+- Vocabulary: {vocab['vocab']}
+- Sentences: {vocab['sentences']}
+- Use colors, sizes, textures, sounds everywhere
+- NO chapter titles or headings
+
+When the chapter is finished, write {end_marker} on its own line."""
+    
+    config = AGENT_CONFIG["storyteller"]
+    response = call_model_detailed(
+        f"{STORYTELLER_SYSTEM_PROMPT}\n\n{prompt}",
+        max_tokens=token_budget_for_words("storyteller", age, length, words_high),
+        temperature=config["temperature"],
+        stop=[end_marker],
+        agent="storyteller",
+        cancel_token=cancel_token,
+        deadline=deadline,
+        priority=priority,
+        tenant=tenant,
+        template="storyteller.chapter"
+    )
+    
+    text = strip_end_marker(response["text"])
+    get_tracker().record(age, length, response["completion_tokens"], count_words(text))
+    
+    if response["finish_reason"] == "length":
+        if is_last:
+            text = finish_truncated_story(text, character_name)
+        else:
+            # The next chapter carries on from the plan, so just drop the cut-off sentence
+            text = trim_to_last_sentence(text)
+    return text
+
+
+def _generate_bridges(
+    chapters: List[str],
+    age: int,
+    cancel_token: Optional[CancellationToken],
+    deadline: Optional[Deadline],
+    priority: str,
+    tenant: Optional[str]
+) -> List[str]:
+    """
+    Smoothing pass: one short linking sentence for each join between chapters.
+    Returns empty strings (plain joins) if the call fails or can't be parsed.
+    """
+    joins = len(chapters) - 1
+    pairs = "\n\n".join(
+        f"JOIN {i + 1}:\nEND OF PART {i + 1}: {chapters[i][-300:]}\nSTART OF PART {i + 2}: {chapters[i + 1][:300]}"
+        for i in range(joins)
     )
+    prompt = f"""These are the joins between parts of a bedtime story for a {age}-year-old.
+For each join, write ONE short, gentle sentence that leads smoothly from the end of one part into the start of the next.
+
+{pairs}
+
+Return ONLY valid JSON: {{"bridges": ["sentence for join 1", ...]}}"""
+    
+    try:
+        response = call_model_detailed(
+            prompt,
+            max_tokens=CHAPTER_CONFIG["bridge_max_tokens"],
+            temperature=AGENT_CONFIG["storyteller"]["temperature"],
+            agent="storyteller",
+            cancel_token=cancel_token,
+            deadline=deadline,
+            priority=priority,
+            tenant=tenant,
+            template="storyteller.bridges"
+        )
+    except GenerationCancelled:
+        raise
+    except Exception as e:
+        print(f"⚠️  Smoothing pass failed, joining chapters as they are: {e}")
+        return [""] * joins
     
-    return story.strip()
+    bridges = (extract_json_from_response(response["text"]) or {}).get("bridges") or []
+    if len(bridges) != joins:
+        return [""] * joins
+    return [str(b).strip() for b in bridges]
@@ -0,0 +1,87 @@
+"""
+Little Nona - Summarizer Agent
+Remembers a story series in a few lines, so sequels don't need the old stories
+"""
+
+import json
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from typing import Dict, Optional
+from utils.api_client import call_model
+from utils.cancellation import CancellationToken, GenerationCancelled
+from utils.deadline import Deadline
+from utils.scheduler import SchedulerBusy
+from utils.helpers import extract_json_from_response, truncate_text
+from config.settings import AGENT_CONFIG, SEQUELS
+
+
+def summarize_story(story: str, character_name: str, previous: Optional[Dict] = None,
+                    cancel_token: Optional[CancellationToken] = None,
+                    deadline: Optional[Deadline] = None, priority: str = "interactive",
+                    tenant: Optional[str] = None) -> Optional[Dict]:
+    """
+    Summarize a finished story for its sequel:
+    
+        {"night": 1, "characters": ["Emmy - a bunny with a red scarf", ...],
+         "setting": "...", "open_threads": ["..."], "recap": "..."}
+    
+    For a story that is itself a sequel, pass the summary it continued
+    (previous): the new summary covers the whole series, so it stays the
+    same size however many nights the series runs. Returns None if the
+    summary couldn't be made.
+    """
+    earlier = ""
+    if previous:
+        earlier = f"""
+EARLIER IN THE SERIES (update this, keep what still matters):
+{json.dumps(previous, ensure_ascii=False)}
+"""
+    
+    prompt = f"""Summarize this bedtime story so tomorrow's story can continue it.
+Main character: {character_name}
+{earlier}
+STORY:
+{story}
+
+Return ONLY this JSON, short phrases, no explanations:
+{{"characters": ["name - a few words each, at most {SEQUELS['max_characters']}"],
+  "setting": "where it happens, in one phrase",
+  "open_threads": ["something gentle that could happen next, at most {SEQUELS['max_threads']}"],
+  "recap": "the whole series so far in one or two sentences"}}"""
+    
+    config = AGENT_CONFIG["summarizer"]
+    
+    try:
+        response = call_model(
+            prompt,
+            max_tokens=config["max_tokens"],
+            temperature=config["temperature"],
+            agent="summarizer",
+            cancel_token=cancel_token,
+            deadline=deadline,
+            priority=priority,
+            tenant=tenant,
+            template="summarizer.series"
+        )
+    except (GenerationCancelled, SchedulerBusy):
+        raise
+    except Exception as e:
+        print(f"Story summary failed: {e}")
+        return None
+    
+    result = extract_json_from_response(response) or {}
+    if not result.get("recap"):
+        print("Story summary was unusable.")
+        return None
+    
+    # Kept short whatever the model returns, so sequel prompts stay small
+    limit = SEQUELS["max_phrase_chars"]
+    return {
+        "night": previous["night"] + 1 if previous else 1,
+        "characters": [truncate_text(str(c), limit) for c in result.get("characters") or []][:SEQUELS["max_characters"]],
+        "setting": truncate_text(str(result.get("setting") or ""), limit),
+        "open_threads": [truncate_text(str(t), limit) for t in result.get("open_threads") or []][:SEQUELS["max_threads"]],
+        "recap": truncate_text(str(result["recap"]), 2 * limit)
+    }
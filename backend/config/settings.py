@@ -15,6 +15,15 @@ DESCRIPTION = "Warm bedtime stories told by Grandma Nona 👵✨"
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL = "gpt-3.5-turbo"
 
+# Model Traffic Recording
+# "live" calls the API, "record" also saves every call to the cassette,
+# "replay" serves calls from the cassette (no API key or network needed)
+MODEL_TRAFFIC = {
+    "mode": os.getenv("LITTLE_NONA_MODEL_MODE", "live"),
+    "cassette_path": os.getenv("LITTLE_NONA_CASSETTE", "model_traffic.jsonl"),
+    "replay_time_scale": float(os.getenv("LITTLE_NONA_REPLAY_TIME_SCALE", "1.0"))  # 0 = instant
+}
+
 # Story Settings
 STORY_CATEGORIES = [
     "adventure",
@@ -52,24 +61,137 @@ STORY_LENGTHS = {
 }
 
 # Agent Settings (Little Nona's 3-agent architecture)
+# "models" is the routing table: preferred model first, then fallbacks
 AGENT_CONFIG = {
     "storyteller": {
         "temperature": 0.8,
         "max_tokens": 1800,
-        "role": "Creative storyteller with grandmother warmth"
+        "role": "Creative storyteller with grandmother warmth",
+        "models": ["gpt-4o", "gpt-4o-mini", OPENAI_MODEL]
     },
     "judge": {
         "temperature": 0.2,
         "max_tokens": 1000,
-        "role": "Quality evaluator"
+        "role": "Quality evaluator",
+        "models": ["gpt-4o-mini", OPENAI_MODEL]
     },
     "reviser": {
         "temperature": 0.7,
         "max_tokens": 1800,
-        "role": "Story improver"
+        "role": "Story improver",
+        "models": ["gpt-4o-mini", OPENAI_MODEL]
+    },
+    "summarizer": {
+        "temperature": 0.2,
+        "max_tokens": 300,
+        "role": "Series memory for sequels",
+        "models": ["gpt-4o-mini", OPENAI_MODEL]
+    }
+}
+
+# Model Routing (fallback ordering by observed latency and errors)
+MODEL_ROUTING = {
+    "default_latency": 5.0,        # Seconds assumed for a model we haven't timed yet
+    "smoothing": 0.2,              # Weight of each new observation
+    "error_penalty": 4.0,          # How much the error rate inflates a model's latency score
+    "max_error_rate": 0.5,         # Above this a model is treated as unhealthy
+    "error_half_life_seconds": 120,  # Old errors fade even while a model isn't being called
+    "failures_before_cooldown": 3,
+    "cooldown_seconds": 60
+}
+
+# Chaptered Stories (outline first, then chapters written in parallel)
+CHAPTER_CONFIG = {
+    "lengths": ["long"],           # Story lengths generated chapter by chapter
+    "chapters": 3,
+    "outline_max_tokens": 300,
+    "bridge_max_tokens": 200       # Short smoothing pass between chapters
+}
+
+# Sequels (continuing a story on another night)
+# A sequel's prompt gets a short summary of the series so far, never the
+# earlier stories themselves, so it costs the same on night 10 as night 2.
+SEQUELS = {
+    "max_characters": 5,
+    "max_threads": 3,
+    "max_phrase_chars": 120
+}
+
+# Repeat Detection
+# Each child's recent stories are kept as MinHash signatures; a new story
+# more similar than threshold (estimated Jaccard over word 3-grams) to one
+# of them is written again, steered away from the earlier one.
+SIMILARITY = {
+    "num_perm": 128,          # Signature length
+    "bands": 64,              # LSH bands (num_perm / bands rows each)
+    "shingle_size": 3,
+    # Word 3-grams rarely repeat between two LLM stories: separately written
+    # ones share a few percent, a retelling of the same plot well under half.
+    # Check against recorded stories with similarity_check.py.
+    "threshold": 0.2,
+    "max_history": 60,        # Recent stories kept per child
+    "max_regenerations": 1
+}
+
+# Model Call Scheduling
+# Classes are served in this order: a parent waiting for a story, then the
+# judge, then background work (prefetch, batch jobs). Tenants within a class
+# take turns. A call whose class queue is full, or that can't start within
+# max_wait_seconds, is turned away at once instead of waiting.
+SCHEDULER = {
+    "max_concurrent": 16,  # Model calls in flight at once, all classes together
+    "classes": {
+        "interactive": {"max_running": 16, "max_queued": 64, "max_wait_seconds": 30},
+        "judge": {"max_running": 16, "max_queued": 64, "max_wait_seconds": 20},
+        "background": {"max_running": 4, "max_queued": 256, "max_wait_seconds": 600}
     }
 }
 
+# Deadlines (end-to-end latency budgets)
+DEADLINE_CONFIG = {
+    "request_timeout": 60.0,       # Per-attempt timeout when there's no deadline
+    "min_attempt_seconds": 3.0,    # Don't start a model call with less time than this
+    "judge_min_seconds": 8.0,      # Skip the judge with less time left than this
+    "revise_min_seconds": 15.0     # Skip auto-revision with less time left than this
+}
+
+# Length Control (adaptive max_tokens budgets)
+LENGTH_CONTROL = {
+    "end_marker": "<END OF STORY>",
+    "default_tokens_per_word": 1.35,  # Typical English prose before we've observed anything
+    "smoothing": 0.2,                 # Weight of each new observation in the running average
+    "headroom": 1.2,                  # Slack above the upper word target
+    "revision_growth": 1.3,           # Revisions may ask for a longer story
+    "min_tokens": 200
+}
+
+# Judge dimensions (scored 0-10 each, safety first)
+JUDGE_DIMENSIONS = [
+    "safety",
+    "age_appropriateness",
+    "concrete_descriptions",
+    "show_dont_tell",
+    "character_development",
+    "story_flow",
+    "engagement",
+    "bedtime_suitability",
+    "warmth"
+]
+
+# Judge Fan-Out
+# The nine dimensions split into groups, each scored by its own short judge
+# call, all at once: the evaluation takes as long as the slowest group
+# instead of one long answer. Used for the priorities listed in use_for.
+JUDGE_FAN_OUT = {
+    # safety and bedtime_suitability come from the safety gate's scores
+    "groups": {
+        "craft": ["age_appropriateness", "concrete_descriptions", "show_dont_tell", "story_flow"],
+        "engagement and warmth": ["character_development", "engagement", "warmth"]
+    },
+    "max_tokens": 250,       # Per group
+    "use_for": ["interactive"]
+}
+
 # Quality Thresholds
 QUALITY_THRESHOLDS = {
     "excellent": 9.0,
@@ -78,10 +200,49 @@ QUALITY_THRESHOLDS = {
     "needs_revision": 5.0
 }
 
+# Judge Safety Gate
+# A short safety/bedtime check that runs before the full evaluation; the
+# full nine-dimension report only runs if the story passes and a detailed
+# report was asked for
+SAFETY_GATE = {
+    "max_tokens": 60,
+    "min_scores": {"safety": 8.0, "bedtime_suitability": 7.0}
+}
+
 # Safety Settings
 SAFETY_ENABLED = True
 MAX_REVISION_ATTEMPTS = 3
 
+# Input Pre-Filter
+# Story ideas and feedback are checked locally before any model call.
+# Terms match whole words, ignoring case and punctuation.
+INPUT_FILTER = {
+    "max_lengths": {"goal": 500, "character_type": 100, "feedback": 300, "child_name": 50},
+    "blocked_terms": {
+        "violence": [
+            "kill", "kills", "killed", "killing", "murder", "murdered", "stab", "stabbed",
+            "shot dead", "gun", "guns", "blood", "bloody", "gore", "torture", "tortured",
+            "behead", "massacre"
+        ],
+        "adult": [
+            "sex", "sexy", "sexual", "naked", "nude", "porn", "kissing passionately"
+        ],
+        "substances": [
+            "drugs", "cocaine", "heroin", "vodka", "whiskey", "drunk",
+            "cigarette", "cigarettes", "vape"
+        ],
+        "self_harm": ["suicide", "self harm", "hurt myself", "hurt themselves"],
+        "horror": ["horror", "gory", "zombie apocalypse", "demonic"]
+    },
+    "injection_phrases": [
+        "ignore previous instructions", "ignore all previous instructions",
+        "ignore the above", "ignore your instructions", "disregard previous instructions",
+        "disregard the above", "forget your instructions", "forget all previous",
+        "new instructions", "system prompt", "reveal your prompt", "developer mode",
+        "jailbreak", "you are no longer", "pretend you are not", "do anything now"
+    ]
+}
+
 # Grandma Nona's Personality
 NONA_PERSONALITY = {
     "warmth": "Like a loving grandmother",
@@ -95,6 +256,57 @@ BASE_DIR = Path(__file__).parent.parent.parent
 ASSETS_DIR = BASE_DIR / "assets"
 IMAGES_DIR = ASSETS_DIR / "images"
 GIFS_DIR = ASSETS_DIR / "gifs"
+DATA_DIR = Path(__file__).parent.parent / "data"
+NAME_INDEX_PATH = DATA_DIR / "name_variants.tsv"
+
+# Story Archive (see utils/story_archive.py)
+STORY_ARCHIVE = {
+    "path": DATA_DIR / "story_archive",
+    "dictionary_size": 32 * 1024,  # Deflate can't look back further than 32 KB
+    "training_samples": 2000,      # Stories used to train the dictionary
+    "train_after_records": 200,    # An untrained archive is rebuilt with a dictionary at this size
+    "compression_level": 9
+}
+
+# Repeat detection history: signatures of each child profile's recent
+# stories (see utils/similarity.py), so a restart doesn't forget them
+SIMILARITY["history_path"] = DATA_DIR / "story_history"
+
+# Session Journal (see utils/session_journal.py)
+SESSION_JOURNAL = {
+    "path": DATA_DIR / "sessions.journal",
+    "compact_after_bytes": 16 * 1024 * 1024,  # Appended since the last compaction
+    "max_age_hours": 72,                      # Sessions untouched for longer are dropped
+    "fsync": True,                            # Survive power loss too, not just a crash
+    # The Gradio app only keeps its story on disk when asked to
+    "app_enabled": os.getenv("LITTLE_NONA_KEEP_STORIES", "") == "1"
+}
+
+# Nightly Stories (see nightly_service.py)
+# Families who subscribe get tomorrow's story written, judged and archived
+# ahead of time, during the provider's quiet hours, instead of at 7-9pm
+# when everyone asks at once.
+NIGHTLY_STORIES = {
+    "subscriptions_path": DATA_DIR / "subscriptions.json",
+    "off_peak_hours": (1, 16),       # Hours [start, end) in each family's timezone when stories are prepared
+    "default_timezone": "UTC",       # For subscriptions that don't give one
+    "days_ahead": 1,                 # Prepare stories up to this many days ahead
+    "max_attempts": 3,               # Stories written per night before giving up on the safety gate
+    "check_interval_seconds": 600,   # How often the worker looks for due subscriptions
+    "keep_days": 7                   # Prepared stories remembered per subscription
+}
+
+# Headless JSON API (api_server.py)
+API_SERVER = {
+    "host": os.getenv("LITTLE_NONA_API_HOST", "127.0.0.1"),
+    "port": int(os.getenv("LITTLE_NONA_API_PORT", "8080")),
+    "workers": 8,                    # Requests running model calls at once
+    "keep_alive_seconds": 15,        # Idle time before a connection is closed
+    "max_body_bytes": 64 * 1024,
+    "max_sessions": 1000,            # Oldest sessions are dropped beyond this
+    "idempotency_cache_size": 1000,  # Remembered Idempotency-Key responses
+    "busy_retry_after": 5            # Seconds, sent with 503 when calls are shed
+}
 
 # Gradio Settings
 GRADIO_CONFIG = {
@@ -0,0 +1,302 @@
+"""
+Little Nona - Nightly Stories
+Stories for subscribed children, prepared off-peak and served at bedtime
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from story_service import StorySession
+from utils.helpers import count_words
+from utils.input_filter import get_input_filter
+from utils.scheduler import SchedulerBusy
+from utils.story_archive import StoryArchive, get_archive
+from config.settings import NIGHTLY_STORIES, SCHEDULER, STORY_CATEGORIES, STORY_LENGTHS
+
+
+class SubscriptionStore:
+    """
+    Subscriptions kept in one small JSON file:
+
+        {id: {"id", "child_name", "age", "categories", "lengths",
+              "story_details", "tenant", "timezone", "created",
+              "prepared": {"2024-06-01": {"record_id", "score"}},
+              "served": ["2024-05-31", ...]}}
+
+    Every change rewrites the file through a temporary file, so a crash
+    never leaves it half written.
+    """
+
+    def __init__(self, path: Path = NIGHTLY_STORIES["subscriptions_path"]):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._subscriptions: Dict[str, Dict] = {}
+        if self.path.exists():
+            self._subscriptions = json.loads(self.path.read_text(encoding="utf-8"))
+
+    def subscribe(self, child_name: str, age: int, categories: List[str],
+                  lengths: Optional[List[str]] = None, story_details: Optional[Dict] = None,
+                  tenant: Optional[str] = None, timezone_name: Optional[str] = None) -> Dict:
+        """
+        Add a nightly story subscription. Categories (and lengths) take
+        turns, one per night. Nights follow the family's IANA timezone
+        (default_timezone if not given). Raises ValueError (InputRejected
+        for unsafe story details) if the choices aren't valid.
+        """
+        lengths = lengths or ["medium"]
+        timezone_name = timezone_name or NIGHTLY_STORIES["default_timezone"]
+        if not categories or any(c not in STORY_CATEGORIES for c in categories):
+            raise ValueError(f"categories must be chosen from: {', '.join(STORY_CATEGORIES)}")
+        if any(l not in STORY_LENGTHS for l in lengths):
+            raise ValueError(f"lengths must be chosen from: {', '.join(STORY_LENGTHS)}")
+        try:
+            ZoneInfo(timezone_name)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown timezone: {timezone_name!r} (use a name like \"Europe/Rome\")")
+
+        subscription = {
+            "id": uuid.uuid4().hex,
+            "child_name": get_input_filter().clean(child_name, "child_name"),
+            "age": age,
+            "categories": list(categories),
+            "lengths": list(lengths),
+            "story_details": get_input_filter().clean_story_details(story_details or {}),
+            "tenant": tenant,
+            "timezone": timezone_name,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "prepared": {},
+            "served": []
+        }
+        with self._lock:
+            self._subscriptions[subscription["id"]] = subscription
+            self._save()
+        return subscription
+
+    def unsubscribe(self, subscription_id: str) -> bool:
+        with self._lock:
+            removed = self._subscriptions.pop(subscription_id, None) is not None
+            if removed:
+                self._save()
+        return removed
+
+    def get(self, subscription_id: str) -> Optional[Dict]:
+        with self._lock:
+            subscription = self._subscriptions.get(subscription_id)
+            return json.loads(json.dumps(subscription)) if subscription else None
+
+    def all(self) -> List[Dict]:
+        with self._lock:
+            return json.loads(json.dumps(list(self._subscriptions.values())))
+
+    def record_prepared(self, subscription_id: str, day: date, record_id: int, score: Optional[float]):
+        """Remember the archived story for a night (and forget ones older than keep_days)."""
+        with self._lock:
+            subscription = self._subscriptions.get(subscription_id)
+            if subscription is None:
+                return  # Unsubscribed while the story was being written
+            subscription["prepared"][day.isoformat()] = {"record_id": record_id, "score": score}
+            oldest = (day - timedelta(days=NIGHTLY_STORIES["keep_days"])).isoformat()
+            subscription["prepared"] = {d: p for d, p in subscription["prepared"].items() if d >= oldest}
+            self._save()
+
+    def record_served(self, subscription_id: str, day: date):
+        with self._lock:
+            subscription = self._subscriptions.get(subscription_id)
+            if subscription is not None and day.isoformat() not in subscription["served"]:
+                subscription["served"] = subscription["served"][-NIGHTLY_STORIES["keep_days"]:]
+                subscription["served"].append(day.isoformat())
+                self._save()
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(self._subscriptions, indent=1), encoding="utf-8")
+        os.replace(temporary, self.path)
+
+
+def local_now(subscription: Dict, now: Optional[datetime] = None) -> datetime:
+    """The time where the subscribed family lives (now defaults to the current time)."""
+    zone = ZoneInfo(subscription.get("timezone") or NIGHTLY_STORIES["default_timezone"])
+    return (now or datetime.now(timezone.utc)).astimezone(zone)
+
+
+def choices_for(subscription: Dict, day: date) -> Tuple[str, str]:
+    """Category and length for a night (each list takes turns by date)."""
+    turn = day.toordinal()
+    categories, lengths = subscription["categories"], subscription["lengths"]
+    return categories[turn % len(categories)], lengths[turn % len(lengths)]
+
+
+def _passed_safety_gate(evaluation: Optional[Dict]) -> bool:
+    """Whether the judge's safety gate ran and passed (a failed or unreadable check doesn't count)."""
+    return bool(evaluation and (evaluation.get("safety_gate") or {}).get("passed"))
+
+
+class NightlyStories:
+    """
+    Writes, judges and archives subscribed children's stories ahead of
+    bedtime.
+
+    A family's stories are only written during off-peak hours in their
+    own timezone, a few at a time (the background class's max_running),
+    and every model call runs at background priority, so it never
+    competes with a parent waiting for a story. Each night gets one story that passed the safety gate (up
+    to max_attempts tries) and, if the judge scored it below "very good",
+    one revision, which is judged again before it's archived. At bedtime
+    it is read back from the archive with no model call at all.
+    """
+
+    def __init__(self, store: Optional[SubscriptionStore] = None,
+                 archive: Optional[StoryArchive] = None):
+        self.store = store or SubscriptionStore()
+        self.archive = archive or get_archive()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def is_off_peak(self, subscription: Dict, now: Optional[datetime] = None) -> bool:
+        start, end = NIGHTLY_STORIES["off_peak_hours"]
+        return start <= local_now(subscription, now).hour < end
+
+    def due(self, now: Optional[datetime] = None, off_peak_only: bool = False) -> List[Tuple[Dict, date]]:
+        """(subscription, night) pairs that still need a story, soonest night first."""
+        pairs = []
+        for subscription in self.store.all():
+            if off_peak_only and not self.is_off_peak(subscription, now):
+                continue
+            today = local_now(subscription, now).date()
+            for n in range(NIGHTLY_STORIES["days_ahead"] + 1):
+                night = today + timedelta(days=n)
+                if night.isoformat() not in subscription["prepared"]:
+                    pairs.append((subscription, night))
+        pairs.sort(key=lambda pair: pair[1])
+        return pairs
+
+    def run_once(self, now: Optional[datetime] = None, force: bool = False) -> int:
+        """Prepare every due story (off-peak only, unless force). Returns how many were stored."""
+        busy = threading.Event()
+
+        def prepare(subscription: Dict, night: date) -> bool:
+            if self._stop.is_set() or busy.is_set():
+                return False
+            try:
+                return self.prepare(subscription, night) is not None
+            except SchedulerBusy:
+                if not busy.is_set():
+                    busy.set()
+                    print("⏳ Nightly stories: model capacity is busy, trying again later.")
+            except Exception as e:
+                print(f"❌ Nightly story for {subscription['id'][:8]} ({night}) failed: {e}")
+            return False
+
+        due = self.due(now, off_peak_only=not force)
+        if not due:
+            return 0
+        workers = min(len(due), SCHEDULER["classes"]["background"]["max_running"])
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="nightly-story") as pool:
+            prepared = sum(pool.map(lambda pair: prepare(*pair), due))
+        if prepared:
+            print(f"🌙 Prepared {prepared} nightly stories.")
+        return prepared
+
+    def prepare(self, subscription: Dict, night: date) -> Optional[int]:
+        """Write, judge and archive one night's story. Returns its archive id (None if none passed)."""
+        category, length = choices_for(subscription, night)
+
+        for attempt in range(NIGHTLY_STORIES["max_attempts"]):
+            session = StorySession(
+                subscription["child_name"], subscription["age"], category,
+                dict(subscription["story_details"]), length,
+                tenant=subscription["tenant"], priority="background", profile_id=subscription["id"]
+            )
+            session.generate_initial_story()
+            evaluation = session.evaluate_current_story()
+            if not _passed_safety_gate(evaluation):
+                print(f"🔁 Nightly story attempt {attempt + 1} didn't pass the safety check.")
+                continue
+
+            session.auto_revise_if_needed(evaluation=evaluation)
+            if session.revision_count:
+                # Archive the revised story's own evaluation, which also rechecks its safety
+                evaluation = session.evaluate_current_story()
+                if not _passed_safety_gate(evaluation):
+                    continue
+
+            record_id = self.archive.append({
+                "kind": "nightly",
+                "subscription_id": subscription["id"],
+                "night": night.isoformat(),
+                "story": session.current_story,
+                "character_name": session.character_name,
+                "child_name": session.child_name,
+                "age": session.age,
+                "category": category,
+                "length": length,
+                "revised": bool(session.revision_count),
+                "evaluation": evaluation
+            })
+            self.store.record_prepared(subscription["id"], night, record_id, evaluation.get("overall_score"))
+            return record_id
+
+        print(f"⚠️ No nightly story passed for {subscription['id'][:8]} ({night}), "
+              "a fresh one will be written at bedtime.")
+        return None
+
+    def bedtime_story(self, subscription_id: str, night: Optional[date] = None) -> Optional[Dict]:
+        """The prepared story for a night (tonight where the family lives by default), or None if there isn't one."""
+        subscription = self.store.get(subscription_id)
+        if subscription is None:
+            return None
+        night = night or local_now(subscription).date()
+        prepared = subscription["prepared"].get(night.isoformat())
+        if prepared is None:
+            return None
+
+        record = self.archive.get(prepared["record_id"])
+        record["word_count"] = count_words(record["story"])
+        self.store.record_served(subscription_id, night)
+        return record
+
+    def start(self):
+        """Prepare stories in a background thread, checking every check_interval_seconds."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="nightly-stories", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"❌ Nightly stories check failed: {e}")
+            self._stop.wait(max(0.0, NIGHTLY_STORIES["check_interval_seconds"] - (time.monotonic() - started)))
+
+
+# Global service, created on first use
+_nightly: Optional[NightlyStories] = None
+_nightly_lock = threading.Lock()
+
+
+def get_nightly_stories() -> NightlyStories:
+    """Get the shared nightly story service."""
+    global _nightly
+    if _nightly is None:
+        with _nightly_lock:
+            if _nightly is None:
+                _nightly = NightlyStories()
+    return _nightly
@@ -4,27 +4,56 @@ Orchestrates the 3-agent system
 """
 
 import sys
+import threading
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from agents.storyteller import generate_story
 from agents.judge import evaluate_story, format_evaluation_report
 from agents.reviser import revise_story
-from utils.helpers import create_character_name, count_words
+from agents.summarizer import summarize_story
+from utils.helpers import create_character_name, count_words, truncate_text
+from utils.cancellation import CancellationToken
+from utils.deadline import Deadline
+from utils.story_history import StoryHistory
+from utils.input_filter import get_input_filter
+from utils.scheduler import SchedulerBusy
+from utils.similarity import get_similarity_registry
+from utils.session_journal import SessionJournal
+from config.settings import DEADLINE_CONFIG, QUALITY_THRESHOLDS, MAX_REVISION_ATTEMPTS, SIMILARITY
+
+
+class _FeedbackBatch:
+    """Revision notes that will go to the reviser together."""
+    
+    def __init__(self):
+        self.notes: List[str] = []
+        self.done = False
+        self.error: Optional[Exception] = None
 
 
 class StorySession:
     """Manages a complete story generation session."""
     
     def __init__(self, child_name: str, age: int, category: str, 
-                 story_details: Optional[Dict] = None, length: str = "medium"):
-        self.child_name = child_name
+                 story_details: Optional[Dict] = None, length: str = "medium",
+                 tenant: Optional[str] = None, priority: str = "interactive",
+                 profile_id: Optional[str] = None):
+        # Rejects unsafe or prompt-injection input (InputRejected) before any model call
+        self.child_name = get_input_filter().clean(child_name, "child_name")
         self.age = age
         self.category = category
-        self.story_details = story_details or {}
+        self.story_details = get_input_filter().clean_story_details(story_details or {})
         self.length = length
         
+        # Who the model calls are for, and how urgent they are (see utils/scheduler.py)
+        self.tenant = tenant
+        self.priority = priority
+        # Which child this is within the tenant (a subscription id, or one the
+        # caller chose); without it there's no story history to check repeats against
+        self.profile_id = profile_id
+        
         # Create similar character name
         self.character_name = create_character_name(child_name, category)
         self.story_details["character_name"] = self.character_name
@@ -32,52 +61,389 @@ class StorySession:
         # Story state
         self.current_story = None
         self.revision_count = 0
+        self.history: Optional[StoryHistory] = None
+        self.last_evaluation: Optional[Dict] = None
+        # Summary of the series up to and including this story, once asked for a sequel
+        self.series_summary: Optional[Dict] = None
+        
+        # Where changes are journaled, once persist() is called
+        self.journal: Optional[SessionJournal] = None
+        self.session_id: Optional[str] = None
+        self.version = 0  # Changes journaled so far
+        self._record_lock = threading.Lock()
+        
+        # Feedback that arrives while a revision is running waits in the
+        # open batch and is sent as one combined revision afterwards
+        self.last_revision_notes: List[str] = []
+        self._open_batch = _FeedbackBatch()
+        self._batch_lock = threading.Lock()
+        self._revise_lock = threading.Lock()
+    
+    def generate_initial_story(self, cancel_token: Optional[CancellationToken] = None,
+                               deadline: Optional[Deadline] = None):
+        """
+        Generate the initial story.
+        
+        If it comes out too much like one this child heard recently, it is
+        written again (time permitting), steered away from the earlier one.
+        Only sessions with a profile id have a history to check.
+        """
+        similarity = get_similarity_registry()
+        story_details = self.story_details
+        story = self._generate(story_details, cancel_token, deadline)
+        
+        for _ in range(SIMILARITY["max_regenerations"] if self.profile else 0):
+            match = similarity.find_similar(self.profile, story)
+            if not match:
+                break
+            if deadline and not deadline.has_time_for(DEADLINE_CONFIG["revise_min_seconds"]):
+                print("⏰ Story repeats a recent one, but there's no time to write another.")
+                break
+            print(f"🔁 Story is {match[0]:.0%} like a recent one, writing a different one...")
+            story_details = dict(self.story_details, avoid=match[1])
+            story = self._generate(story_details, cancel_token, deadline)
+        
+        if self.profile:
+            similarity.add(self.profile, story)
+        self.current_story = story
+        self.history = StoryHistory(self.current_story)
+        self._record("story")
+        return self.current_story
+    
+    def use_story(self, story: str):
+        """Start the session from a story written earlier (e.g. a prepared nightly story)."""
+        self.current_story = story
+        self.history = StoryHistory(story)
+        self._record("story")
+    
+    @property
+    def profile(self) -> Optional[str]:
+        """Key for this child's story history (repeat detection), or None without a profile id."""
+        if not self.profile_id:
+            return None
+        return f"{self.tenant or 'default'}:{self.profile_id}"
     
-    def generate_initial_story(self):
-        """Generate the initial story."""
-        self.current_story = generate_story(
+    def _generate(self, story_details: Dict, cancel_token: Optional[CancellationToken],
+                  deadline: Optional[Deadline]) -> str:
+        return generate_story(
             age=self.age,
             category=self.category,
             character_name=self.character_name,
             child_name=self.child_name,
-            story_details=self.story_details,
-            length=self.length
+            story_details=story_details,
+            length=self.length,
+            cancel_token=cancel_token,
+            deadline=deadline,
+            priority=self.priority,
+            tenant=self.tenant
         )
-        return self.current_story
     
-    def evaluate_current_story(self):
-        """Evaluate current story with judge agent."""
+    def evaluate_current_story(self, cancel_token: Optional[CancellationToken] = None,
+                               deadline: Optional[Deadline] = None, detailed: bool = True):
+        """
+        Evaluate current story with judge agent.
+        Skipped (returns None) if the deadline is too close for a judge call.
+        With detailed=False only the safety gate runs (see evaluate_story).
+        """
         if not self.current_story:
             return None
         
-        return evaluate_story(
+        if deadline and not deadline.has_time_for(DEADLINE_CONFIG["judge_min_seconds"]):
+            print("⏰ Skipping evaluation, not enough time left.")
+            return None
+        
+        evaluation = evaluate_story(
             story=self.current_story,
             age=self.age,
             category=self.category,
-            character_name=self.character_name
+            character_name=self.character_name,
+            cancel_token=cancel_token,
+            deadline=deadline,
+            priority=self.priority,
+            tenant=self.tenant,
+            detailed=detailed
         )
+        if evaluation:
+            self.last_evaluation = evaluation
+            self._record("evaluated")
+        return evaluation
+    
+    def auto_revise_if_needed(self, cancel_token: Optional[CancellationToken] = None,
+                              deadline: Optional[Deadline] = None,
+                              evaluation: Optional[Dict] = None):
+        """
+        Judge the current story (unless its evaluation is passed in) and
+        revise it from the judge's suggestions if it scores below "very
+        good" or failed the safety gate. Both steps are optional and are
+        skipped when the deadline is near.
+        
+        Returns the evaluation (None if skipped or failed). If the story
+        was revised, that is the evaluation of the story before the
+        revision, marked "before_revision": True; the revised story isn't
+        judged again here.
+        """
+        if evaluation is None:
+            try:
+                evaluation = self.evaluate_current_story(cancel_token, deadline)
+            except SchedulerBusy:
+                print("⏳ Skipping evaluation, the judge is busy.")
+                return None
+        gate = (evaluation or {}).get("safety_gate") or {}
+        if not evaluation or (evaluation.get("overall_score", 0) >= QUALITY_THRESHOLDS["very_good"]
+                              and gate.get("passed", True)):
+            return evaluation
+        
+        if deadline and not deadline.has_time_for(DEADLINE_CONFIG["revise_min_seconds"]):
+            print("⏰ Skipping auto-revision, not enough time left.")
+            return evaluation
+        
+        improvements = evaluation.get("improvements") or ["Make it warmer and more vivid"]
+        feedback = "\n".join(f"- {i}" for i in improvements)
+        with self._revise_lock:
+            revisions = self.revision_count
+            self._revise(feedback, feedback, cancel_token, deadline)
+        if self.revision_count > revisions:
+            evaluation = dict(evaluation, before_revision=True)
+        return evaluation
+    
+    def revise_from_user_feedback(self, user_feedback: str,
+                                  cancel_token: Optional[CancellationToken] = None,
+                                  deadline: Optional[Deadline] = None):
+        """
+        Revise story based on user's feedback.
+        
+        Notes sent while another revision is still running don't each get
+        their own reviser call: they queue up, and once the running one
+        finishes, all of them go into a single combined revision (using
+        one revision slot). Every caller gets back the story that includes
+        their note, or the error the combined revision failed with.
+        """
+        note = get_input_filter().clean(user_feedback, "feedback")
+        with self._batch_lock:
+            batch = self._open_batch
+            batch.notes.append(note)
+        
+        with self._revise_lock:
+            if batch.done:
+                # Another caller already revised with this note
+                if batch.error:
+                    raise batch.error
+                return self.current_story
+            
+            with self._batch_lock:
+                self._open_batch = _FeedbackBatch()
+            
+            try:
+                self._revise(_merge_notes(batch.notes), "; ".join(batch.notes), cancel_token, deadline)
+                self.last_revision_notes = batch.notes
+            except Exception as e:
+                batch.error = e
+                raise
+            finally:
+                batch.done = True
+            return self.current_story
     
-    def revise_from_user_feedback(self, user_feedback: str):
-        """Revise story based on user's feedback."""
-        if not self.current_story or self.revision_count >= 3:
+    def _revise(self, feedback: str, label: str, cancel_token: Optional[CancellationToken],
+                deadline: Optional[Deadline]):
+        """
+        Revise from feedback that has already been checked (the user's, or
+        the judge's). Callers hold _revise_lock.
+        """
+        if not self.current_story or self.revision_count >= MAX_REVISION_ATTEMPTS:
             return self.current_story
         
         self.current_story = revise_story(
             original_story=self.current_story,
-            feedback=user_feedback,
+            feedback=feedback,
             age=self.age,
-            character_name=self.character_name
+            character_name=self.character_name,
+            length=self.length,
+            cancel_token=cancel_token,
+            deadline=deadline,
+            child_name=self.child_name,
+            priority=self.priority,
+            tenant=self.tenant
         )
         
         self.revision_count += 1
+        self.history.commit(self.current_story, label=truncate_text(label, 40))
+        self._record("revised")
         return self.current_story
+    
+    def undo_revision(self) -> Optional[str]:
+        """Go back to the previous version (no model call). Returns None if there isn't one."""
+        if not self.history:
+            return None
+        story = self.history.undo()
+        if story is not None:
+            self.current_story = story
+            self._record("version")
+        return story
+    
+    def redo_revision(self) -> Optional[str]:
+        """Re-apply an undone revision. Returns None if there isn't one."""
+        if not self.history:
+            return None
+        story = self.history.redo()
+        if story is not None:
+            self.current_story = story
+            self._record("version")
+        return story
+    
+    def select_version(self, version: int) -> str:
+        """Switch to any version in the history, including other branches."""
+        self.current_story = self.history.select(version)
+        self._record("version")
+        return self.current_story
+    
+    def summarize_for_sequel(self, cancel_token: Optional[CancellationToken] = None,
+                             deadline: Optional[Deadline] = None) -> Optional[Dict]:
+        """
+        Short summary of the series so far (characters, setting, open
+        threads), kept with the session. Made once per story, when a
+        sequel is first asked for; a revision makes a new one.
+        """
+        if not self.current_story:
+            return None
+        if self.series_summary and self.series_summary.get("story_version") == self.history.current:
+            return self.series_summary
+        
+        summary = summarize_story(
+            self.current_story,
+            self.character_name,
+            previous=self.story_details.get("previously"),
+            cancel_token=cancel_token,
+            deadline=deadline,
+            priority=self.priority,
+            tenant=self.tenant
+        )
+        if summary:
+            summary["story_version"] = self.history.current
+            self.series_summary = summary
+            self._record("summarized")
+        return summary
+    
+    def start_sequel(self, cancel_token: Optional[CancellationToken] = None,
+                     deadline: Optional[Deadline] = None) -> "StorySession":
+        """
+        A new session for the next story in the series: same child and
+        character, with only this series' summary in the prompt (never the
+        earlier stories). Call generate_initial_story() on it to write it.
+        Raises ValueError if no summary could be made.
+        """
+        summary = self.summarize_for_sequel(cancel_token, deadline)
+        if not summary:
+            raise ValueError("Couldn't remember this story well enough to continue it, please try again")
+        
+        previously = {key: value for key, value in summary.items() if key != "story_version"}
+        story_details = {
+            key: value for key, value in self.story_details.items()
+            if key in ("character_type", "character_name")
+        }
+        story_details["previously"] = previously
+        
+        sequel = StorySession(self.child_name, self.age, self.category, None, self.length,
+                              self.tenant, self.priority, self.profile_id)
+        sequel.story_details = story_details
+        sequel.character_name = self.character_name
+        return sequel
+    
+    def persist(self, journal: SessionJournal, session_id: str):
+        """Journal this session (now and after every change) so it survives a restart."""
+        self.journal = journal
+        self.session_id = session_id
+        self._record("created")
+    
+    def _record(self, event: str):
+        if self.journal:
+            # Bump and append as one step, so entries land in the journal in version order
+            with self._record_lock:
+                self.version += 1
+                self.journal.record(self.session_id, event, self.to_dict())
+    
+    def to_dict(self) -> Dict:
+        """Everything needed to pick the session up again, without a model call (see from_dict)."""
+        return {
+            "child_name": self.child_name,
+            "age": self.age,
+            "category": self.category,
+            "story_details": self.story_details,
+            "length": self.length,
+            "tenant": self.tenant,
+            "priority": self.priority,
+            "profile_id": self.profile_id,
+            "character_name": self.character_name,
+            "current_story": self.current_story,
+            "revision_count": self.revision_count,
+            "history": self.history.to_dict() if self.history else None,
+            "last_evaluation": self.last_evaluation,
+            "last_revision_notes": self.last_revision_notes,
+            "series_summary": self.series_summary,
+            "version": self.version
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict, journal: Optional[SessionJournal] = None,
+                  session_id: Optional[str] = None) -> "StorySession":
+        """
+        Rebuild a session from to_dict() (its story details were checked
+        when it was created). Pass the journal it came from to keep
+        journaling its changes.
+        """
+        session = cls(data["child_name"], data["age"], data["category"], None, data["length"],
+                      data["tenant"], data["priority"], data.get("profile_id"))
+        session.story_details = dict(data["story_details"])
+        session.character_name = data["character_name"]
+        session.current_story = data["current_story"]
+        session.revision_count = data["revision_count"]
+        session.history = StoryHistory.from_dict(data["history"]) if data["history"] else None
+        session.last_evaluation = data["last_evaluation"]
+        session.last_revision_notes = data["last_revision_notes"]
+        session.series_summary = data.get("series_summary")
+        session.version = data.get("version", 0)
+        session.journal = journal
+        session.session_id = session_id
+        return session
+
+
+def _merge_notes(notes: List[str]) -> str:
+    """One reviser request from several notes (later notes win where they disagree)."""
+    if len(notes) == 1:
+        return notes[0]
+    merged = "\n".join(f"- {note}" for note in notes)
+    return f"{merged}\n(These were sent one after another; where they disagree, follow the later one.)"
 
 
 def create_story_simple(child_name: str, age: int, category: str,
-                       story_details: Optional[Dict] = None, length: str = "medium") -> Dict:
-    """Simple interface for creating a story."""
-    session = StorySession(child_name, age, category, story_details, length)
-    story = session.generate_initial_story()
+                       story_details: Optional[Dict] = None, length: str = "medium",
+                       cancel_token: Optional[CancellationToken] = None,
+                       latency_budget: Optional[float] = None,
+                       auto_revise: bool = False,
+                       tenant: Optional[str] = None,
+                       priority: str = "interactive",
+                       profile_id: Optional[str] = None) -> Dict:
+    """
+    Simple interface for creating a story.
+    
+    latency_budget (seconds) bounds the whole request: every model call
+    gets a timeout that fits what's left, and the optional judge and
+    auto-revise steps (auto_revise=True) are skipped when time is short.
+    When the story was revised, its evaluation is the one that led to
+    the revision, marked "before_revision".
+    
+    Batch jobs should pass priority="background" (and a tenant) so they
+    never hold up a parent waiting for a story. Pass a profile_id naming
+    the child within the tenant to have repeats of their recent stories
+    caught.
+    """
+    deadline = Deadline.from_budget(latency_budget)
+    session = StorySession(child_name, age, category, story_details, length, tenant, priority, profile_id)
+    story = session.generate_initial_story(cancel_token, deadline)
+    
+    evaluation = None
+    if auto_revise:
+        evaluation = session.auto_revise_if_needed(cancel_token, deadline)
+        story = session.current_story
     
     return {
         "story": story,
@@ -85,5 +451,6 @@ def create_story_simple(child_name: str, age: int, category: str,
         "word_count": count_words(story),
         "child_name": child_name,
         "age": age,
-        "category": category
+        "category": category,
+        "evaluation": evaluation
     }
@@ -0,0 +1,260 @@
+"""
+Little Nona - Corpus Analytics
+Vectorized quality statistics over large sets of stories and judge scores
+"""
+
+import json
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from config.settings import STORY_LENGTHS, JUDGE_DIMENSIONS, AGE_RANGE
+from utils.helpers import get_age_vocabulary
+
+
+def _is_any(buffer: np.ndarray, chars: str) -> np.ndarray:
+    """Flag bytes of the buffer that are one of the (ASCII) chars."""
+    mask = buffer == ord(chars[0])
+    for char in chars[1:]:
+        mask |= buffer == ord(char)
+    return mask
+
+
+class StoryCorpus:
+    """
+    Stories and their evaluations held as columnar numpy arrays.
+
+    Text statistics are computed once, for the whole corpus at a time:
+    all stories are joined into one byte buffer and words and sentences
+    are counted with array operations rather than a Python loop.
+
+    Columns (one entry per story):
+        age, category, length          int codes (see *_names for labels)
+        word_count, sentence_count     ints
+        name_mentions                  times character_name appears
+        child_name_mentions            times the real child_name appears
+        overall_score                  float (NaN if not evaluated)
+        scores                         float matrix, one column per JUDGE_DIMENSIONS
+
+    Sentence lengths are kept flat (sentence_words) with the story each
+    sentence belongs to (sentence_story).
+    """
+
+    def __init__(self, records: List[Dict]):
+        self.size = len(records)
+        self.category_names = sorted({r.get("category", "") for r in records})
+        self.length_names = list(STORY_LENGTHS)
+
+        category_codes = {name: i for i, name in enumerate(self.category_names)}
+        length_codes = {name: i for i, name in enumerate(self.length_names)}
+
+        self.age = np.array([r.get("age", 0) for r in records], dtype=np.int16)
+        self.category = np.array([category_codes[r.get("category", "")] for r in records], dtype=np.int16)
+        self.length = np.array([length_codes.get(r.get("length", "medium"), -1) for r in records], dtype=np.int16)
+
+        stories = [r.get("story") or "" for r in records]
+        self._count_text(stories)
+
+        # str.count runs in C, so these stay cheap even for big corpora
+        self.name_mentions = np.array(
+            [s.count(r["character_name"]) if r.get("character_name") else 0 for s, r in zip(stories, records)],
+            dtype=np.int32
+        )
+        self.child_name_mentions = np.array(
+            [_whole_word_count(s, r.get("child_name"), r.get("character_name")) for s, r in zip(stories, records)],
+            dtype=np.int32
+        )
+
+        self.overall_score = np.full(self.size, np.nan, dtype=np.float32)
+        self.scores = np.full((self.size, len(JUDGE_DIMENSIONS)), np.nan, dtype=np.float32)
+        for i, record in enumerate(records):
+            evaluation = record.get("evaluation") or {}
+            if "overall_score" in evaluation:
+                self.overall_score[i] = evaluation["overall_score"]
+            dimension_scores = evaluation.get("dimension_scores") or {}
+            for j, dimension in enumerate(JUDGE_DIMENSIONS):
+                if isinstance(dimension_scores.get(dimension), (int, float)):
+                    self.scores[i, j] = dimension_scores[dimension]
+
+    def _count_text(self, stories: List[str]):
+        """Word and sentence counts for every story in one pass over one buffer."""
+        if not stories:
+            self.word_count = self.sentence_count = self.sentence_words = np.zeros(0, dtype=np.int32)
+            self.sentence_story = np.zeros(0, dtype=np.int64)
+            return
+
+        encoded = [s.encode("utf-8") for s in stories]
+        lengths = np.array([len(b) for b in encoded], dtype=np.int64)
+        # A space after every story keeps words from running together
+        buffer = np.frombuffer(b" ".join(encoded) + b" ", dtype=np.uint8)
+        separators = np.cumsum(lengths + 1) - 1
+
+        # Space and ASCII control characters (tab, newline, ...) separate words
+        is_space = buffer <= 32
+        # A word starts at a non-space byte that follows a space (or the buffer start)
+        word_start = ~is_space
+        word_start[1:] &= is_space[:-1]
+        word_positions = np.flatnonzero(word_start)
+
+        # A sentence ends at . ! ? followed by a space (or by a closing quote
+        # and then a space), and at the end of every story
+        is_end = _is_any(buffer, ".!?")
+        sentence_break = _is_any(buffer, "\"'")
+        sentence_break[1:] &= is_end[:-1]
+        sentence_break |= is_end
+        sentence_break[:-1] &= is_space[1:]
+        sentence_break[separators] = True
+        break_positions = np.flatnonzero(sentence_break)
+
+        # Words per sentence: word starts up to each break, minus those up to
+        # the previous one (searching the few breaks, not the many bytes)
+        words_through = np.searchsorted(word_positions, break_positions, side="right")
+        words_per_sentence = np.diff(words_through, prepend=0)
+        story_of_sentence = np.searchsorted(separators, break_positions)
+
+        # Every story ends with its own break, so sentences never span stories
+        self.word_count = np.bincount(
+            story_of_sentence, weights=words_per_sentence, minlength=self.size
+        ).astype(np.int32)
+
+        # Drop the empty "sentences" left between a final full stop and the story end
+        non_empty = words_per_sentence > 0
+        self.sentence_words = words_per_sentence[non_empty].astype(np.int32)
+        self.sentence_story = story_of_sentence[non_empty]
+        self.sentence_count = np.bincount(self.sentence_story, minlength=self.size).astype(np.int32)
+
+
+def _whole_word_count(story: str, child_name: Optional[str], character_name: Optional[str]) -> int:
+    """Whole-word mentions of the child's real name (0 if it's also the character name)."""
+    if not child_name or child_name == character_name or child_name not in story:
+        return 0
+    return len(re.findall(rf"\b{re.escape(child_name)}\b", story))
+
+
+def load_corpus(path: Path) -> StoryCorpus:
+    """
+    Load a corpus from a JSON-lines file, one story per line:
+    {"story", "age", "category", "length", "character_name", "child_name", "evaluation"}
+    """
+    with open(path, encoding="utf-8") as f:
+        return StoryCorpus([json.loads(line) for line in f if line.strip()])
+
+
+def _word_target(length: str):
+    low, high = STORY_LENGTHS[length]["words"].split("-")
+    return int(low), int(high)
+
+
+def _sentence_target(age: int) -> Optional[tuple]:
+    """(min, max) words per sentence from get_age_vocabulary, if it gives a range."""
+    match = re.search(r"\((\d+)-(\d+) words\)", get_age_vocabulary(age)["sentences"])
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+def _rate(mask: np.ndarray) -> float:
+    return float(mask.mean()) if mask.size else 0.0
+
+
+def length_report(corpus: StoryCorpus) -> Dict[str, Dict]:
+    """Word counts against the STORY_LENGTHS target for each length."""
+    report = {}
+    for code, length in enumerate(corpus.length_names):
+        words = corpus.word_count[corpus.length == code]
+        if not words.size:
+            continue
+        low, high = _word_target(length)
+        report[length] = {
+            "stories": int(words.size),
+            "target": f"{low}-{high}",
+            "mean_words": float(words.mean()),
+            "p10_words": float(np.percentile(words, 10)),
+            "p90_words": float(np.percentile(words, 90)),
+            "in_range": _rate((words >= low) & (words <= high)),
+            "too_short": _rate(words < low),
+            "too_long": _rate(words > high)
+        }
+    return report
+
+
+def sentence_report(corpus: StoryCorpus) -> Dict[int, Dict]:
+    """Sentence-length distribution per age, against get_age_vocabulary's target."""
+    sentence_age = corpus.age[corpus.sentence_story]
+    report = {}
+    for age in range(AGE_RANGE["min"], AGE_RANGE["max"] + 1):
+        lengths = corpus.sentence_words[sentence_age == age]
+        if not lengths.size:
+            continue
+        row = {
+            "sentences": int(lengths.size),
+            "mean_words": float(lengths.mean()),
+            "p50_words": float(np.percentile(lengths, 50)),
+            "p90_words": float(np.percentile(lengths, 90))
+        }
+        target = _sentence_target(age)
+        if target:
+            row["target"] = f"{target[0]}-{target[1]}"
+            row["within_target"] = _rate((lengths >= target[0]) & (lengths <= target[1]))
+            row["too_long"] = _rate(lengths > target[1])
+        report[age] = row
+    return report
+
+
+def name_report(corpus: StoryCorpus) -> Dict[str, float]:
+    """How the character name (and the child's real name) show up in stories."""
+    return {
+        "stories": corpus.size,
+        "mean_character_mentions": float(corpus.name_mentions.mean()) if corpus.size else 0.0,
+        "missing_character_name": _rate(corpus.name_mentions == 0),
+        "child_name_leaked": _rate(corpus.child_name_mentions > 0)
+    }
+
+
+def score_report(corpus: StoryCorpus, by: str = "age") -> Dict:
+    """
+    Mean, count and low-score rate for every judge dimension, grouped
+    by "age" or "category". NaN (unscored) entries are ignored.
+    """
+    if by == "age":
+        codes, labels = corpus.age, {age: age for age in np.unique(corpus.age).tolist()}
+    elif by == "category":
+        codes, labels = corpus.category, dict(enumerate(corpus.category_names))
+    else:
+        raise ValueError(f"Can't group scores by {by!r}")
+
+    columns = np.column_stack((corpus.overall_score, corpus.scores))
+    names = ["overall"] + JUDGE_DIMENSIONS
+    scored = ~np.isnan(columns)
+    values = np.where(scored, columns, 0.0)
+
+    # Per-group sums via bincount on each column at once
+    groups = max(labels) + 1 if labels else 0
+    counts = np.stack([np.bincount(codes, weights=scored[:, j], minlength=groups) for j in range(len(names))], axis=1)
+    sums = np.stack([np.bincount(codes, weights=values[:, j], minlength=groups) for j in range(len(names))], axis=1)
+    low = np.stack([np.bincount(codes, weights=scored[:, j] & (values[:, j] < 7.0), minlength=groups)
+                    for j in range(len(names))], axis=1)
+
+    report = {}
+    for code, label in labels.items():
+        report[label] = {
+            name: {
+                "count": int(counts[code, j]),
+                "mean": float(sums[code, j] / counts[code, j]) if counts[code, j] else None,
+                "below_7": float(low[code, j] / counts[code, j]) if counts[code, j] else None
+            }
+            for j, name in enumerate(names)
+        }
+    return report
+
+
+def weekly_report(records: Iterable[Dict]) -> Dict:
+    """All of the above for one batch of stories."""
+    corpus = records if isinstance(records, StoryCorpus) else StoryCorpus(list(records))
+    return {
+        "lengths": length_report(corpus),
+        "sentences": sentence_report(corpus),
+        "names": name_report(corpus),
+        "scores_by_age": score_report(corpus, "age"),
+        "scores_by_category": score_report(corpus, "category")
+    }
@@ -4,23 +4,57 @@ Handles all API communication with error handling
 """
 
 import time
-from typing import Optional
-from config.settings import OPENAI_API_KEY, OPENAI_MODEL
+import threading
+from typing import Dict, List, Optional
+from config.settings import OPENAI_API_KEY, OPENAI_MODEL, DEADLINE_CONFIG, MODEL_TRAFFIC
+from utils.model_router import get_router
+from utils.cancellation import CancellationToken, GenerationCancelled
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.cassette import Cassette
+from utils.scheduler import get_scheduler, priority_class
 
 
 class OpenAIClient:
     """
     Wrapper for OpenAI API with error handling and retries.
+    
+    Modes (see MODEL_TRAFFIC in settings):
+    - "live": call the API
+    - "record": call the API and append every call to a cassette file
+    - "replay": answer from a cassette with the recorded latency
+      (scaled by replay_time_scale), without touching the network
     """
     
-    def __init__(self, api_key: Optional[str] = None):
-        self.api_key = api_key or OPENAI_API_KEY
-        if not self.api_key:
-            raise ValueError("OpenAI API key not found. Set OPENAI_API_KEY environment variable.")
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        mode: Optional[str] = None,
+        cassette_path: Optional[str] = None,
+        replay_time_scale: Optional[float] = None
+    ):
+        self.mode = mode or MODEL_TRAFFIC["mode"]
+        if self.mode not in ("live", "record", "replay"):
+            raise ValueError(f"Unknown model traffic mode: {self.mode}")
         
         self.model = OPENAI_MODEL
         self.client = None
-        self._setup_client()
+        self.cassette = None
+        self.replay_time_scale = (
+            MODEL_TRAFFIC["replay_time_scale"] if replay_time_scale is None else replay_time_scale
+        )
+        # Retry backoff runs on the same clock as the (replayed) latencies
+        self.backoff_scale = self.replay_time_scale if self.mode == "replay" else 1.0
+        
+        self.api_key = api_key or OPENAI_API_KEY
+        if self.mode != "live":
+            self.cassette = Cassette(cassette_path or MODEL_TRAFFIC["cassette_path"])
+        
+        if self.mode == "replay":
+            self.use_new_api = True  # Nothing to connect to
+        else:
+            if not self.api_key:
+                raise ValueError("OpenAI API key not found. Set OPENAI_API_KEY environment variable.")
+            self._setup_client()
     
     def _setup_client(self):
         """Setup OpenAI client (supports both old and new API versions)."""
@@ -40,7 +74,11 @@ class OpenAIClient:
         prompt: str,
         max_tokens: int = 1000,
         temperature: float = 0.7,
-        max_retries: int = 3
+        max_retries: int = 3,
+        stop: Optional[List[str]] = None,
+        model: Optional[str] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        deadline: Optional[Deadline] = None
     ) -> str:
         """
         Generate text from OpenAI with retry logic.
@@ -50,48 +88,89 @@ class OpenAIClient:
             max_tokens: Maximum tokens in response
             temperature: Sampling temperature (0.0-1.0)
             max_retries: Number of retry attempts
+            stop: Optional stop sequences
+            model: Model to use (defaults to OPENAI_MODEL)
+            cancel_token: Optional token to abort the call (and any backoff)
+            deadline: Optional deadline; caps each attempt's timeout and
+                shrinks the retry schedule to fit the time left
         
         Returns:
             Generated text response
         
         Raises:
+            GenerationCancelled: If cancel_token is cancelled
+            DeadlineExceeded: If the deadline leaves no time for an attempt
             Exception: If all retries fail
         """
-        retry_delay = 2  # seconds
+        return self.generate_detailed(
+            prompt, max_tokens, temperature, max_retries, stop, model, cancel_token, deadline
+        )["text"]
+    
+    def generate_detailed(
+        self,
+        prompt: str,
+        max_tokens: int = 1000,
+        temperature: float = 0.7,
+        max_retries: int = 3,
+        stop: Optional[List[str]] = None,
+        model: Optional[str] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        deadline: Optional[Deadline] = None,
+        template: Optional[str] = None
+    ) -> Dict:
+        """
+        Same as generate(), but also reports how the completion ended.
+        template names the prompt template, for cassettes (see _complete).
+        
+        Returns:
+            Dict with text, finish_reason ("stop" or "length"),
+            prompt_tokens, completion_tokens, model and latency (seconds)
+        """
+        retry_delay = 2 * self.backoff_scale  # seconds
         
         for attempt in range(max_retries):
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            
+            timeout = DEADLINE_CONFIG["request_timeout"]
+            if deadline:
+                deadline.raise_if_too_late()
+                timeout = deadline.attempt_timeout(timeout)
+            
             try:
-                if self.use_new_api:
-                    # New API
-                    response = self.client.chat.completions.create(
-                        model=self.model,
-                        messages=[{"role": "user", "content": prompt}],
-                        max_tokens=max_tokens,
-                        temperature=temperature
-                    )
-                    return response.choices[0].message.content
-                else:
-                    # Old API
-                    import openai
-                    response = openai.ChatCompletion.create(
-                        model=self.model,
-                        messages=[{"role": "user", "content": prompt}],
-                        max_tokens=max_tokens,
-                        temperature=temperature
-                    )
-                    return response.choices[0].message["content"]
+                return self._complete(
+                    prompt, max_tokens, temperature, stop, model or self.model, cancel_token, timeout,
+                    template
+                )
+            
+            except GenerationCancelled:
+                raise
             
             except Exception as e:
+                if cancel_token:
+                    # Aborting the stream surfaces as a connection error
+                    cancel_token.raise_if_cancelled()
+                
                 error_msg = str(e).lower()
+                # Retry on rate limits, timeouts, server errors
+                retryable = any(x in error_msg for x in ["rate_limit", "timeout", "timed out", "server_error", "503", "429"])
+                
+                # Shrink the backoff to what the deadline leaves for another attempt
+                if deadline and retryable:
+                    deadline.raise_if_too_late()
+                    retry_delay = min(
+                        retry_delay, deadline.remaining() - DEADLINE_CONFIG["min_attempt_seconds"]
+                    )
                 
                 # Check if we should retry
-                if attempt < max_retries - 1:
-                    # Retry on rate limits, timeouts, server errors
-                    if any(x in error_msg for x in ["rate_limit", "timeout", "server_error", "503", "429"]):
-                        print(f"⚠️  API call failed (attempt {attempt + 1}/{max_retries}). Retrying in {retry_delay}s...")
+                if attempt < max_retries - 1 and retryable:
+                    print(f"⚠️  API call failed (attempt {attempt + 1}/{max_retries}). Retrying in {retry_delay:.1f}s...")
+                    if cancel_token:
+                        cancel_token.wait(retry_delay)  # Wakes early if cancelled
+                    else:
                         time.sleep(retry_delay)
-                        retry_delay *= 2  # Exponential backoff
-                        continue
+                    retry_delay *= 2  # Exponential backoff
+                    continue
                 
                 # Final attempt failed or non-retryable error
                 if "rate_limit" in error_msg:
@@ -105,6 +184,183 @@ class OpenAIClient:
         
         raise Exception("Failed to call OpenAI API after all retries")
     
+    def _complete(
+        self,
+        prompt: str,
+        max_tokens: int,
+        temperature: float,
+        stop: Optional[List[str]],
+        model: str,
+        cancel_token: Optional[CancellationToken] = None,
+        timeout: float = DEADLINE_CONFIG["request_timeout"],
+        template: Optional[str] = None
+    ) -> Dict:
+        """
+        Make a single completion request (no retries), recording or
+        replaying it. The template tag is recorded with the request, so
+        replay can fall back to another call from the same template.
+        """
+        request = {
+            "model": model,
+            "prompt": prompt,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stop": stop,
+            "template": template
+        }
+        
+        if self.mode == "replay":
+            return self._replay(request, cancel_token, timeout)
+        
+        if self.mode == "live":
+            return self._complete_live(prompt, max_tokens, temperature, stop, model, cancel_token, timeout)
+        
+        start = time.monotonic()
+        try:
+            response = self._complete_live(prompt, max_tokens, temperature, stop, model, cancel_token, timeout)
+        except GenerationCancelled:
+            raise  # Nothing useful to replay
+        except Exception as e:
+            self.cassette.record(request, time.monotonic() - start, error=str(e))
+            raise
+        
+        self.cassette.record(request, response["latency"], response=response)
+        return response
+    
+    def _replay(
+        self,
+        request: Dict,
+        cancel_token: Optional[CancellationToken],
+        timeout: float
+    ) -> Dict:
+        """Serve a recorded call, taking as long as it originally did (scaled)."""
+        start = time.monotonic()
+        entry = self.cassette.find(request)
+        delay = entry["latency"] * self.replay_time_scale
+        
+        if delay > timeout:
+            self._wait(timeout, cancel_token)
+            raise Exception("Request timed out.")
+        self._wait(delay, cancel_token)
+        
+        if "error" in entry:
+            raise Exception(entry["error"])
+        
+        response = dict(entry["response"])
+        response["latency"] = time.monotonic() - start
+        return response
+    
+    def _wait(self, seconds: float, cancel_token: Optional[CancellationToken]):
+        if cancel_token:
+            cancel_token.wait(seconds)
+            cancel_token.raise_if_cancelled()
+        else:
+            time.sleep(seconds)
+    
+    def _complete_live(
+        self,
+        prompt: str,
+        max_tokens: int,
+        temperature: float,
+        stop: Optional[List[str]],
+        model: str,
+        cancel_token: Optional[CancellationToken] = None,
+        timeout: float = DEADLINE_CONFIG["request_timeout"]
+    ) -> Dict:
+        """Make a single completion request against the API."""
+        params = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "temperature": temperature
+        }
+        if stop:
+            params["stop"] = stop
+        
+        start = time.monotonic()
+        if self.use_new_api and cancel_token:
+            # Stream so the request can be aborted part way through
+            result = self._complete_streaming(params, cancel_token, timeout)
+            result["latency"] = time.monotonic() - start
+            return result
+        elif self.use_new_api:
+            # New API
+            response = self.client.chat.completions.create(timeout=timeout, **params)
+            choice = response.choices[0]
+            text = choice.message.content
+        else:
+            # Old API
+            import openai
+            response = openai.ChatCompletion.create(request_timeout=timeout, **params)
+            choice = response.choices[0]
+            text = choice.message["content"]
+        
+        usage = getattr(response, "usage", None)
+        return {
+            "text": text or "",
+            "finish_reason": choice.finish_reason,
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) if usage else 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) if usage else 0,
+            "model": model,
+            "latency": time.monotonic() - start
+        }
+    
+    def _complete_streaming(self, params: Dict, cancel_token: CancellationToken, timeout: float) -> Dict:
+        """
+        Stream a completion, closing the HTTP stream as soon as the token
+        is cancelled so no more tokens are generated (or billed).
+        
+        The client's timeout only bounds each read, so a timer also closes
+        the stream once the whole attempt has taken `timeout` seconds.
+        """
+        start = time.monotonic()
+        stream = self.client.chat.completions.create(
+            stream=True,
+            stream_options={"include_usage": True},
+            timeout=timeout,
+            **params
+        )
+        unregister = cancel_token.on_cancel(stream.close)
+        timer = threading.Timer(max(0.0, timeout - (time.monotonic() - start)), stream.close)
+        timer.daemon = True
+        timer.start()
+        
+        parts = []
+        finish_reason = None
+        usage = None
+        try:
+            for chunk in stream:
+                if cancel_token.cancelled or time.monotonic() - start >= timeout:
+                    break
+                if chunk.usage:
+                    usage = chunk.usage
+                if chunk.choices:
+                    choice = chunk.choices[0]
+                    if choice.delta.content:
+                        parts.append(choice.delta.content)
+                    if choice.finish_reason:
+                        finish_reason = choice.finish_reason
+        except Exception:
+            # Reading a stream the timer closed fails; report that as the timeout it is
+            if not cancel_token.cancelled and time.monotonic() - start >= timeout:
+                raise Exception("Request timed out.")
+            raise
+        finally:
+            timer.cancel()
+            unregister()
+            stream.close()
+        
+        cancel_token.raise_if_cancelled()
+        if finish_reason is None and time.monotonic() - start >= timeout:
+            raise Exception("Request timed out.")
+        return {
+            "text": "".join(parts),
+            "finish_reason": finish_reason,
+            "prompt_tokens": usage.prompt_tokens if usage else 0,
+            "completion_tokens": usage.completion_tokens if usage else 0,
+            "model": params["model"]
+        }
+    
     def test_connection(self) -> bool:
         """Test if API connection works."""
         try:
@@ -126,14 +382,112 @@ def get_client(api_key: Optional[str] = None) -> OpenAIClient:
     return _client
 
 
+def set_client(client: OpenAIClient):
+    """Install a client instance (e.g. a fake backend for load tests)."""
+    global _client
+    _client = client
+
+
 def call_model(
     prompt: str,
     max_tokens: int = 1000,
-    temperature: float = 0.7
+    temperature: float = 0.7,
+    stop: Optional[List[str]] = None,
+    agent: Optional[str] = None,
+    cancel_token: Optional[CancellationToken] = None,
+    deadline: Optional[Deadline] = None,
+    priority: str = "interactive",
+    tenant: Optional[str] = None,
+    template: Optional[str] = None
 ) -> str:
     """
     Convenience function to call the model.
     Uses the global client instance.
+    
+    If agent is given, the model is picked from that agent's routing
+    table in AGENT_CONFIG (see call_model_detailed).
+    """
+    return call_model_detailed(
+        prompt, max_tokens, temperature, stop, agent, cancel_token, deadline, priority, tenant, template
+    )["text"]
+
+
+def call_model_detailed(
+    prompt: str,
+    max_tokens: int = 1000,
+    temperature: float = 0.7,
+    stop: Optional[List[str]] = None,
+    agent: Optional[str] = None,
+    cancel_token: Optional[CancellationToken] = None,
+    deadline: Optional[Deadline] = None,
+    priority: str = "interactive",
+    tenant: Optional[str] = None,
+    template: Optional[str] = None
+) -> Dict:
+    """
+    Like call_model(), but returns the completion details
+    (text, finish_reason, token usage) instead of just the text.
+    
+    template names the prompt template ("storyteller.chapter"), which
+    cassettes record to tell calls from different prompts apart; it
+    defaults to the agent.
+    
+    Every call first waits for a slot from the scheduler: priority
+    ("interactive" or "background") and the agent pick its class, and
+    tenant identifies the family or job for fair sharing. Raises
+    SchedulerBusy when the call is shed.
+    
+    With an agent, each model in its routing table is tried in the
+    order chosen by the router. Fallback models are tried straight away
+    instead of backing off; only the last candidate gets full retries.
     """
+    klass = priority_class(agent, priority)
+    with get_scheduler().slot(klass, tenant, cancel_token, deadline):
+        return _call_routed(prompt, max_tokens, temperature, stop, agent, cancel_token, deadline,
+                            template or agent)
+
+
+def _call_routed(
+    prompt: str,
+    max_tokens: int,
+    temperature: float,
+    stop: Optional[List[str]],
+    agent: Optional[str],
+    cancel_token: Optional[CancellationToken],
+    deadline: Optional[Deadline],
+    template: Optional[str]
+) -> Dict:
     client = get_client()
-    return client.generate(prompt, max_tokens, temperature)
+    if not agent:
+        return client.generate_detailed(
+            prompt, max_tokens, temperature,
+            stop=stop, cancel_token=cancel_token, deadline=deadline, template=template
+        )
+    
+    router = get_router()
+    models = router.candidates(agent)
+    
+    for i, model in enumerate(models):
+        is_last = i == len(models) - 1
+        try:
+            response = client.generate_detailed(
+                prompt, max_tokens, temperature,
+                max_retries=3 if is_last else 1,
+                stop=stop,
+                model=model,
+                cancel_token=cancel_token,
+                deadline=deadline,
+                template=template
+            )
+        except (GenerationCancelled, DeadlineExceeded):
+            raise
+        except Exception as e:
+            router.record_failure(model)
+            # A bad key fails the same way on every model
+            if is_last or "api key" in str(e).lower():
+                raise
+            print(f"⚠️  {agent} call to {model} failed, falling back to {models[i + 1]}...")
+            continue
+        
+        router.record_success(model, response["latency"])
+        return response
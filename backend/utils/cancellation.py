@@ -0,0 +1,71 @@
+"""
+Little Nona - Cancellation
+Lets callers stop an in-flight story generation
+"""
+
+import threading
+from typing import Callable, List
+
+
+class GenerationCancelled(Exception):
+    """Raised when a generation is cancelled before it finishes."""
+    pass
+
+
+class CancellationToken:
+    """
+    Thread-safe cancellation flag shared between a caller and the work it started.
+
+    Long-running code checks the token between steps (raise_if_cancelled),
+    sleeps on it instead of time.sleep (wait), and can register callbacks
+    that abort blocking I/O, such as closing an HTTP stream (on_cancel).
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        """Cancel the work and run any registered abort callbacks."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass  # Aborting is best effort
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise GenerationCancelled("🛑 Story generation was cancelled.")
+
+    def wait(self, seconds: float) -> bool:
+        """Sleep for up to `seconds`. Returns True if cancelled meanwhile."""
+        return self._event.wait(seconds)
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Register a callback to run on cancel (immediately, if already cancelled).
+        Returns a function that unregisters it.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+
+        callback()
+        return lambda: None
+
+    def _remove(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
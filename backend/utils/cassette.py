@@ -0,0 +1,109 @@
+"""
+Little Nona - Model Traffic Cassettes
+Records model calls to a file and serves them back for replay runs
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class CassetteMiss(Exception):
+    """Raised in replay mode when no recorded call matches a request."""
+    pass
+
+
+def request_key(request: Dict) -> str:
+    """Stable hash of everything that affects a model's answer."""
+    raw = json.dumps(
+        [request["model"], request["prompt"], request["max_tokens"],
+         request["temperature"], request.get("stop")],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def request_kind(request: Dict) -> str:
+    """
+    The prompt template a request was made from: its template tag
+    ("storyteller.chapter"). Untagged requests fall back to the prompt's
+    first line, which several templates can share.
+    """
+    return request.get("template") or request["prompt"].strip().split("\n", 1)[0]
+
+
+class Cassette:
+    """
+    JSON-lines file of recorded model calls, one per line:
+
+        {"key", "kind", "request", "response" | "error", "latency", "recorded_at"}
+
+    Recording appends as calls finish. Replay matches a request by its
+    exact key first, so an unchanged code path gets back exactly what it
+    got in production. If nothing matches exactly (for instance after a
+    prompt change), it falls back to calls recorded for the same prompt
+    template (the request's template tag, see request_kind), in recorded
+    order, unless strict is set.
+    """
+
+    def __init__(self, path: Path, strict: bool = False):
+        self.path = Path(path)
+        self.strict = strict
+        self._lock = threading.Lock()
+        self._by_key: Optional[Dict[str, List[Dict]]] = None
+        self._by_kind: Optional[Dict[str, List[Dict]]] = None
+        self._positions: Dict[str, int] = defaultdict(int)
+
+    def record(self, request: Dict, latency: float,
+               response: Optional[Dict] = None, error: Optional[str] = None):
+        """Append one call (its response, or the error it raised)."""
+        entry = {
+            "key": request_key(request),
+            "kind": request_kind(request),
+            "request": request,
+            "latency": latency,
+            "recorded_at": time.time()
+        }
+        if error is not None:
+            entry["error"] = error
+        else:
+            entry["response"] = {k: v for k, v in response.items() if k != "latency"}
+
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def find(self, request: Dict) -> Dict:
+        """Next recorded call matching a request (see class docstring)."""
+        with self._lock:
+            self._load()
+            key = request_key(request)
+            entries = self._by_key.get(key)
+            if not entries and not self.strict:
+                key = request_kind(request)
+                entries = self._by_kind.get(key)
+
+            if entries:
+                # Cycle through the matches so repeated requests get varied answers
+                position = self._positions[key]
+                self._positions[key] = position + 1
+                return entries[position % len(entries)]
+
+        raise CassetteMiss(f"No recorded call matches this request ({request_kind(request)[:60]!r})")
+
+    def _load(self):
+        if self._by_key is not None:
+            return
+        self._by_key = defaultdict(list)
+        self._by_kind = defaultdict(list)
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._by_key[entry["key"]].append(entry)
+                    self._by_kind[entry["kind"]].append(entry)
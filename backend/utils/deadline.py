@@ -0,0 +1,50 @@
+"""
+Little Nona - Deadlines
+End-to-end latency budgets for story requests
+"""
+
+import time
+from typing import Optional
+from config.settings import DEADLINE_CONFIG
+
+
+class DeadlineExceeded(Exception):
+    """Raised when there isn't enough time left to make another model call."""
+    pass
+
+
+class Deadline:
+    """
+    A point in time by which a whole story request must finish.
+
+    Created once per request and passed down to every model call, which
+    uses it to cap its per-attempt timeout and retry backoff.
+    """
+
+    def __init__(self, seconds: float):
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def from_budget(cls, seconds: Optional[float]) -> Optional["Deadline"]:
+        """Deadline for a latency budget in seconds (None means no deadline)."""
+        return cls(seconds) if seconds else None
+
+    def remaining(self) -> float:
+        """Seconds left (never negative)."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def has_time_for(self, seconds: float) -> bool:
+        """Whether a step expected to take `seconds` still fits."""
+        return self.remaining() >= seconds
+
+    def raise_if_too_late(self):
+        """Raise if there isn't time for even a minimal model call."""
+        if not self.has_time_for(DEADLINE_CONFIG["min_attempt_seconds"]):
+            raise DeadlineExceeded(
+                f"⏰ Ran out of time (budget was {self.budget:.0f}s). Please try again."
+            )
+
+    def attempt_timeout(self, default: float) -> float:
+        """Timeout for the next model call: the default, or what's left if less."""
+        return min(default, self.remaining())
@@ -0,0 +1,175 @@
+"""
+Little Nona - Fake Model Backend
+Stand-in for the OpenAI API with configurable latency and failures
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+from config.settings import OPENAI_MODEL, DEADLINE_CONFIG
+from utils.api_client import OpenAIClient
+from utils.cancellation import CancellationToken
+
+
+STORY_SENTENCES = [
+    "The little bunny hopped across the soft green meadow.",
+    "Golden stars twinkled high above the quiet hills.",
+    "A gentle breeze whispered through the tall pine trees.",
+    "They shared warm cookies by the crackling fire.",
+    "The moon smiled down with a silver glow.",
+    "Tiny fireflies danced like floating lanterns.",
+    "A friendly owl hooted a sleepy goodnight song.",
+    "Soft blankets felt as cozy as a warm hug."
+]
+
+
+class FakeModelClient(OpenAIClient):
+    """
+    OpenAIClient that answers locally instead of calling the API.
+
+    Only the single-request step (_complete) is replaced, so retries,
+    timeouts, routing and cancellation behave as they do in production.
+    Latency is time-to-first-token plus a per-token cost, with random
+    jitter. Errors come from a configurable failure rate and from an
+    optional cap on concurrent requests (simulating provider rate limits).
+    time_scale speeds up the latencies and the retry backoff alike.
+    """
+
+    def __init__(
+        self,
+        first_token_latency: float = 0.5,
+        per_token_latency: float = 0.01,
+        jitter: float = 0.25,
+        error_rate: float = 0.0,
+        max_concurrency: Optional[int] = None,
+        time_scale: float = 1.0,
+        seed: Optional[int] = None
+    ):
+        # No API key or openai package needed
+        self.api_key = "fake"
+        self.model = OPENAI_MODEL
+        self.client = None
+        self.use_new_api = True
+        self.mode = "live"
+        self.cassette = None
+
+        self.first_token_latency = first_token_latency
+        self.per_token_latency = per_token_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.max_concurrency = max_concurrency
+        self.time_scale = time_scale
+        self.backoff_scale = time_scale
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._active = 0
+
+    def _complete(
+        self,
+        prompt: str,
+        max_tokens: int,
+        temperature: float,
+        stop: Optional[List[str]],
+        model: str,
+        cancel_token: Optional[CancellationToken] = None,
+        timeout: float = DEADLINE_CONFIG["request_timeout"],
+        template: Optional[str] = None
+    ) -> Dict:
+        with self._lock:
+            if self.max_concurrency and self._active >= self.max_concurrency:
+                raise Exception("Error code: 429 - rate_limit (fake backend)")
+            failed = self._rng.random() < self.error_rate
+            jitter = self._rng.lognormvariate(0, self.jitter)
+            self._active += 1
+
+        try:
+            text = self._fake_response(prompt, max_tokens)
+            completion_tokens = min(max_tokens, int(len(text.split()) * 1.35))
+            finish_reason = "length" if completion_tokens >= max_tokens else "stop"
+
+            latency = (self.first_token_latency + completion_tokens * self.per_token_latency) * jitter
+            latency *= self.time_scale
+            if failed:
+                latency = self.first_token_latency * self.time_scale
+
+            start = time.monotonic()
+            if latency > timeout:
+                self._wait(timeout, cancel_token)
+                raise Exception("Request timed out.")
+            self._wait(latency, cancel_token)
+
+            if failed:
+                raise Exception("Error code: 503 - server_error (fake backend)")
+
+            return {
+                "text": text,
+                "finish_reason": finish_reason,
+                "prompt_tokens": int(len(prompt.split()) * 1.35),
+                "completion_tokens": completion_tokens,
+                "model": model,
+                "latency": time.monotonic() - start
+            }
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _fake_response(self, prompt: str, max_tokens: int) -> str:
+        """A judge, outline, bridges or summary-shaped JSON answer, or a story-shaped text, by prompt."""
+        if prompt.startswith("Safety check"):
+            return json.dumps({
+                "safety": 10.0,
+                "bedtime_suitability": round(self._rng.uniform(7.5, 10.0), 1),
+                "concern": ""
+            })
+        if prompt.startswith("Score this bedtime story"):
+            dimensions = re.findall(r"^- (\w+):", prompt, re.MULTILINE)
+            return json.dumps({
+                "scores": {d: round(self._rng.uniform(7.0, 10.0), 1) for d in dimensions},
+                "strengths": ["Gentle, calming ending"],
+                "improvements": ["Add more sounds and colors"]
+            })
+        if prompt.startswith("Summarize this bedtime story"):
+            return json.dumps({
+                "characters": ["A little bunny with a red scarf", "A wise old owl"],
+                "setting": "A quiet meadow by a silver pond",
+                "open_threads": ["The owl promised to show the bunny the stars"],
+                "recap": "A bunny made friends with an owl in the meadow."
+            })
+        if prompt.startswith("Plan a "):
+            chapters = int(re.search(r"in (\d+) chapters", prompt).group(1))
+            return json.dumps({
+                "setting": "A quiet meadow by a silver pond, with crickets singing",
+                "style": "Soft and slow, repeating \"hop, hop, hush\"",
+                "characters": ["A little bunny with a red scarf", "A wise old owl"],
+                "chapters": [
+                    {"summary": f"Part {i + 1} of the bunny's evening walk",
+                     "ends_with": f"The bunny reaches stepping stone {i + 1}"}
+                    for i in range(chapters)
+                ]
+            })
+        if prompt.startswith("These are the joins"):
+            joins = len(re.findall(r"^JOIN \d+:", prompt, re.MULTILINE))
+            return json.dumps({"bridges": [self._rng.choice(STORY_SENTENCES) for _ in range(joins)]})
+        if "JSON" in prompt:
+            score = round(self._rng.uniform(7.0, 9.8), 1)
+            return json.dumps({
+                "overall_score": score,
+                "needs_revision": score < 8.5,
+                "dimension_scores": {"safety": 10.0, "bedtime_suitability": 9.0, "warmth": score},
+                "strengths": ["Gentle, calming ending"],
+                "improvements": ["Add more sounds and colors"]
+            })
+
+        match = re.search(r"(\d+)-(\d+) words", prompt)
+        words = self._rng.randint(int(match.group(1)), int(match.group(2))) if match else 450
+        words = min(words, int(max_tokens / 1.35))
+
+        sentences = []
+        while sum(len(s.split()) for s in sentences) < words:
+            sentences.append(self._rng.choice(STORY_SENTENCES))
+        paragraphs = [" ".join(sentences[i:i + 4]) for i in range(0, len(sentences), 4)]
+        return "\n\n".join(paragraphs)
@@ -5,7 +5,8 @@ Helper functions for story generation
 
 import re
 import json
-from typing import Dict, Optional
+from typing import Dict, List, Optional
+from utils.name_index import get_name_index
 
 
 def create_character_name(child_name: str, category: str) -> str:
@@ -14,82 +15,34 @@ def create_character_name(child_name: str, category: str) -> str:
     This makes the child feel connected but maintains story magic.
     
     Strategies:
-    1. Diminutives (Elizabeth → Ellie, Benjamin → Benji)
+    1. Name variant index (diminutives, rhymes, cross-cultural variants),
+       e.g. Elizabeth → Ellie, Jason → Mason, Alejandro → Ale
     2. Add 'y'/'ie' ending (Jack → Jackie, Sam → Sammy)
-    3. Rhyming pairs (Anna → Hannah, Jason → Mason)
-    4. Letter swaps (Emma → Emmy, Mia → Mimi)
-    5. First syllable variations (Alexander → Alex, Isabella → Bella)
+    3. Letter swaps (Emma → Emmy, Mia → Mimi)
+    4. First syllable variations (Alexander → Alex, Isabella → Bella)
     """
     name = child_name.strip().title()
     
-    # Common diminutives and variations
-    transformations = {
-        # -a to -y endings
-        "Emma": "Emmy",
-        "Mia": "Mimi", 
-        "Sophia": "Sophie",
-        "Olivia": "Liv",
-        "Isabella": "Bella",
-        "Amelia": "Milly",
-        "Ella": "Ellie",
-        "Anna": "Annie",
-        "Luna": "Lulu",
-        
-        # -er/-ar to -y
-        "Alexander": "Alex",
-        "Christopher": "Chris",
-        "Oliver": "Ollie",
-        
-        # Add -ie/-y
-        "Jack": "Jackie",
-        "Sam": "Sammy",
-        "Tom": "Tommy",
-        "Ben": "Benny",
-        "Max": "Maxie",
-        "Luke": "Lukey",
-        
-        # Rhyming pairs
-        "Jason": "Mason",
-        "Hannah": "Anna",
-        "Ethan": "Nathan",
-        
-        # Common boys names
-        "Michael": "Mikey",
-        "William": "Will",
-        "James": "Jamie",
-        "Daniel": "Danny",
-        "Matthew": "Matty",
-        "Lucas": "Luke",
-        "Henry": "Hank",
-        "Benjamin": "Benji",
-        "Samuel": "Sammy",
-        "David": "Davey",
-        "Joseph": "Joey",
-        "Jacob": "Jake",
-        "Ryan": "Ry",
-        "Andrew": "Andy",
-        "Joshua": "Josh",
-        
-        # Common girls names
-        "Elizabeth": "Ellie",
-        "Victoria": "Vicky",
-        "Katherine": "Katie",
-        "Margaret": "Maggie",
-        "Jennifer": "Jenny",
-        "Jessica": "Jessie",
-        "Sarah": "Sadie",
-        "Emily": "Emma",
-        "Grace": "Gracie",
-        "Lily": "Lilly",
-        "Chloe": "Coco",
-        "Zoe": "Zoey",
-    }
-    
-    # Check direct mapping
-    if name in transformations:
-        return transformations[name]
+    # Check the precomputed index first
+    variant = get_name_index().lookup(name)
+    if variant:
+        return variant
     
-    # Try generic transformations
+    return _suffix_variant(name)
+
+
+def create_character_names(child_names: List[str], category: str) -> List[str]:
+    """
+    Bulk version of create_character_name().
+    Looks all names up in the index in one pass.
+    """
+    names = [child_name.strip().title() for child_name in child_names]
+    variants = get_name_index().bulk_lookup(names)
+    return [variants[name] or _suffix_variant(name) for name in names]
+
+
+def _suffix_variant(name: str) -> str:
+    """Generic rules for names that aren't in the variant index."""
     # Strategy 1: If ends in 'a', change to 'y'
     if name.endswith('a') and len(name) > 3:
         return name[:-1] + 'y'
@@ -141,11 +94,11 @@ def validate_age(age_input: str) -> Optional[int]:
 def validate_name(name: str) -> bool:
     """
     Validate child's name.
-    Must be letters, spaces, or hyphens only.
+    Must be letters (any alphabet), spaces, or hyphens only.
     """
     if not name or len(name) > 50:
         return False
-    return bool(re.match(r'^[a-zA-Z\s\-]+$', name))
+    return bool(re.match(r'^(?:[^\W\d_]|[\s\-])+$', name))
 
 
 def extract_json_from_response(response: str) -> Optional[Dict]:
@@ -289,9 +242,11 @@ def add_nona_warmth(message: str) -> str:
     return message
 
 
-def sanitize_story_input(text: str) -> str:
+def sanitize_story_input(text: str, max_length: int = 500) -> str:
     """Clean and sanitize user story input."""
     # Remove excessive whitespace
     text = " ".join(text.split())
-    # Limit length
-    return text[:500] if text else ""
+    # Limit length (at a word boundary where possible)
+    if len(text) > max_length:
+        text = text[:max_length].rsplit(" ", 1)[0] or text[:max_length]
+    return text
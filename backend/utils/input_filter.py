@@ -0,0 +1,180 @@
+"""
+Little Nona - Input Pre-Filter
+Rejects unsafe or prompt-injection input locally, before any model call
+"""
+
+import re
+import threading
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+from config.settings import INPUT_FILTER, LENGTH_CONTROL, SAFETY_ENABLED
+from utils.helpers import sanitize_story_input
+
+# "no guns", "without blood" ask for the term to be left out
+NEGATIONS = {"no", "not", "without", "remove", "less", "fewer", "never", "stop"}
+
+# Story details only the service itself sets (sequel summary, repeat avoidance);
+# a client sending them would put unchecked text into the prompt
+RESERVED_DETAILS = {"previously", "avoid"}
+
+# Punctuation that ends a clause: a negation never reaches past it ("No! Kill...")
+CLAUSE_BREAKS = ".,;:!?"
+
+REJECTION_MESSAGES = {
+    "violence": "Grandma Nona only tells gentle stories. Please leave out \"{term}\".",
+    "adult": "That isn't right for a children's story. Please leave out \"{term}\".",
+    "substances": "That isn't right for a children's story. Please leave out \"{term}\".",
+    "self_harm": "Grandma Nona can't tell that story. Please leave out \"{term}\".",
+    "horror": "Bedtime stories should be calm, not scary. Please leave out \"{term}\".",
+    "injection": "Please describe the story only (no instructions for the storyteller).",
+    "format": "Story details must be plain text (\"{term}\" isn't)."
+}
+
+
+class InputRejected(ValueError):
+    """Raised when story input is blocked by the pre-filter."""
+
+    def __init__(self, category: str, term: str):
+        super().__init__(REJECTION_MESSAGES[category].format(term=term))
+        self.category = category
+        self.term = term
+
+
+def normalize(text: str, keep_clauses: bool = False) -> str:
+    """
+    Casefolded words separated by single spaces, padded so every word has
+    a space on both sides. With keep_clauses, clause-ending punctuation is
+    kept as a word of its own, so no phrase matches across it.
+    """
+    pattern = rf"[^\W_]+|[{re.escape(CLAUSE_BREAKS)}\n]" if keep_clauses else r"[^\W_]+"
+    return " " + " ".join(re.findall(pattern, text.casefold())) + " "
+
+
+class PatternMatcher:
+    """
+    Aho-Corasick automaton over many phrases at once.
+
+    Built once; each scan is a single pass over the text, however many
+    phrases there are. Phrases and text are both normalize()d and phrases
+    are matched with their surrounding spaces, so only whole words match
+    ("gun" doesn't match "begun").
+    """
+
+    def __init__(self, phrases: Dict[str, str]):
+        """phrases maps phrase -> category."""
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[str, str]]] = [[]]
+
+        for phrase, category in phrases.items():
+            pattern = normalize(phrase)
+            if not pattern.strip():
+                continue
+            node = 0
+            for char in pattern:
+                child = self._goto[node].get(char)
+                if child is None:
+                    child = len(self._goto)
+                    self._goto[node][char] = child
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                node = child
+            self._output[node].append((pattern.strip(), category))
+
+        # Breadth-first, so every node's failure link is final before its children's
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fallback = self._goto[fail].get(char, 0)
+                self._fail[child] = fallback if fallback != child else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def scan(self, text: str) -> Iterator[Tuple[int, str, str]]:
+        """Yield (start, phrase, category) for every match in already-normalized text."""
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for phrase, category in output[node]:
+                # The match ends on the phrase's trailing space
+                yield i - len(phrase), phrase, category
+
+
+class InputFilter:
+    """Length normalization plus the blocked-term and prompt-injection matcher."""
+
+    def __init__(self, config: Dict = INPUT_FILTER):
+        self.max_lengths = config["max_lengths"]
+        phrases = {}
+        for category, terms in config["blocked_terms"].items():
+            for term in terms:
+                phrases[term] = category
+        for phrase in config["injection_phrases"]:
+            phrases[phrase] = "injection"
+        self.matcher = PatternMatcher(phrases)
+
+    def find_problem(self, text: str) -> Optional[Tuple[str, str]]:
+        """(category, term) of the first blocked match in text, or None."""
+        normalized = normalize(text, keep_clauses=True)
+        for start, phrase, category in self.matcher.scan(normalized):
+            if category != "injection" and _negated(normalized, start):
+                continue
+            return category, phrase
+        return None
+
+    def clean(self, text: str, field: str) -> str:
+        """
+        Normalize one user-supplied field and check it.
+        Raises InputRejected if it contains blocked content.
+        """
+        text = (text or "").replace(LENGTH_CONTROL["end_marker"], " ")
+        text = sanitize_story_input(text, self.max_lengths.get(field, 500))
+        if SAFETY_ENABLED:
+            problem = self.find_problem(text)
+            if problem:
+                raise InputRejected(*problem)
+        return text
+
+    def clean_story_details(self, story_details: Dict) -> Dict:
+        """
+        Check every field of the story details. Only text is accepted:
+        lists or objects would reach the prompt unchecked. Reserved fields
+        are dropped.
+        """
+        cleaned = {}
+        for key, value in story_details.items():
+            if key in RESERVED_DETAILS:
+                continue
+            if not isinstance(value, str):
+                raise InputRejected("format", str(key))
+            cleaned[key] = self.clean(value, key)
+        return cleaned
+
+
+def _negated(normalized: str, start: int) -> bool:
+    """Whether the word before the match at start is a negation (in the same clause)."""
+    words = normalized[:start].split()
+    return bool(words) and words[-1] in NEGATIONS
+
+
+# Global filter, compiled on first use
+_filter: Optional[InputFilter] = None
+_filter_lock = threading.Lock()
+
+
+def get_input_filter() -> InputFilter:
+    """Get the shared input filter."""
+    global _filter
+    if _filter is None:
+        with _filter_lock:
+            if _filter is None:
+                _filter = InputFilter()
+    return _filter
@@ -0,0 +1,102 @@
+"""
+Little Nona - Length Control
+Adaptive max_tokens budgets learned from observed story lengths
+"""
+
+import re
+import threading
+from typing import Dict, Tuple
+from config.settings import AGENT_CONFIG, STORY_LENGTHS, LENGTH_CONTROL
+
+
+class TokensPerWordTracker:
+    """
+    Running average of completion tokens per word, keyed by (age, length).
+
+    Younger children get shorter, simpler words, so the ratio differs
+    by age; keeping one average per bucket keeps budgets tight.
+    """
+
+    def __init__(self):
+        self._ratios: Dict[Tuple[int, str], float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, age: int, length: str) -> float:
+        """Current tokens-per-word estimate for this age and length."""
+        with self._lock:
+            return self._ratios.get((age, length), LENGTH_CONTROL["default_tokens_per_word"])
+
+    def record(self, age: int, length: str, completion_tokens: int, words: int):
+        """Fold one observed completion into the running average."""
+        if completion_tokens <= 0 or words <= 0:
+            return
+
+        ratio = completion_tokens / words
+        alpha = LENGTH_CONTROL["smoothing"]
+        with self._lock:
+            key = (age, length)
+            if key in self._ratios:
+                self._ratios[key] = (1 - alpha) * self._ratios[key] + alpha * ratio
+            else:
+                self._ratios[key] = ratio
+
+
+# Global tracker shared by storyteller and reviser
+_tracker = TokensPerWordTracker()
+
+
+def get_tracker() -> TokensPerWordTracker:
+    """Get the shared tokens-per-word tracker."""
+    return _tracker
+
+
+def get_word_range(length: str) -> Tuple[int, int]:
+    """Parse the STORY_LENGTHS word target ("400-500") into (low, high)."""
+    low, high = STORY_LENGTHS[length]["words"].split("-")
+    return int(low), int(high)
+
+
+def token_budget(agent: str, age: int, length: str, target_words: int = 0) -> int:
+    """
+    Work out max_tokens for a story-writing call.
+
+    Uses the upper word target for the length (or target_words, if larger),
+    the observed tokens-per-word ratio and a little headroom, capped at
+    the agent's configured max_tokens.
+    """
+    words = max(get_word_range(length)[1], target_words)
+    return token_budget_for_words(agent, age, length, words)
+
+
+def token_budget_for_words(agent: str, age: int, length: str, words: int) -> int:
+    """max_tokens for an explicit word count (e.g. one chapter of a story)."""
+    budget = int(words * _tracker.get(age, length) * LENGTH_CONTROL["headroom"])
+
+    return max(LENGTH_CONTROL["min_tokens"], min(budget, AGENT_CONFIG[agent]["max_tokens"]))
+
+
+def strip_end_marker(story: str) -> str:
+    """Remove the end-of-story marker if the model echoed it anyway."""
+    return story.replace(LENGTH_CONTROL["end_marker"], "").strip()
+
+
+def finish_truncated_story(story: str, character_name: str) -> str:
+    """
+    Close off a story that was cut short by the token budget.
+    Drops the unfinished sentence and adds a calm closing line.
+    """
+    story = trim_to_last_sentence(story)
+
+    closing = (f"And so, warm and cozy, {character_name} snuggled down, "
+               f"closed their eyes, and drifted off to sweet, peaceful dreams.")
+
+    return f"{story}\n\n{closing}"
+
+
+def trim_to_last_sentence(text: str) -> str:
+    """Drop an unfinished trailing sentence (allowing a closing quote after the punctuation)."""
+    text = text.rstrip()
+    endings = list(re.finditer(r'[.!?]["”\']?(?=\s|$)', text))
+    if endings:
+        text = text[:endings[-1].end()]
+    return text
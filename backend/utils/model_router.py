@@ -0,0 +1,128 @@
+"""
+Little Nona - Model Router
+Picks which model each agent calls, based on observed latency and errors
+"""
+
+import time
+import threading
+from typing import Dict, List
+from config.settings import AGENT_CONFIG, OPENAI_MODEL, MODEL_ROUTING
+
+
+class ModelStats:
+    """Smoothed latency and error rate for one model."""
+
+    def __init__(self):
+        self.latency = None  # seconds, None until the first success
+        self.error_rate = 0.0
+        self.error_rate_at = 0.0  # when error_rate was last brought up to date
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    def decay(self, now: float, time_scale: float = 1.0):
+        """Fade the error rate with time, so an outage that's over stops counting against the model."""
+        elapsed = max(0.0, now - self.error_rate_at)
+        self.error_rate *= 0.5 ** (elapsed / (MODEL_ROUTING["error_half_life_seconds"] * time_scale))
+        self.error_rate_at = now
+
+    def score(self, now: float, time_scale: float = 1.0) -> float:
+        """Lower is better: latency inflated by the error rate."""
+        self.decay(now, time_scale)
+        latency = self.latency if self.latency is not None else MODEL_ROUTING["default_latency"]
+        return latency * (1 + MODEL_ROUTING["error_penalty"] * self.error_rate)
+
+    def is_healthy(self, now: float, time_scale: float = 1.0) -> bool:
+        self.decay(now, time_scale)
+        return now >= self.cooldown_until and self.error_rate < MODEL_ROUTING["max_error_rate"]
+
+
+class ModelRouter:
+    """
+    Orders the models configured for each agent in AGENT_CONFIG.
+
+    The first model listed for an agent is its preferred model and is
+    tried first while it is healthy. Fallbacks are ordered by observed
+    latency and error rate. Models that keep failing are put on a short
+    cooldown and only tried as a last resort. The error rate halves every
+    error_half_life_seconds even when a model isn't called, so once its
+    cooldown is over a preferred model that had a brief outage is soon
+    tried first again.
+
+    time_scale shrinks the cooldown and half-life along with everything
+    else when a load test runs sped up.
+    """
+
+    def __init__(self, time_scale: float = 1.0):
+        self._stats: Dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+        self.time_scale = time_scale
+
+    def _get_stats(self, model: str) -> ModelStats:
+        if model not in self._stats:
+            self._stats[model] = ModelStats()
+        return self._stats[model]
+
+    def candidates(self, agent: str) -> List[str]:
+        """Models to try for an agent, in order."""
+        models = AGENT_CONFIG.get(agent, {}).get("models") or [OPENAI_MODEL]
+        now = time.monotonic()
+
+        with self._lock:
+            preferred, fallbacks = models[0], models[1:]
+            healthy = [m for m in fallbacks if self._get_stats(m).is_healthy(now, self.time_scale)]
+            unhealthy = [m for m in fallbacks if m not in healthy]
+            healthy.sort(key=lambda m: self._get_stats(m).score(now, self.time_scale))
+
+            if self._get_stats(preferred).is_healthy(now, self.time_scale):
+                return [preferred] + healthy + unhealthy
+            return healthy + [preferred] + unhealthy
+
+    def record_success(self, model: str, latency: float):
+        """Record a successful call and how long it took."""
+        alpha = MODEL_ROUTING["smoothing"]
+        with self._lock:
+            stats = self._get_stats(model)
+            stats.decay(time.monotonic(), self.time_scale)
+            if stats.latency is None:
+                stats.latency = latency
+            else:
+                stats.latency = (1 - alpha) * stats.latency + alpha * latency
+            stats.error_rate = (1 - alpha) * stats.error_rate
+            stats.consecutive_failures = 0
+
+    def record_failure(self, model: str):
+        """Record a failed call; repeated failures start a cooldown."""
+        alpha = MODEL_ROUTING["smoothing"]
+        with self._lock:
+            stats = self._get_stats(model)
+            now = time.monotonic()
+            stats.decay(now, self.time_scale)
+            stats.error_rate = (1 - alpha) * stats.error_rate + alpha
+            stats.consecutive_failures += 1
+            if stats.consecutive_failures >= MODEL_ROUTING["failures_before_cooldown"]:
+                stats.cooldown_until = now + MODEL_ROUTING["cooldown_seconds"] * self.time_scale
+                stats.consecutive_failures = 0
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Current stats per model (for logging/debugging)."""
+        now = time.monotonic()
+        with self._lock:
+            for stats in self._stats.values():
+                stats.decay(now, self.time_scale)
+            return {
+                model: {
+                    "latency": stats.latency,
+                    "error_rate": round(stats.error_rate, 3),
+                    "cooling_down": now < stats.cooldown_until
+                }
+                for model, stats in self._stats.items()
+            }
+
+
+# Global router shared by all agents
+_router = ModelRouter()
+
+
+def get_router() -> ModelRouter:
+    """Get the shared model router."""
+    return _router
@@ -0,0 +1,108 @@
+"""
+Little Nona - Name Variant Index
+Precomputed character-name variants, loaded lazily from disk
+"""
+
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from config.settings import NAME_INDEX_PATH
+
+
+class NameVariantIndex:
+    """
+    Lookup table of name -> variants (diminutives, rhymes, cross-cultural forms).
+
+    On-disk format is one line per name, sorted by casefolded name:
+
+        name<TAB>variant|variant|...
+
+    The first variant is the preferred one. Lines starting with '#' are
+    comments. The file is read once, on first lookup; variants are kept
+    as the raw "a|b|c" string and only split when all of them are asked for.
+    """
+
+    def __init__(self, path: Path = NAME_INDEX_PATH):
+        self.path = Path(path)
+        self._index: Optional[Dict[str, str]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, str]:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    index = {}
+                    if self.path.exists():
+                        with open(self.path, encoding="utf-8") as f:
+                            for line in f:
+                                if not line.strip() or line.startswith("#"):
+                                    continue
+                                name, _, variants = line.rstrip("\n").partition("\t")
+                                if variants:
+                                    index[name.casefold()] = variants
+                    self._index = index
+        return self._index
+
+    def lookup(self, name: str) -> Optional[str]:
+        """Preferred variant for a name, or None if the name isn't indexed."""
+        variants = self._load().get(name.strip().casefold())
+        if variants is None:
+            return None
+        return variants.split("|", 1)[0]
+
+    def lookup_all(self, name: str) -> List[str]:
+        """All variants for a name (preferred first)."""
+        variants = self._load().get(name.strip().casefold())
+        return variants.split("|") if variants else []
+
+    def bulk_lookup(self, names: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Preferred variant for many names at once (None where missing)."""
+        index = self._load()
+        result = {}
+        for name in names:
+            variants = index.get(name.strip().casefold())
+            result[name] = variants.split("|", 1)[0] if variants else None
+        return result
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def __contains__(self, name: str) -> bool:
+        return name.strip().casefold() in self._load()
+
+
+def build_name_index(pairs: Iterable[Tuple[str, str]], path: Path = NAME_INDEX_PATH) -> int:
+    """
+    Compile (name, variant) pairs into the on-disk index format.
+
+    Pairs for the same name are merged in the order given (first one
+    becomes the preferred variant). Returns the number of names written.
+    """
+    merged: Dict[str, Tuple[str, List[str]]] = {}
+    for name, variant in pairs:
+        name, variant = name.strip(), variant.strip()
+        if not name or not variant or variant.casefold() == name.casefold():
+            continue
+        key = name.casefold()
+        if key not in merged:
+            merged[key] = (name, [])
+        if variant not in merged[key][1]:
+            merged[key][1].append(variant)
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("# Little Nona - name variant index\n")
+        f.write("# name<TAB>variant|variant|... (first variant is preferred), sorted by casefolded name\n")
+        for key in sorted(merged):
+            name, variants = merged[key]
+            f.write(f"{name}\t{'|'.join(variants)}\n")
+
+    return len(merged)
+
+
+# Global index (loaded on first lookup)
+_index = NameVariantIndex()
+
+
+def get_name_index() -> NameVariantIndex:
+    """Get the shared name variant index."""
+    return _index
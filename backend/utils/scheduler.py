@@ -0,0 +1,178 @@
+"""
+Little Nona - Model Call Scheduler
+Priority classes, per-tenant fairness and load shedding in front of the model client
+"""
+
+import threading
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Optional
+from config.settings import SCHEDULER, DEADLINE_CONFIG
+from utils.cancellation import CancellationToken
+from utils.deadline import Deadline
+
+BUSY_MESSAGE = "⏳ Grandma Nona is busy with lots of stories right now. Please try again in a minute."
+
+
+class SchedulerBusy(Exception):
+    """Raised when a model call is turned away because too much work is already waiting."""
+    pass
+
+
+def priority_class(agent: Optional[str], priority: str = "interactive") -> str:
+    """
+    Scheduling class for a call: background work, or an interactive
+    request (the judge ranks below the story a parent is waiting for).
+    """
+    if priority == "background":
+        return "background"
+    return "judge" if agent == "judge" else "interactive"
+
+
+class _Waiter:
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+
+class CallScheduler:
+    """
+    Admits model calls in priority order, a bounded number at a time.
+
+    Classes are served strictly in the order listed in SCHEDULER, so
+    queued background work never runs ahead of a waiting parent. Within
+    a class, tenants take turns (round robin), so one busy batch job
+    can't hold up everyone else in its class. A class may also have a
+    cap on how many of its calls run at once, which keeps free slots
+    for interactive traffic.
+
+    When a class's queue is full, or a call can't start within its wait
+    limit (or its deadline), it fails fast with SchedulerBusy instead of
+    waiting indefinitely.
+    """
+
+    def __init__(self, config: Dict = SCHEDULER):
+        self.max_concurrent = config["max_concurrent"]
+        self.classes = config["classes"]
+        self._running = {name: 0 for name in self.classes}
+        self._queued = {name: 0 for name in self.classes}
+        # Per class: tenant -> its waiting calls; tenant order is the round-robin turn
+        self._queues: Dict[str, "OrderedDict[str, deque]"] = {
+            name: OrderedDict() for name in self.classes
+        }
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, klass: str, tenant: Optional[str] = None,
+             cancel_token: Optional[CancellationToken] = None,
+             deadline: Optional[Deadline] = None):
+        """Hold a slot for one model call (waiting for one if needed)."""
+        self.acquire(klass, tenant, cancel_token, deadline)
+        try:
+            yield
+        finally:
+            self.release(klass)
+
+    def acquire(self, klass: str, tenant: Optional[str] = None,
+                cancel_token: Optional[CancellationToken] = None,
+                deadline: Optional[Deadline] = None):
+        """Wait for a slot. Raises SchedulerBusy if shed, GenerationCancelled if cancelled."""
+        tenant = tenant or "default"
+        limits = self.classes[klass]
+
+        with self._lock:
+            if self._can_start(klass) and not self._waiting_at_or_above(klass):
+                self._running[klass] += 1
+                return
+            if self._queued[klass] >= limits["max_queued"]:
+                raise SchedulerBusy(BUSY_MESSAGE)
+            waiter = _Waiter()
+            self._queues[klass].setdefault(tenant, deque()).append(waiter)
+            self._queued[klass] += 1
+
+        timeout = limits["max_wait_seconds"]
+        if deadline:
+            # Leave time for the call itself once it gets its turn
+            timeout = min(timeout, max(0.0, deadline.remaining() - DEADLINE_CONFIG["min_attempt_seconds"]))
+
+        unregister = cancel_token.on_cancel(waiter.event.set) if cancel_token else None
+        try:
+            waiter.event.wait(timeout)
+        finally:
+            if unregister:
+                unregister()
+
+        with self._lock:
+            if not waiter.granted:
+                queue = self._queues[klass][tenant]
+                queue.remove(waiter)
+                if not queue:
+                    del self._queues[klass][tenant]
+                self._queued[klass] -= 1
+
+        if waiter.granted:
+            if not (cancel_token and cancel_token.cancelled):
+                return
+            self.release(klass)
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        raise SchedulerBusy(BUSY_MESSAGE)
+
+    def release(self, klass: str):
+        """Free a slot and hand it to the next waiting call, if any."""
+        with self._lock:
+            self._running[klass] -= 1
+            self._dispatch()
+
+    def _can_start(self, klass: str) -> bool:
+        return (sum(self._running.values()) < self.max_concurrent
+                and self._running[klass] < self.classes[klass]["max_running"])
+
+    def _waiting_at_or_above(self, klass: str) -> bool:
+        for name in self.classes:
+            if self._queued[name]:
+                return True
+            if name == klass:
+                return False
+        return False
+
+    def _dispatch(self):
+        """Grant free slots to waiters: highest class first, tenants in turn."""
+        while sum(self._running.values()) < self.max_concurrent:
+            for name in self.classes:
+                tenants = self._queues[name]
+                if tenants and self._running[name] < self.classes[name]["max_running"]:
+                    tenant, queue = next(iter(tenants.items()))
+                    waiter = queue.popleft()
+                    if queue:
+                        tenants.move_to_end(tenant)
+                    else:
+                        del tenants[tenant]
+                    self._queued[name] -= 1
+                    self._running[name] += 1
+                    waiter.granted = True
+                    waiter.event.set()
+                    break
+            else:
+                return  # Nothing waiting that is allowed to start
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Running and queued calls per class (for logging and load tests)."""
+        with self._lock:
+            return {
+                name: {
+                    "running": self._running[name],
+                    "queued": self._queued[name],
+                    "tenants_waiting": len(self._queues[name])
+                }
+                for name in self.classes
+            }
+
+
+# Global scheduler shared by all model calls
+_scheduler = CallScheduler()
+
+
+def get_scheduler() -> CallScheduler:
+    """Get the shared call scheduler."""
+    return _scheduler
@@ -0,0 +1,222 @@
+"""
+Little Nona - Session Journal
+Append-only log of story session changes, so sessions survive restarts
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+from config.settings import SESSION_JOURNAL
+
+try:
+    import fcntl
+except ImportError:  # Windows: one process per journal
+    fcntl = None
+
+
+class SessionJournal:
+    """
+    Session events in one JSON-lines file:
+
+        {"session": id, "event": "created" | "story" | "revised" | "evaluated"
+                                 | "version" | "summarized" | "snapshot",
+         "at": time, "state": {...}}
+
+    Every event carries the session's whole state after the change
+    (StorySession.to_dict, including its version), so replaying is just
+    "the last line for each session wins": no model calls, and nothing
+    to re-apply. A line cut short by a crash is skipped, and the next
+    append starts on a fresh line.
+
+    Appends are a single write to a file opened in append mode, so several
+    worker processes can share one journal; a session created by one can
+    be picked up by another (get() reads lines it hasn't seen yet), and
+    latest_version() tells a process its in-memory copy is out of date.
+    Two processes changing the same session at the same moment still
+    race (the later line wins), so route one session's requests to one
+    server at a time.
+
+    Once enough has been appended, the journal is compacted: rewritten
+    with one "snapshot" line per session, dropping sessions untouched for
+    max_age_hours, and swapped in atomically.
+    """
+
+    def __init__(self, path: Path = SESSION_JOURNAL["path"]):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        # Where each session's latest line starts, and its version, for files read up to _read_to
+        self._positions: Dict[str, int] = {}
+        self._versions: Dict[str, int] = {}
+        self._read_to = 0
+        self._file_id: Optional[Tuple[int, int]] = None
+        self._appended = 0
+
+    def record(self, session_id: str, event: str, state: Dict):
+        """Append one event with the session's state after it."""
+        line = json.dumps(
+            {"session": session_id, "event": event, "at": time.time(), "state": state},
+            ensure_ascii=False
+        ).encode("utf-8") + b"\n"
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._file_lock(exclusive=False):
+            with open(self.path, "ab") as f:
+                if _ends_mid_line(self.path, f.tell()):
+                    line = b"\n" + line  # Don't glue onto a line torn by a crash
+                f.write(line)
+                f.flush()
+                if SESSION_JOURNAL["fsync"]:
+                    os.fsync(f.fileno())
+
+        with self._lock:
+            self._appended += len(line)
+            compact = self._appended >= SESSION_JOURNAL["compact_after_bytes"]
+        if compact:
+            self.compact()
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        """A session's latest state, including ones written by other processes (None if unknown)."""
+        with self._lock, self._file_lock(exclusive=False):
+            with self._open() as f:
+                if f is None:
+                    return None
+                self._catch_up(f)
+                position = self._positions.get(session_id)
+                if position is None:
+                    return None
+                f.seek(position)
+                return json.loads(f.readline())["state"]
+
+    def latest_version(self, session_id: str) -> Optional[int]:
+        """Version of the session's latest journaled state (None if it isn't in the journal)."""
+        with self._lock, self._file_lock(exclusive=False):
+            with self._open() as f:
+                if f is None:
+                    return None
+                self._catch_up(f)
+                return self._versions.get(session_id)
+
+    def load(self) -> Dict[str, Dict]:
+        """Latest state of every session, least recently changed first."""
+        states: Dict[str, Dict] = {}
+        for entry in self._entries():
+            states.pop(entry["session"], None)
+            states[entry["session"]] = entry["state"]
+        return states
+
+    def compact(self) -> int:
+        """Rewrite the journal as one snapshot per live session. Returns how many were kept."""
+        oldest = time.time() - SESSION_JOURNAL["max_age_hours"] * 3600
+        with self._file_lock(exclusive=True):
+            latest: Dict[str, Dict] = {}
+            for entry in self._entries():
+                latest.pop(entry["session"], None)
+                latest[entry["session"]] = entry
+
+            temporary = self.path.with_suffix(".tmp")
+            kept = 0
+            with open(temporary, "wb") as f:
+                for session_id, entry in latest.items():
+                    if entry["at"] < oldest:
+                        continue
+                    entry = dict(entry, event="snapshot")
+                    f.write(json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n")
+                    kept += 1
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, self.path)
+
+        with self._lock:
+            self._appended = 0
+        print(f"🗜️ Compacted session journal: {kept} sessions kept ({len(latest) - kept} expired)")
+        return kept
+
+    def _entries(self) -> Iterator[Dict]:
+        if not self.path.exists():
+            return
+        with open(self.path, "rb") as f:
+            for line in f:
+                entry = _parse(line)
+                if entry:
+                    yield entry
+
+    @contextmanager
+    def _open(self):
+        """The journal open for reading (None if there's none yet); callers hold the shared lock."""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            self._positions, self._versions, self._read_to, self._file_id = {}, {}, 0, None
+            yield None
+            return
+        with f:
+            yield f
+
+    def _catch_up(self, f):
+        """Index lines appended since the last read (re-reading everything after a compaction)."""
+        stat = os.fstat(f.fileno())
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id != self._file_id or stat.st_size < self._read_to:
+            self._positions, self._versions, self._read_to, self._file_id = {}, {}, 0, file_id
+
+        f.seek(self._read_to)
+        position = self._read_to
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # Still being written; read it next time
+            entry = _parse(line)
+            if entry:
+                self._positions[entry["session"]] = position
+                self._versions[entry["session"]] = entry["state"].get("version", 0)
+            position += len(line)
+        self._read_to = position
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        """Appends share the lock; compaction takes it alone, so no append lands in the old file."""
+        if fcntl is None:
+            yield
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_suffix(".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _ends_mid_line(path: Path, size: int) -> bool:
+    """Whether the journal's last line is missing its newline (a write cut short by a crash)."""
+    if size == 0:
+        return False
+    with open(path, "rb") as f:
+        f.seek(size - 1)
+        return f.read(1) != b"\n"
+
+
+def _parse(line: bytes) -> Optional[Dict]:
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None  # Torn write from a crash
+    return entry if isinstance(entry, dict) and "session" in entry else None
+
+
+# Global journal, opened on first use
+_journal: Optional[SessionJournal] = None
+_journal_lock = threading.Lock()
+
+
+def get_session_journal() -> SessionJournal:
+    """Get the shared session journal."""
+    global _journal
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                _journal = SessionJournal()
+    return _journal
@@ -0,0 +1,228 @@
+"""
+Little Nona - Story Similarity
+MinHash signatures and an LSH index of each child's recent stories
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+import numpy as np
+
+from config.settings import SIMILARITY
+
+# Multiply-shift hash functions: h(x) = ((a * x + b) mod 2^64) >> 32, a odd.
+# Fixed seed so signatures stay comparable across restarts.
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, 2**63, SIMILARITY["num_perm"], dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_B = _rng.integers(0, 2**63, SIMILARITY["num_perm"], dtype=np.uint64)
+
+
+def shingles(story: str, size: int = SIMILARITY["shingle_size"]) -> np.ndarray:
+    """Hashes of the story's overlapping word n-grams (casefolded, punctuation ignored)."""
+    words = re.findall(r"[^\W_]+", story.casefold())
+    if len(words) < size:
+        words = words + [""] * (size - len(words))
+    grams = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash(story: str) -> np.ndarray:
+    """MinHash signature: for each hash function, the smallest hash of any shingle."""
+    hashes = shingles(story)
+    with np.errstate(over="ignore"):
+        permuted = (_A[:, None] * hashes[None, :] + _B[:, None]) >> np.uint64(32)
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def estimated_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the two stories' shingle sets."""
+    return float(np.mean(a == b))
+
+
+class StorySimilarityIndex:
+    """
+    LSH index over one child's recent story signatures.
+
+    The signature is split into bands; stories that agree on every row
+    of any band land in the same bucket. A lookup only compares against
+    stories sharing a bucket, so it stays fast however long the history
+    gets. With 64 bands of 2 rows, pairs above ~0.2 similarity almost
+    always share a bucket and pairs below ~0.05 rarely do.
+
+    Only the most recent max_history stories are kept.
+    """
+
+    def __init__(self, bands: int = SIMILARITY["bands"], max_history: int = SIMILARITY["max_history"]):
+        self.bands = bands
+        self.rows = SIMILARITY["num_perm"] // bands
+        self.max_history = max_history
+        # story id -> (signature, gist)
+        self._stories: "OrderedDict[int, Tuple[np.ndarray, str]]" = OrderedDict()
+        self._buckets = [defaultdict(set) for _ in range(bands)]
+        self._next_id = 0
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def add(self, story: str, signature: Optional[np.ndarray] = None) -> int:
+        """Index a story; returns its id."""
+        signature = minhash(story) if signature is None else signature
+        return self.add_signature(signature, _gist(story))
+
+    def add_signature(self, signature: np.ndarray, gist: str) -> int:
+        """Index a story already reduced to its signature and gist; returns its id."""
+        story_id = self._next_id
+        self._next_id += 1
+        self._stories[story_id] = (signature, gist)
+        for band, key in self._band_keys(signature):
+            self._buckets[band][key].add(story_id)
+
+        while len(self._stories) > self.max_history:
+            oldest, (old_signature, _) = self._stories.popitem(last=False)
+            for band, key in self._band_keys(old_signature):
+                bucket = self._buckets[band][key]
+                bucket.discard(oldest)
+                if not bucket:
+                    del self._buckets[band][key]
+        return story_id
+
+    def most_similar(self, signature: np.ndarray) -> Optional[Tuple[float, str]]:
+        """(similarity, gist) of the closest indexed story among LSH candidates, or None."""
+        candidates: Set[int] = set()
+        for band, key in self._band_keys(signature):
+            candidates |= self._buckets[band].get(key, set())
+
+        best = None
+        for story_id in candidates:
+            other, gist = self._stories[story_id]
+            similarity = estimated_similarity(signature, other)
+            if best is None or similarity > best[0]:
+                best = (similarity, gist)
+        return best
+
+    def __len__(self):
+        return len(self._stories)
+
+
+def _gist(story: str) -> str:
+    """Opening of a story, used to tell the storyteller what not to repeat."""
+    opening = " ".join(story.split()[:40])
+    match = re.match(r"(.+?[.!?])(\s|$)", opening)
+    return match.group(1) if match else opening
+
+
+class SimilarityRegistry:
+    """
+    One StorySimilarityIndex per child profile, kept on disk so a restart
+    doesn't forget which stories a child has heard.
+
+    Each profile has a small JSON-lines file of {"signature", "gist"}
+    entries (no story text), named by a hash of the profile. Adding a
+    story appends a line; once a file holds twice max_history entries it
+    is rewritten with the most recent max_history. An index is rebuilt
+    from its file whenever the file has changed since it was read, so
+    servers sharing the directory see each other's stories.
+    """
+
+    def __init__(self, path: Path = SIMILARITY["history_path"]):
+        self.path = Path(path)
+        # profile -> (file size and mtime when read, index)
+        self._indexes: Dict[str, Tuple[Optional[Tuple[int, int]], StorySimilarityIndex]] = {}
+        self._lock = threading.Lock()
+
+    def find_similar(self, profile: str, story: str) -> Optional[Tuple[float, str]]:
+        """
+        (similarity, gist) of the profile's closest earlier story if it's
+        above the similarity threshold, else None.
+        """
+        signature = minhash(story)
+        with self._lock:
+            match = self._index(profile).most_similar(signature)
+        if match and match[0] >= SIMILARITY["threshold"]:
+            return match
+        return None
+
+    def add(self, profile: str, story: str):
+        """Record a story in the profile's history."""
+        line = json.dumps({"signature": minhash(story).tobytes().hex(), "gist": _gist(story)},
+                          ensure_ascii=False).encode("utf-8") + b"\n"
+        path = self._file(profile)
+        with self._lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "ab") as f:
+                if f.tell() and not _ends_with_newline(path):
+                    line = b"\n" + line  # Don't glue onto a line torn by a crash
+                f.write(line)
+            if self._lines(path) >= 2 * SIMILARITY["max_history"]:
+                self._trim(path)
+
+    def _file(self, profile: str) -> Path:
+        return self.path / f"{hashlib.sha256(profile.encode('utf-8')).hexdigest()[:32]}.jsonl"
+
+    def _index(self, profile: str) -> StorySimilarityIndex:
+        """The profile's index, re-read if its file changed. Callers hold _lock."""
+        path = self._file(profile)
+        try:
+            stat = path.stat()
+            stamp = (stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            stamp = None
+
+        cached = self._indexes.get(profile)
+        if cached and cached[0] == stamp:
+            return cached[1]
+
+        index = StorySimilarityIndex()
+        if stamp is not None:
+            for signature, gist in _read_history(path):
+                index.add_signature(signature, gist)
+        self._indexes[profile] = (stamp, index)
+        return index
+
+    def _lines(self, path: Path) -> int:
+        with open(path, "rb") as f:
+            return sum(1 for _ in f)
+
+    def _trim(self, path: Path):
+        """Rewrite the file with its most recent max_history entries."""
+        with open(path, encoding="utf-8") as f:
+            lines = [line for line in f if line.endswith("\n")]
+        temporary = path.with_suffix(f".{os.getpid()}.tmp")
+        temporary.write_text("".join(lines[-SIMILARITY["max_history"]:]), encoding="utf-8")
+        os.replace(temporary, path)
+
+
+def _ends_with_newline(path: Path) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def _read_history(path: Path):
+    """(signature, gist) pairs from a history file, skipping lines torn by a crash."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                signature = np.frombuffer(bytes.fromhex(entry["signature"]), dtype=np.uint32)
+            except (ValueError, KeyError, TypeError):
+                continue
+            if len(signature) == SIMILARITY["num_perm"]:
+                yield signature, str(entry.get("gist", ""))
+
+
+# Global registry shared by all sessions
+_registry = SimilarityRegistry()
+
+
+def get_similarity_registry() -> SimilarityRegistry:
+    """Get the shared per-profile similarity registry."""
+    return _registry
@@ -0,0 +1,310 @@
+"""
+Little Nona - Story Archive
+Append-only, dictionary-compressed story storage with memory-mapped random access
+"""
+
+import json
+import mmap
+import os
+import shutil
+import struct
+import threading
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+from config.settings import STORY_ARCHIVE
+
+try:
+    import fcntl
+except ImportError:  # Windows: nothing stops a second writer process
+    fcntl = None
+
+INDEX_MAGIC = b"NONAIDX1"
+# Index header: magic, dictionary crc32, 4 reserved bytes
+INDEX_HEADER = struct.Struct("<8sII")
+# One entry per record: data offset, compressed length, crc32 of the JSON
+INDEX_ENTRY = struct.Struct("<QII")
+
+
+def train_dictionary(samples: Iterable[str], size: int = STORY_ARCHIVE["dictionary_size"],
+                     max_samples: int = STORY_ARCHIVE["training_samples"]) -> bytes:
+    """
+    Build a preset dictionary from sample stories.
+
+    Stories share a lot of phrasing ("Once upon a time", "snuggled down",
+    "soft green meadow"), but each record is compressed on its own, so
+    plain zlib never sees that shared text. A dictionary of the phrases
+    that save the most (count x length) lets every record refer to them.
+    The most valuable phrases go at the end, where deflate reaches them
+    with the shortest distances.
+    """
+    counts = Counter()
+    for i, text in enumerate(samples):
+        if i >= max_samples:
+            break
+        words = text.split()
+        for n in (2, 4, 8):
+            for start in range(len(words) - n + 1):
+                counts[" ".join(words[start:start + n])] += 1
+
+    ranked = sorted(
+        (phrase for phrase, count in counts.items() if count > 1),
+        key=lambda phrase: (counts[phrase] - 1) * len(phrase),
+        reverse=True
+    )
+
+    chosen, total = [], 0
+    for phrase in ranked:
+        encoded = phrase.encode("utf-8") + b" "
+        if total + len(encoded) > size:
+            break
+        chosen.append(encoded)
+        total += len(encoded)
+    return b"".join(reversed(chosen))
+
+
+class StoryArchive:
+    """
+    Stories (and their evaluations) stored as one record per id:
+
+        <dir>/dictionary   preset dictionary, fixed when the archive is created
+        <dir>/stories.dat  records, each compressed on its own with the dictionary
+        <dir>/stories.idx  header + one fixed-width entry per record id
+
+    Ids are positions in the index, so a lookup is one slice of the
+    memory-mapped index and one slice of the memory-mapped data file,
+    with no scanning. Writes only ever append: the data first, then its
+    index entry. A crash mid-write leaves an unreferenced data tail or a
+    partial index entry; the partial entry is cut off when the archive is
+    opened and before every append, so later entries stay aligned.
+
+    Only one process may write to an archive (enforced with a lock file
+    where flock is available); any number may read.
+
+    An archive created without training stories starts with an empty
+    dictionary. Once it holds train_after_records records it is rebuilt
+    with a dictionary trained on them (record ids don't change).
+
+    Iterating an archive yields the records, so it can be passed straight
+    to analytics.StoryCorpus.
+    """
+
+    def __init__(self, path: Path = STORY_ARCHIVE["path"]):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._maps = None  # (index mmap, data mmap, record count) when mapped
+
+        dictionary_path = self.path / "dictionary"
+        if not dictionary_path.exists():
+            raise FileNotFoundError(f"No story archive at {self.path} (use StoryArchive.create)")
+        self.dictionary = dictionary_path.read_bytes()
+
+        with open(self.path / "stories.idx", "rb") as f:
+            magic, dictionary_crc, _ = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+        if magic != INDEX_MAGIC or dictionary_crc != zlib.crc32(self.dictionary):
+            raise ValueError(f"{self.path} is not a story archive, or its dictionary was changed")
+        self._writer = None  # Lock file held while this process is the archive's writer
+
+    @classmethod
+    def create(cls, path: Path = STORY_ARCHIVE["path"],
+               training_stories: Iterable[str] = ()) -> "StoryArchive":
+        """Create an empty archive with a dictionary trained on training_stories."""
+        path = Path(path)
+        if (path / "stories.idx").exists():
+            raise FileExistsError(f"A story archive already exists at {path}")
+        path.mkdir(parents=True, exist_ok=True)
+
+        dictionary = train_dictionary(training_stories)
+        (path / "dictionary").write_bytes(dictionary)
+        (path / "stories.dat").write_bytes(b"")
+        (path / "stories.idx").write_bytes(INDEX_HEADER.pack(INDEX_MAGIC, zlib.crc32(dictionary), 0))
+        return cls(path)
+
+    @classmethod
+    def open_or_create(cls, path: Path = STORY_ARCHIVE["path"],
+                       training_stories: Iterable[str] = ()) -> "StoryArchive":
+        path = Path(path)
+        _finish_rebuild(path)
+        if (path / "stories.idx").exists():
+            return cls(path)
+        return cls.create(path, training_stories)
+
+    def append(self, record: Dict) -> int:
+        """Store a record (e.g. {"story", "evaluation", "age", ...}); returns its id."""
+        raw = json.dumps(record, ensure_ascii=False).encode("utf-8")
+
+        with self._lock:
+            self._become_writer()
+            data = self._compress(raw)
+            with open(self.path / "stories.dat", "ab") as f:
+                offset = f.tell()
+                f.write(data)
+            with open(self.path / "stories.idx", "r+b") as f:
+                record_id = _drop_partial_entry(f)
+                f.write(INDEX_ENTRY.pack(offset, len(data), zlib.crc32(raw)))
+
+        if not self.dictionary and record_id + 1 >= STORY_ARCHIVE["train_after_records"]:
+            self.rebuild()
+        return record_id
+
+    def rebuild(self):
+        """
+        Re-compress every record with a dictionary trained on them. Built
+        in a side directory and swapped in, so a crash leaves either the
+        old archive or the new one (see _finish_rebuild).
+        """
+        with self._lock:
+            self._become_writer()
+            records = [self._read(record_id) for record_id in range(len(self))]
+            staging = _sibling(self.path, "rebuild")
+            shutil.rmtree(staging, ignore_errors=True)
+            rebuilt = StoryArchive.create(staging, (r.get("story", "") for r in records))
+            for record in records:
+                rebuilt._append_unlocked(record)
+
+            self.close_maps()
+            os.replace(self.path, _sibling(self.path, "old"))
+            os.replace(staging, self.path)
+            shutil.rmtree(_sibling(self.path, "old"), ignore_errors=True)
+
+            self.dictionary = (self.path / "dictionary").read_bytes()
+            if self._writer is not None:
+                # The lock file moved with the old directory; take the new one
+                self._writer.close()
+                self._writer = None
+                self._become_writer()
+        print(f"📦 Rebuilt story archive with a {len(self.dictionary)} byte dictionary ({len(records)} records)")
+
+    def _append_unlocked(self, record: Dict):
+        raw = json.dumps(record, ensure_ascii=False).encode("utf-8")
+        data = self._compress(raw)
+        with open(self.path / "stories.dat", "ab") as f:
+            offset = f.tell()
+            f.write(data)
+        with open(self.path / "stories.idx", "ab") as f:
+            f.write(INDEX_ENTRY.pack(offset, len(data), zlib.crc32(raw)))
+
+    def _compress(self, raw: bytes) -> bytes:
+        compressor = zlib.compressobj(
+            STORY_ARCHIVE["compression_level"], zlib.DEFLATED, -15, zdict=self.dictionary
+        )
+        return compressor.compress(raw) + compressor.flush()
+
+    def _become_writer(self):
+        """Take the archive's writer lock (held until this archive is garbage collected)."""
+        if self._writer is not None:
+            return
+        lock = open(self.path / "writer.lock", "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                raise RuntimeError(f"Another process is already writing to the story archive at {self.path}")
+        with open(self.path / "stories.idx", "r+b") as f:
+            _drop_partial_entry(f)
+        self._writer = lock
+
+    def get(self, record_id: int) -> Dict:
+        """Read one record by id (IndexError if there's no such id)."""
+        if record_id < 0:
+            raise IndexError(record_id)
+        with self._lock:
+            return self._read(record_id)
+
+    def _read(self, record_id: int) -> Dict:
+        index, data, count = self._mapped(record_id)
+        if record_id >= count:
+            raise IndexError(record_id)
+        start = INDEX_HEADER.size + record_id * INDEX_ENTRY.size
+        offset, length, crc = INDEX_ENTRY.unpack_from(index, start)
+        compressed = data[offset:offset + length]
+
+        decompressor = zlib.decompressobj(-15, zdict=self.dictionary)
+        raw = decompressor.decompress(compressed) + decompressor.flush()
+        if zlib.crc32(raw) != crc:
+            raise ValueError(f"Story archive record {record_id} is corrupted")
+        return json.loads(raw)
+
+    def _mapped(self, record_id: int):
+        """Current maps, re-mapped if the files have grown past what's mapped."""
+        if self._maps is None or record_id >= self._maps[2]:
+            self.close_maps()
+            index_size = (self.path / "stories.idx").stat().st_size
+            count = (index_size - INDEX_HEADER.size) // INDEX_ENTRY.size
+            if count == 0:
+                return b"", b"", 0
+            with open(self.path / "stories.idx", "rb") as f:
+                index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            with open(self.path / "stories.dat", "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps = (index, data, count)
+        return self._maps
+
+    def __len__(self) -> int:
+        size = (self.path / "stories.idx").stat().st_size
+        return (size - INDEX_HEADER.size) // INDEX_ENTRY.size
+
+    def __iter__(self) -> Iterator[Dict]:
+        for record_id in range(len(self)):
+            yield self.get(record_id)
+
+    def close_maps(self):
+        if self._maps is not None:
+            self._maps[0].close()
+            self._maps[1].close()
+            self._maps = None
+
+    def stats(self) -> Dict:
+        """Record count and on-disk sizes in bytes."""
+        return {
+            "records": len(self),
+            "data_bytes": (self.path / "stories.dat").stat().st_size,
+            "index_bytes": (self.path / "stories.idx").stat().st_size,
+            "dictionary_bytes": len(self.dictionary)
+        }
+
+
+def _drop_partial_entry(f) -> int:
+    """Cut a torn trailing entry off an index opened r+b; returns the entry count (file left at its end)."""
+    size = f.seek(0, os.SEEK_END)
+    count = max(0, (size - INDEX_HEADER.size) // INDEX_ENTRY.size)
+    aligned = INDEX_HEADER.size + count * INDEX_ENTRY.size
+    if size > aligned:
+        print(f"⚠️ Story archive index had a partial entry ({size - aligned} bytes), removing it")
+        f.truncate(aligned)
+        f.seek(aligned)
+    return count
+
+
+def _sibling(path: Path, suffix: str) -> Path:
+    return path.with_name(f"{path.name}.{suffix}")
+
+
+def _finish_rebuild(path: Path):
+    """Recover from a crash during rebuild(): keep whichever complete archive is in place."""
+    old, staging = _sibling(path, "old"), _sibling(path, "rebuild")
+    if not (path / "stories.idx").exists() and (old / "stories.idx").exists():
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(old, path)
+    shutil.rmtree(old, ignore_errors=True)
+    shutil.rmtree(staging, ignore_errors=True)
+
+
+# Global archive, opened on first use
+_archive: Optional[StoryArchive] = None
+_archive_lock = threading.Lock()
+
+
+def get_archive() -> StoryArchive:
+    """
+    Get the shared story archive. A new one starts with an empty
+    dictionary and trains one once it has enough stories (see StoryArchive).
+    """
+    global _archive
+    if _archive is None:
+        with _archive_lock:
+            if _archive is None:
+                _archive = StoryArchive.open_or_create()
+    return _archive
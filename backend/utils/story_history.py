@@ -0,0 +1,140 @@
+"""
+Little Nona - Story History
+Compact version history of a story, with undo/redo and branches
+"""
+
+import difflib
+from typing import Dict, List, Optional, Tuple
+
+# A version is stored as edits against the original's paragraphs:
+# (start, end, new_paragraphs) means original[start:end] -> new_paragraphs
+Edit = Tuple[int, int, Tuple[str, ...]]
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """Split a story into paragraphs (separated by blank lines)."""
+    return [p.strip() for p in text.split("\n\n") if p.strip()]
+
+
+class StoryHistory:
+    """
+    Version tree for one story.
+
+    Version 0 is the original story. Every other version keeps only the
+    paragraphs that differ from the original, so a session with many
+    revisions costs little more than one copy of the story. Undo and redo
+    just move a pointer along the tree; revising after an undo starts a
+    new branch, and any version can be selected directly.
+    """
+
+    def __init__(self, original: str):
+        self._original = split_paragraphs(original)
+        self._edits: List[Tuple[Edit, ...]] = [()]
+        self._parents: List[Optional[int]] = [None]
+        self._labels: List[str] = ["Original"]
+        self._redo: Dict[int, int] = {}  # version -> child to redo into
+        self.current = 0
+        self._current_text = "\n\n".join(self._original)
+
+    def __len__(self) -> int:
+        return len(self._edits)
+
+    @property
+    def text(self) -> str:
+        """Text of the current version."""
+        return self._current_text
+
+    def commit(self, text: str, label: str = "") -> int:
+        """Add a new version as a child of the current one and move to it."""
+        matcher = difflib.SequenceMatcher(a=self._original, b=split_paragraphs(text), autojunk=False)
+        edits = tuple(
+            (i1, i2, tuple(matcher.b[j1:j2]))
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+            if tag != "equal"
+        )
+
+        self._edits.append(edits)
+        self._parents.append(self.current)
+        self._labels.append(label)
+        self._redo[self.current] = len(self._edits) - 1
+        return self._move_to(len(self._edits) - 1)
+
+    def undo(self) -> Optional[str]:
+        """Go back to the parent version. Returns its text (None at the original)."""
+        parent = self._parents[self.current]
+        if parent is None:
+            return None
+        self._redo[parent] = self.current
+        self._move_to(parent)
+        return self._current_text
+
+    def redo(self) -> Optional[str]:
+        """Go forward to the most recently visited child. Returns None if there isn't one."""
+        child = self._redo.get(self.current)
+        if child is None:
+            return None
+        self._move_to(child)
+        return self._current_text
+
+    def can_undo(self) -> bool:
+        return self._parents[self.current] is not None
+
+    def can_redo(self) -> bool:
+        return self.current in self._redo
+
+    def select(self, version: int) -> str:
+        """Jump to any version (e.g. another branch). Returns its text."""
+        if not 0 <= version < len(self._edits):
+            raise ValueError(f"No version {version}")
+        self._move_to(version)
+        return self._current_text
+
+    def get_text(self, version: int) -> str:
+        """Rebuild the text of a version from the original and its edits."""
+        paragraphs = []
+        pos = 0
+        for start, end, new in self._edits[version]:
+            paragraphs.extend(self._original[pos:start])
+            paragraphs.extend(new)
+            pos = end
+        paragraphs.extend(self._original[pos:])
+        return "\n\n".join(paragraphs)
+
+    def versions(self) -> List[Dict]:
+        """All versions, oldest first: id, parent, label and whether current."""
+        return [
+            {
+                "id": version,
+                "parent": self._parents[version],
+                "label": self._labels[version],
+                "current": version == self.current
+            }
+            for version in range(len(self._edits))
+        ]
+
+    def to_dict(self) -> Dict:
+        """JSON-friendly form (see from_dict)."""
+        return {
+            "original": self._original,
+            "edits": [[[start, end, list(new)] for start, end, new in edits] for edits in self._edits],
+            "parents": self._parents,
+            "labels": self._labels,
+            "redo": [[version, child] for version, child in self._redo.items()],
+            "current": self.current
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "StoryHistory":
+        history = cls("")
+        history._original = list(data["original"])
+        history._edits = [tuple((start, end, tuple(new)) for start, end, new in edits) for edits in data["edits"]]
+        history._parents = list(data["parents"])
+        history._labels = list(data["labels"])
+        history._redo = {version: child for version, child in data["redo"]}
+        history._move_to(data["current"])
+        return history
+
+    def _move_to(self, version: int) -> int:
+        self.current = version
+        self._current_text = self.get_text(version)
+        return version
@@ -0,0 +1,123 @@
+"""
+Little Nona - Story Repair
+Deterministic clean-up of common storyteller defects, without a model call
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+# "Here is your bedtime story:" / "Sure! Here's a story about Emmy:" on the first line
+# (only meta phrasing ending in a colon: "This is the story of Emmy..." is the story)
+PREAMBLE = re.compile(
+    r"^\s*(?:(?:sure|of course|certainly|okay)[!,.]?\s*)?"
+    r"(?:here(?:'s| is)|below is)\b[^\n]*\bstory\b[^\n]*:\s*$",
+    re.IGNORECASE
+)
+
+# Title lines: "Title: ...", "# The Moon Bunny", "**The Moon Bunny**"
+TITLE = re.compile(r"^\s*(?:title\s*:.*|#{1,6}\s+.*|\*\*[^*\n]{1,80}\*\*|__[^_\n]{1,80}__)\s*$", re.IGNORECASE)
+
+# Structural labels, alone on a line or at the start of a paragraph
+LABEL_WORDS = (
+    r"beginning|middle|end|ending|introduction|intro|conclusion|climax|resolution|"
+    r"setting|problem|solution|story|the story|bedtime story|moral|"
+    r"(?:chapter|part|scene|section)\s+(?:\d+|one|two|three|four|five)"
+)
+LABEL_LINE = re.compile(rf"^\s*[*_#]*\s*(?:{LABEL_WORDS})\s*[*_]*\s*(?::[*_]*)?\s*$", re.IGNORECASE)
+LABEL_PREFIX = re.compile(rf"^\s*[*_]*(?:{LABEL_WORDS})\s*[*_]*\s*:[*_]*\s+", re.IGNORECASE)
+
+# Trailing notes after the story: "Note: ...", "(Word count: 452)", "I hope you enjoyed this story"
+# (but not a goodnight to the child, like "I hope your dreams are as soft as Emmy's")
+NOTE = re.compile(
+    r"^\s*[(\[*_]*\s*(?:(?:author'?s?|storyteller'?s?|parent'?s?)?\s*notes?\s*:|word count\b|"
+    r"\(?\d+\s+words\)?\s*$|moral of the story\s*:|"
+    r"i hope (?:you|your (?:child|little one)) (?:enjoy(?:ed)?|like[ds]?|love[ds]?) (?:this|the|my) (?:bedtime )?story|"
+    r"this story (?:teaches|is about|helps|encourages)|feel free to)",
+    re.IGNORECASE
+)
+RULE = re.compile(r"^\s*(?:-{3,}|\*{3,}|_{3,})\s*$")
+
+SENTENCE = re.compile(r'[^.!?]+(?:[.!?]+["”\']?|$)\s*')
+
+
+def repair_story(story: str, character_name: str, child_name: Optional[str] = None) -> str:
+    """
+    Fix the defects the storyteller and reviser prompts ask to avoid,
+    but which still slip through now and then:
+
+    - a chatty preamble ("Here is your story:") or a title line
+    - section labels ("Beginning:", "**Chapter 2**")
+    - "Grandma Nona" appearing in the story (she's the narrator, not a character)
+    - the child's real name instead of the character name
+    - author notes, word counts or morals tacked on after the story
+
+    Anything that isn't one of these is left as it is. If the repair
+    would leave nothing, the original story is returned.
+    """
+    repaired, fixes = _repair(story, character_name, child_name)
+    if not repaired.strip():
+        return story
+    if fixes:
+        print(f"🔧 Repaired story: {', '.join(fixes)}")
+    return repaired
+
+
+def _repair(story: str, character_name: str, child_name: Optional[str]) -> Tuple[str, List[str]]:
+    fixes = []
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", story.strip()) if p.strip()]
+
+    # Preamble and title at the top
+    while paragraphs:
+        first_line, _, rest = paragraphs[0].partition("\n")
+        if not (PREAMBLE.match(first_line) or TITLE.match(first_line)):
+            break
+        fixes.append("removed preamble/title")
+        paragraphs[0] = rest.strip()
+        if not paragraphs[0]:
+            paragraphs.pop(0)
+
+    # Notes and separators at the bottom (everything after a trailing rule goes)
+    for i in range(len(paragraphs) - 1, 0, -1):
+        if RULE.match(paragraphs[i].split("\n", 1)[0]):
+            fixes.append("removed trailing notes")
+            paragraphs = paragraphs[:i]
+            break
+    while len(paragraphs) > 1 and NOTE.match(paragraphs[-1]):
+        fixes.append("removed trailing notes")
+        paragraphs.pop()
+
+    # A child (or character) who really is called Nona keeps their sentences
+    names = f"{child_name or ''} {character_name}".casefold().split()
+    nona = re.compile(r"\bGrandma Nona\b" if "nona" in names else r"\bNona\b")
+
+    cleaned = []
+    for paragraph in paragraphs:
+        lines = []
+        for line in paragraph.split("\n"):
+            if LABEL_LINE.match(line):
+                fixes.append("removed section label")
+                continue
+            line, count = LABEL_PREFIX.subn("", line)
+            if count:
+                fixes.append("removed section label")
+            lines.append(line)
+        paragraph = "\n".join(l.strip() for l in lines if l.strip())
+
+        if nona.search(paragraph):
+            fixes.append("removed Grandma Nona")
+            paragraph = "".join(s for s in SENTENCE.findall(paragraph) if not nona.search(s)).strip()
+
+        if paragraph:
+            cleaned.append(paragraph)
+
+    story = "\n\n".join(cleaned)
+
+    # Case-sensitive, so a child called Rose doesn't turn "a red rose" into "a red Rosie"
+    child_name = (child_name or "").strip().title()
+    if child_name and child_name not in character_name.split():
+        story, count = re.subn(rf"\b{re.escape(child_name)}\b", character_name, story)
+        if count:
+            fixes.append(f"used {character_name} instead of the child's name")
+
+    # One entry per kind of fix, in the order found
+    return story, list(dict.fromkeys(fixes))
@@ -0,0 +1,267 @@
+"""
+Little Nona - Load Generator
+Simulates concurrent families using the app against a fake model backend
+
+Each simulated family walks the same flow as the app.py handlers
+(create → evaluate → revise up to 3 times) through StorySession. Every
+action runs on a fixed-size worker pool, the same way Gradio runs
+handlers on its workers, so queue wait shows when one node is saturated.
+
+--time-scale speeds up everything that waits: think time, arrivals,
+model latency, retry backoff and router cooldowns, so the times in the
+report scale back to real seconds.
+
+Example:
+    python load_test.py --rates 0.5,1,2,4 --stage-seconds 60 --workers 8 --time-scale 0.1
+
+With --cassette, model calls are served from recorded production traffic
+(see OpenAIClient's record mode) instead of the fake backend.
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from story_service import StorySession
+from config.settings import STORY_CATEGORIES, STORY_LENGTHS, MAX_REVISION_ATTEMPTS, SIMILARITY
+from utils.api_client import OpenAIClient, set_client
+from utils.fake_client import FakeModelClient
+from utils.model_router import get_router
+
+ACTIONS = ["create", "evaluate", "revise"]
+FEEDBACK = ["Add more flowers", "Make it a bit longer", "Add a friendly dragon", "Make it calmer"]
+
+
+class LoadTest:
+    """Drives simulated families and records every action they take."""
+
+    def __init__(self, workers: int, think_time: float, time_scale: float = 1.0, seed: int = None):
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.think_time = think_time * time_scale
+        self.time_scale = time_scale
+        self.rng = random.Random(seed)
+        self.records: List[Dict] = []
+        self.families = 0
+        self._lock = threading.Lock()
+
+    def run_action(self, stage: int, action: str, fn, *args):
+        """Run one action on the worker pool and record its timings."""
+        submitted = time.monotonic()
+        timings = {}
+
+        def work():
+            timings["started"] = time.monotonic()
+            return fn(*args)
+
+        ok = True
+        try:
+            result = self.pool.submit(work).result()
+            # Evaluation reports failure by returning None rather than raising
+            ok = result is not None
+            return result
+        except Exception:
+            ok = False
+            raise
+        finally:
+            finished = time.monotonic()
+            started = timings.get("started", finished)
+            with self._lock:
+                self.records.append({
+                    "stage": stage,
+                    "action": action,
+                    "queue_wait": started - submitted,
+                    "latency": finished - started,
+                    "finished": finished,
+                    "ok": ok
+                })
+
+    def family(self, stage: int):
+        """One family: create a story, check it, then revise a few times."""
+        with self._lock:
+            category = self.rng.choice(STORY_CATEGORIES)
+            length = self.rng.choice(list(STORY_LENGTHS))
+            revisions = self.rng.randint(0, MAX_REVISION_ATTEMPTS)
+            age = self.rng.randint(3, 12)
+            self.families += 1
+            tenant = f"family-{self.families}"
+
+        try:
+            # Each family is its own tenant; with no profile id, nothing is written to the story history
+            session = StorySession("Emma", age, category, {"goal": "find a lost star"}, length, tenant=tenant)
+            self.run_action(stage, "create", session.generate_initial_story)
+            self.pause()
+            self.run_action(stage, "evaluate", session.evaluate_current_story)
+            for i in range(revisions):
+                self.pause()
+                self.run_action(stage, "revise", session.revise_from_user_feedback, FEEDBACK[i % len(FEEDBACK)])
+        except Exception:
+            pass  # Already recorded; a family gives up after an error
+
+    def pause(self):
+        """Time a parent spends reading before the next click."""
+        with self._lock:
+            delay = self.rng.expovariate(1 / self.think_time) if self.think_time else 0
+        time.sleep(delay)
+
+    def run(self, rates: List[float], stage_seconds: float) -> List[Dict]:
+        """
+        Ramp through arrival rates (families/second), one stage each.
+        Rates and durations are in real time; the run itself is sped up
+        by time_scale.
+        """
+        drivers = []
+        stages = []
+        for stage, rate in enumerate(rates):
+            stage_start = time.monotonic()
+            stage_end = stage_start + stage_seconds * self.time_scale
+            arrivals = 0
+            print(f"▶️  Stage {stage + 1}: {rate:g} families/s for {stage_seconds:.0f}s")
+
+            while True:
+                with self._lock:
+                    gap = self.rng.expovariate(rate / self.time_scale)
+                if time.monotonic() + gap >= stage_end:
+                    break
+                time.sleep(gap)
+                driver = threading.Thread(target=self.family, args=(stage,), daemon=True)
+                driver.start()
+                drivers.append(driver)
+                arrivals += 1
+
+            time.sleep(max(0.0, stage_end - time.monotonic()))
+            stages.append({"rate": rate, "start": stage_start, "end": stage_end, "families": arrivals})
+
+        print("⏳ Waiting for in-flight families to finish...")
+        for driver in drivers:
+            driver.join()
+        self.pool.shutdown()
+        return stages
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (0 for no values)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def build_report(records: List[Dict], stages: List[Dict]) -> List[Dict]:
+    """
+    Per-stage throughput, latency/queue-wait percentiles and error rate per action.
+    Times are in (scaled) run time; print_report converts them back.
+    """
+    report = []
+    for index, stage in enumerate(stages):
+        stage_records = [r for r in records if r["stage"] == index]
+        completed = [r for r in records if r["ok"] and stage["start"] <= r["finished"] < stage["end"]]
+        row = {
+            "stage": index + 1,
+            "arrival_rate": stage["rate"],
+            "families": stage["families"],
+            "throughput": len(completed) / (stage["end"] - stage["start"]),
+            "actions": {}
+        }
+        for action in ACTIONS:
+            action_records = [r for r in stage_records if r["action"] == action]
+            if not action_records:
+                continue
+            latencies = [r["latency"] for r in action_records if r["ok"]]
+            waits = [r["queue_wait"] for r in action_records]
+            row["actions"][action] = {
+                "count": len(action_records),
+                "error_rate": 1 - len(latencies) / len(action_records),
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "wait_p50": percentile(waits, 50),
+                "wait_p95": percentile(waits, 95),
+                "wait_p99": percentile(waits, 99)
+            }
+        report.append(row)
+    return report
+
+
+def print_report(report: List[Dict], time_scale: float):
+    """Print the report as a table (times scaled back to real seconds)."""
+    print()
+    print("📊 Load test results (seconds, scaled back to real time)")
+    header = f"{'stage':>5} {'rate':>6} {'action':>9} {'count':>6} {'err%':>6} " \
+             f"{'p50':>7} {'p95':>7} {'p99':>7} {'wait50':>7} {'wait95':>7} {'wait99':>7}"
+    print(header)
+    print("-" * len(header))
+    for row in report:
+        for action, stats in row["actions"].items():
+            print(f"{row['stage']:>5} {row['arrival_rate']:>6g} {action:>9} {stats['count']:>6} "
+                  f"{stats['error_rate'] * 100:>6.1f} "
+                  f"{stats['p50'] / time_scale:>7.2f} {stats['p95'] / time_scale:>7.2f} "
+                  f"{stats['p99'] / time_scale:>7.2f} {stats['wait_p50'] / time_scale:>7.2f} "
+                  f"{stats['wait_p95'] / time_scale:>7.2f} {stats['wait_p99'] / time_scale:>7.2f}")
+        print(f"{'':>5} {'':>6} {'→':>9} {row['families']} families, "
+              f"{row['throughput'] * time_scale:.2f} actions/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Little Nona load generator")
+    parser.add_argument("--rates", default="0.5,1,2,4",
+                        help="Comma-separated family arrival rates per second, one stage each")
+    parser.add_argument("--stage-seconds", type=float, default=60, help="Length of each stage")
+    parser.add_argument("--workers", type=int, default=8, help="Worker pool size (handler concurrency)")
+    parser.add_argument("--think-time", type=float, default=5, help="Mean seconds between a family's clicks")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="Speed up the whole run (0.1 = 10x faster); rates and times are scaled")
+    parser.add_argument("--first-token-latency", type=float, default=0.5)
+    parser.add_argument("--per-token-latency", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--max-concurrency", type=int, default=None,
+                        help="Concurrent requests the fake provider allows before returning 429")
+    parser.add_argument("--cassette",
+                        help="Replay model calls recorded in this cassette instead of the fake backend")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    scale = args.time_scale
+    if args.cassette:
+        set_client(OpenAIClient(mode="replay", cassette_path=args.cassette, replay_time_scale=scale))
+    else:
+        # Fake stories are all made of the same few sentences; don't let them trigger rewrites
+        SIMILARITY["max_regenerations"] = 0
+        set_client(FakeModelClient(
+            first_token_latency=args.first_token_latency,
+            per_token_latency=args.per_token_latency,
+            error_rate=args.error_rate,
+            max_concurrency=args.max_concurrency,
+            time_scale=scale,
+            seed=args.seed
+        ))
+
+    # Router cooldowns run on the sped-up clock too, like the client's retry backoff
+    get_router().time_scale = scale
+
+    rates = [float(r) for r in args.rates.split(",")]
+    test = LoadTest(args.workers, args.think_time, scale, args.seed)
+    stages = test.run(rates, args.stage_seconds)
+
+    report = build_report(test.records, stages)
+    print_report(report, scale)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
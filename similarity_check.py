@@ -0,0 +1,78 @@
+"""
+Little Nona - Repeat Threshold Check
+How alike real stories for the same child are, to tune SIMILARITY["threshold"]
+
+Reads the single-pass storyteller calls in a cassette recorded from
+production traffic (see OpenAIClient's record mode), pairs up stories
+written for the same child (the name and age in the prompt's "Create a
+bedtime story for Emma, who is 6 years old." line), and prints how
+their estimated similarity is spread and how many pairs each candidate
+threshold would treat as repeats. Chaptered stories are recorded as
+separate parts, so they aren't included.
+
+Example:
+    python similarity_check.py model_traffic.jsonl --thresholds 0.1,0.15,0.2,0.3,0.5
+"""
+
+import argparse
+import json
+import re
+import sys
+from collections import defaultdict
+from itertools import combinations
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from config.settings import SIMILARITY
+from utils.similarity import estimated_similarity, minhash
+from load_test import percentile
+
+# The storyteller's prompt follows its system prompt, so this isn't the first line
+STORY_PROMPT = re.compile(r"^Create a bedtime story for (.+?), who is (\d+) years old\.$", re.MULTILINE)
+
+
+def stories_by_child(cassette_path: str):
+    """Recorded single-pass stories, grouped by the child's name and age in the prompt."""
+    stories = defaultdict(list)
+    with open(cassette_path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            match = STORY_PROMPT.search(entry["request"]["prompt"])
+            if match and "response" in entry:
+                stories[match.groups()].append(entry["response"]["text"])
+    return stories
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Little Nona repeat threshold check")
+    parser.add_argument("cassette", help="Cassette of recorded production model calls")
+    parser.add_argument("--thresholds", default="0.1,0.15,0.2,0.3,0.5",
+                        help="Comma-separated thresholds to count repeats for")
+    args = parser.parse_args()
+
+    similarities = []
+    for stories in stories_by_child(args.cassette).values():
+        signatures = [minhash(story) for story in stories]
+        similarities += [estimated_similarity(a, b) for a, b in combinations(signatures, 2)]
+
+    if not similarities:
+        print("No pairs of stories for the same child in this cassette.")
+        return
+
+    print(f"📊 {len(similarities)} pairs of stories for the same child")
+    for pct in (50, 90, 99):
+        print(f"   p{pct}: {percentile(similarities, pct):.3f}")
+    print(f"   max: {max(similarities):.3f}")
+    print()
+    for threshold in (float(t) for t in args.thresholds.split(",")):
+        repeats = sum(s >= threshold for s in similarities)
+        current = "  ← current" if threshold == SIMILARITY["threshold"] else ""
+        print(f"   ≥ {threshold:<5g} {repeats:>6} pairs ({repeats / len(similarities):.1%}){current}")
+
+
+if __name__ == "__main__":
+    main()
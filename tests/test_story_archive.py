@@ -0,0 +1,69 @@
+"""
+Little Nona - Story Archive tests
+Crash recovery and dictionary training
+"""
+
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from utils import story_archive
+from utils.story_archive import StoryArchive, INDEX_ENTRY
+
+
+def _story(i: int) -> dict:
+    return {"story": f"Once upon a time, little bunny number {i} hopped through the soft green meadow.", "i": i}
+
+
+class StoryArchiveRecoveryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = Path(tempfile.mkdtemp()) / "archive"
+
+    def test_torn_index_entry_is_dropped_before_appending(self):
+        archive = StoryArchive.create(self.path)
+        archive.append(_story(0))
+        archive.append(_story(1))
+        del archive
+
+        # A crash part-way through writing the third index entry
+        with open(self.path / "stories.idx", "ab") as f:
+            f.write(b"\x01" * (INDEX_ENTRY.size // 2))
+
+        archive = StoryArchive(self.path)
+        self.assertEqual(len(archive), 2)
+        self.assertEqual(archive.append(_story(2)), 2)
+        self.assertEqual(archive.append(_story(3)), 3)
+        self.assertEqual([record["i"] for record in archive], [0, 1, 2, 3])
+
+    def test_untrained_archive_is_rebuilt_with_a_dictionary(self):
+        original = story_archive.STORY_ARCHIVE["train_after_records"]
+        story_archive.STORY_ARCHIVE["train_after_records"] = 5
+        try:
+            archive = StoryArchive.open_or_create(self.path)
+            self.assertEqual(archive.dictionary, b"")
+            for i in range(6):
+                archive.append(_story(i))
+        finally:
+            story_archive.STORY_ARCHIVE["train_after_records"] = original
+
+        self.assertGreater(len(archive.dictionary), 0)
+        self.assertEqual([record["i"] for record in archive], list(range(6)))
+        reopened = StoryArchive.open_or_create(self.path)
+        self.assertEqual(reopened.get(5)["i"], 5)
+
+    def test_crash_between_rebuild_renames_keeps_the_old_archive(self):
+        archive = StoryArchive.create(self.path)
+        archive.append(_story(0))
+        archive.close_maps()
+        # rebuild() moved the archive aside but died before moving the new one in
+        self.path.rename(self.path.with_name("archive.old"))
+
+        reopened = StoryArchive.open_or_create(self.path)
+        self.assertEqual(reopened.get(0)["i"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""
+Little Nona - Story Repair tests
+Real story openings and closings survive; meta text around them doesn't
+"""
+
+import sys
+import unittest
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from utils.story_repair import repair_story
+
+MIDDLE = "Emmy hopped through the silver meadow, counting fireflies until her eyes grew heavy."
+
+
+class StoryRepairTest(unittest.TestCase):
+
+    def test_story_openings_are_kept(self):
+        for opening in [
+            "This is the story of Emmy, a little bunny who loved the stars.",
+            "This is how Emmy found the sleepy moon.",
+            "Here is the meadow where Emmy lived, and this is her story.",
+            "Here's a secret about Emmy: she could hear the stars hum.",
+        ]:
+            story = f"{opening}\n\n{MIDDLE}"
+            self.assertEqual(repair_story(story, "Emmy", "Emma"), story, opening)
+
+    def test_story_closings_are_kept(self):
+        for closing in [
+            "I hope your dreams are as soft as Emmy's, little one.",
+            "I hope you sleep as snugly as Emmy did. Goodnight, sweetheart.",
+            "I hope that tonight the stars hum for you too.",
+        ]:
+            story = f"{MIDDLE}\n\n{closing}"
+            self.assertEqual(repair_story(story, "Emmy", "Emma"), story, closing)
+
+    def test_meta_preamble_and_notes_are_removed(self):
+        story = (
+            "Sure! Here's a bedtime story about Emmy:\n\n"
+            f"{MIDDLE}\n\n"
+            "I hope you enjoyed this story!\n\n"
+            "(Word count: 412)"
+        )
+        self.assertEqual(repair_story(story, "Emmy", "Emma"), MIDDLE)
+
+    def test_opening_and_closing_paragraphs_both_survive(self):
+        story = (
+            "This is the story of Emmy, a little bunny who loved the stars.\n\n"
+            f"{MIDDLE}\n\n"
+            "I hope your dreams are as soft as Emmy's, little one."
+        )
+        self.assertEqual(repair_story(story, "Emmy", "Emma"), story)
+
+
+if __name__ == "__main__":
+    unittest.main()